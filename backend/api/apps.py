@@ -10,3 +10,4 @@ class ApiConfig(AppConfig):
         Import signals when the app is ready.
         This ensures that the signal handlers are registered.
         """
+        from . import etalons, history, sandbox_identity  # noqa: F401
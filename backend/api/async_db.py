@@ -0,0 +1,124 @@
+"""
+Асинхронний доступ до тимчасових баз PostgreSQL (psycopg 3) для ASGI-ендпоінтів.
+
+Для кожної тимчасової бази (а для пісочниць-схем — для кожної пари база + роль
+пісочниці, див. api/schema_sandboxes.py) тримається невеликий AsyncConnectionPool, тож
+один процес може обслуговувати сотні одночасних запитів студентів без
+окремого потоку на кожен запит. Кількість пулів обмежена (LRU): пул бази,
+до якої давно не зверталися, закривається.
+
+Пули прив'язані до event loop, тому реєстр ведеться окремо для кожного
+циклу. Повну користь дає лише ASGI-сервер (uvicorn) з одним довгоживучим
+циклом; під WSGI кожен запит отримує свій цикл і свої пули.
+"""
+import asyncio
+import logging
+import weakref
+from collections import OrderedDict
+
+from django.conf import settings
+from psycopg_pool import AsyncConnectionPool
+
+from . import metrics, sandbox_db
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SETTINGS = {
+    'MAX_POOLS': 200,        # Скільки баз одночасно тримають відкриті пули
+    'MIN_SIZE': 1,           # Мінімум з'єднань у пулі однієї бази
+    'MAX_SIZE': 4,           # Максимум з'єднань у пулі однієї бази
+    'MAX_IDLE': 60,          # Секунд простою до закриття зайвого з'єднання
+    'TIMEOUT': 30,           # Секунд очікування вільного з'єднання
+    'STATEMENT_TIMEOUT': 30000,  # мс, як у синхронному execute_sql_query
+}
+
+# event loop -> (OrderedDict (dbname, роль або None) -> пул, asyncio.Lock)
+_registries = weakref.WeakKeyDictionary()
+
+
+def _registry():
+    loop = asyncio.get_running_loop()
+    registry = _registries.get(loop)
+    if registry is None:
+        registry = (OrderedDict(), asyncio.Lock())
+        _registries[loop] = registry
+    return registry
+
+
+def pool_settings():
+    """Налаштування пулів з settings.ASYNC_SANDBOX_POOL поверх значень за замовчуванням."""
+    return {**DEFAULT_POOL_SETTINGS, **getattr(settings, 'ASYNC_SANDBOX_POOL', {})}
+
+
+async def _configure(conn):
+    await conn.set_autocommit(True)
+
+
+async def _reset(conn):
+    # Студент міг змінити statement_timeout чи search_path — повертаємо значення сесії
+    await conn.execute('RESET ALL')
+
+
+async def get_pool(dbname, server='default', credentials=None):
+    """
+    Повертає відкритий пул для бази dbname на сервері пісочниць server, створюючи його за потреби.
+    credentials — {'user', 'password'} ролі пісочниці-схеми (None — адміністратор); пул окремий
+    для кожної ролі. Найдавніше використаний пул закривається, якщо перевищено MAX_POOLS.
+    """
+    credentials = credentials or {}
+    key = (dbname, credentials.get('user'))
+    _pools, _pools_lock = _registry()
+    async with _pools_lock:
+        pool = _pools.get(key)
+        if pool is not None:
+            _pools.move_to_end(key)
+            metrics.CONNECTION_POOL_LOOKUPS.inc(result='hit')
+            return pool
+        metrics.CONNECTION_POOL_LOOKUPS.inc(result='miss')
+
+        conf = pool_settings()
+        pool = AsyncConnectionPool(
+            sandbox_db.conninfo(dbname, conf['STATEMENT_TIMEOUT'], alias=server, **credentials),
+            min_size=conf['MIN_SIZE'],
+            max_size=conf['MAX_SIZE'],
+            max_idle=conf['MAX_IDLE'],
+            timeout=conf['TIMEOUT'],
+            configure=_configure,
+            reset=_reset,
+            # З'єднання могли розірвати ззовні (наприклад, простоюючі — перед копіюванням
+            # пісочниці в точку відновлення); розірване замінюється новим непомітно для запиту
+            check=AsyncConnectionPool.check_connection,
+            open=False,
+            name='/'.join(part for part in key if part),
+        )
+        await pool.open()
+        _pools[key] = pool
+
+        evicted = []
+        while len(_pools) > conf['MAX_POOLS']:
+            _, old_pool = _pools.popitem(last=False)
+            evicted.append(old_pool)
+
+    for old_pool in evicted:
+        await old_pool.close()
+    return pool
+
+
+async def close_pool(dbname):
+    """Закриває пули бази, зокрема пули ролей пісочниць-схем (наприклад, перед DROP DATABASE)."""
+    _pools, _pools_lock = _registry()
+    async with _pools_lock:
+        pools = [_pools.pop(key) for key in list(_pools) if key[0] == dbname]
+    for pool in pools:
+        await pool.close()
+
+
+async def close_all_pools():
+    """Закриває всі пули поточного циклу (для коректного завершення процесу)."""
+    _pools, _pools_lock = _registry()
+    async with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        await pool.close()
+
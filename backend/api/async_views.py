@@ -0,0 +1,364 @@
+"""
+Асинхронні (ASGI) версії SQL-ендпоінтів пісочниці.
+
+Повторюють поведінку execute_sql_query, task_submit, task_schema та
+get_database_schema з views.py. Вибір бази, виконання запиту з відстеженням is_dirty
+та інтроспекція — ті самі методи SandboxManager (aresolve / arun_query / aintrospect),
+що працюють через psycopg 3 та пули з'єднань з async_db, тож повільний запит
+студента не блокує воркер.
+Django ORM викликається через асинхронний API (aget/afirst/acreate).
+"""
+import json
+import logging
+import time
+from functools import wraps
+
+import psycopg
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from . import metrics, sandbox_identity, tracing
+from .history import history_buffer
+from .models import Task, TeacherDatabase, SQLHistory
+from .result_cache import result_cache, is_cacheable_query, is_read_only_query, dump_sha256
+from .sandbox_manager import MAX_RESULTS, Sandbox, sandbox_manager
+from .views import User, validate_query
+
+logger = logging.getLogger(__name__)
+
+_jwt_authentication = JWTAuthentication()
+
+
+def _json(data, status=200):
+    """JSON-відповідь з тим самим кодуванням, що й у DRF Response."""
+    with tracing.span('serialize'):
+        return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False,
+                            json_dumps_params={'ensure_ascii': False})
+
+
+def async_api_view(methods):
+    """
+    Мінімальний аналог @api_view для async-функцій: перевіряє HTTP-метод,
+    автентифікує JWT (як DEFAULT_AUTHENTICATION_CLASSES) і розбирає JSON-тіло
+    в request.data.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return _json({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+
+            try:
+                auth = await sync_to_async(_jwt_authentication.authenticate)(request)
+            except AuthenticationFailed as e:
+                detail = e.detail if isinstance(e.detail, dict) else {'detail': e.detail}
+                return _json(detail, status=401)
+            if auth is None:
+                return _json({'detail': 'Authentication credentials were not provided.'}, status=401)
+            request.user, request.auth = auth
+
+            request.data = {}
+            if request.body:
+                try:
+                    request.data = json.loads(request.body)
+                except (ValueError, UnicodeDecodeError):
+                    return _json({'detail': 'JSON parse error.'}, status=400)
+
+            return await view(request, *args, **kwargs)
+
+        # JWT-ендпоінти не використовують cookie-автентифікацію, як і APIView в DRF
+        return csrf_exempt(wrapper)
+    return decorator
+
+
+async def _find_teacher_sandbox(user, teacher_db, session_key, endpoint):
+    """
+    Існуюча тимчасова база для user+session_key+teacher_db або None.
+    endpoint — мітка для метрики sandbox_lookups_total.
+    """
+    with tracing.span('lookup'):
+        temp_db = await sandbox_identity.afind_sandbox(user, session_key, teacher_db_id=teacher_db.id)
+    if temp_db:
+        # Оновлюємо last_used для очищення непотрібних пізніше
+        await sandbox_identity.atouch(temp_db)
+        metrics.SANDBOX_LOOKUPS.inc(endpoint=endpoint, result='hit')
+    else:
+        metrics.SANDBOX_LOOKUPS.inc(endpoint=endpoint, result='miss')
+    return temp_db
+
+
+async def _find_task_sandbox(user, task, session_key, endpoint):
+    """Існуюча тимчасова база задачі (префікс task_{task}_{user}_{ключ}) або None."""
+    with tracing.span('lookup'):
+        temp_db = await sandbox_identity.afind_sandbox(user, session_key, task_id=task.id)
+    metrics.SANDBOX_LOOKUPS.inc(endpoint=endpoint, result='hit' if temp_db else 'miss')
+    return temp_db
+
+
+async def _cached_result(instance, file_field, hash_field, temp_db, query):
+    """
+    (ключ, відповідь) кешу результатів для запиту до пісочниці temp_db (None — ще не створена).
+    Ключ None, якщо запит або пісочниця не підходять для кешу; відповідь None — промах.
+    """
+    if not result_cache.enabled or (temp_db is not None and temp_db.is_dirty) or not is_cacheable_query(query):
+        return None, None
+    with tracing.span('cache'):
+        dump_hash = await sync_to_async(dump_sha256)(instance, file_field, hash_field)
+        cache_key = result_cache.key(dump_hash, query)
+        cached = result_cache.get(cache_key)
+    metrics.QUERY_RESULT_CACHE_LOOKUPS.inc(result='hit' if cached is not None else 'miss')
+    return cache_key, cached
+
+
+@async_api_view(['POST'])
+async def execute_sql_query(request):
+    """
+    Асинхронна версія views.execute_sql_query.
+    Тіло запиту: { query, database_id }.
+    """
+    query = str(request.data.get('query', '')).strip()
+    database_id = request.data.get('database_id')
+
+    if not query:
+        return _json({'error': 'Не вказано запит'}, status=400)
+    if not database_id:
+        return _json({'error': 'Оберіть базу даних перед виконанням запитів.'}, status=400)
+
+    # Валідуємо запит для безпеки
+    is_valid, error_msg = validate_query(query)
+    if not is_valid:
+        logger.warning(f"Invalid query attempt by user {request.user.username}: {error_msg}")
+        return _json({'error': f'Недопустимий запит: {error_msg}'}, status=400)
+
+    teacher_db = None
+    db_name = ''
+    started = None
+    try:
+        session_key = sandbox_identity.sandbox_key(request)
+        teacher_db = await TeacherDatabase.objects.aget(id=database_id)
+        temp_db = await _find_teacher_sandbox(request.user, teacher_db, session_key, 'execute_sql')
+
+        cache_started = time.perf_counter()
+        cache_key, cached = await _cached_result(teacher_db, 'sql_dump', 'dump_sha256', temp_db, query)
+        if cached is not None:
+            history_buffer.add(
+                user=request.user,
+                query=query,
+                database=teacher_db,
+                duration_ms=(time.perf_counter() - cache_started) * 1000,
+                rows_returned=cached['row_count'],
+                sandbox_name=temp_db.database_name if temp_db else ''
+            )
+            return _json({**cached, 'cached': True})
+
+        # Поки користувач лише читає дані, запит іде до спільної read-only репліки дампу
+        sandbox = Sandbox(request.user, session_key, teacher_db=teacher_db, temp_db=temp_db)
+        db_name = await sandbox_manager.aresolve(sandbox, read_only=is_read_only_query(query))
+
+        started = time.perf_counter()
+        result = await sandbox_manager.arun_query(sandbox, query, limit=MAX_RESULTS)
+        temp_db, db_name = sandbox.temp_db, sandbox.db_name
+        columns, rows, has_more, rowcount = result.columns, result.rows, result.has_more, result.rowcount
+        duration_ms = (time.perf_counter() - started) * 1000
+        metrics.QUERY_DURATION_SECONDS.observe(duration_ms / 1000, endpoint='execute_sql', status='ok')
+        logger.info(f"Query executed by {request.user.username}: {len(rows)} rows returned")
+
+        history_buffer.add(
+            user=request.user,
+            query=query,
+            database=teacher_db,
+            duration_ms=duration_ms,
+            rows_returned=rowcount if columns else None,
+            rows_affected=rowcount if not columns and rowcount >= 0 else None,
+            sandbox_name=db_name
+        )
+
+        response_data = {
+            'results': rows,
+            'columns': columns,
+            'row_count': len(rows)
+        }
+        if has_more:
+            response_data['warning'] = f'Results limited to {MAX_RESULTS} rows. More data available.'
+            response_data['truncated'] = True
+        if cache_key is not None and (temp_db is None or not temp_db.is_dirty):
+            result_cache.put(cache_key, response_data, len(rows))
+        return _json(response_data)
+
+    except TeacherDatabase.DoesNotExist:
+        return _json({'error': 'Базу даних не знайдено'}, status=404)
+    except psycopg.errors.QueryCanceled:
+        logger.warning(f"Query timeout for user {request.user.username}")
+        if started is not None:
+            duration_ms = (time.perf_counter() - started) * 1000
+            metrics.QUERY_DURATION_SECONDS.observe(duration_ms / 1000, endpoint='execute_sql', status='timeout')
+            history_buffer.add(user=request.user, query=query, database=teacher_db, duration_ms=duration_ms,
+                               status=SQLHistory.Status.TIMEOUT, sandbox_name=db_name)
+        return _json({'error': 'Запит перевищив ліміт часу (30 секунд)'}, status=408)
+    except psycopg.Error as e:
+        logger.error(f"Database error for user {request.user.username}: {e}")
+        if started is not None:
+            duration_ms = (time.perf_counter() - started) * 1000
+            metrics.QUERY_DURATION_SECONDS.observe(duration_ms / 1000, endpoint='execute_sql', status='error')
+            history_buffer.add(user=request.user, query=query, database=teacher_db, duration_ms=duration_ms,
+                               status=SQLHistory.Status.ERROR, sandbox_name=db_name)
+        return _json({'error': 'Помилка бази даних'}, status=400)
+    except Exception as e:
+        logger.error(f"Unexpected error for user {request.user.username}: {e}")
+        return _json({'error': 'Виникла неочікувана помилка'}, status=500)
+
+
+@async_api_view(['GET'])
+async def get_database_schema(request, database_id):
+    """
+    Асинхронна версія views.get_database_schema.
+    """
+    try:
+        session_key = sandbox_identity.sandbox_key(request)
+
+        if database_id == 'temporary':
+            teacher_db_id = request.GET.get('teacher_db')
+            teacher_db = None
+            if teacher_db_id:
+                try:
+                    teacher_db = await TeacherDatabase.objects.aget(id=teacher_db_id)
+                except TeacherDatabase.DoesNotExist:
+                    return _json({'error': 'Teacher database не знайдено'}, status=404)
+
+            temp_db = await sandbox_identity.afind_sandbox(request.user, session_key,
+                                                           teacher_db_id=teacher_db.id if teacher_db else None)
+            metrics.SANDBOX_LOOKUPS.inc(endpoint='database_schema', result='hit' if temp_db else 'miss')
+            sandbox = Sandbox(request.user, session_key, teacher_db=teacher_db, temp_db=temp_db)
+            # Користувач ще нічого не змінював — схема збігається зі спільною реплікою
+            if (temp_db is None and teacher_db is None) or \
+                    await sandbox_manager.aresolve(sandbox, read_only=True, create=False) is None:
+                return _json({'error': 'Тимчасову базу не знайдено'}, status=404)
+
+        else:
+            teacher_db = await TeacherDatabase.objects.aget(id=database_id)
+
+            # Перевірка прав: лише адміністратор або власник teacher_db
+            if request.user.role != User.Role.ADMIN and teacher_db.teacher_id != request.user.id:
+                return _json({'error': 'Ви не маєте прав для перегляду цієї бази'}, status=403)
+
+            temp_db = await _find_teacher_sandbox(request.user, teacher_db, session_key, 'database_schema')
+            sandbox = Sandbox(request.user, session_key, teacher_db=teacher_db, temp_db=temp_db)
+            # Поки користувач нічого не змінював, схему дає спільна репліка дампу
+            await sandbox_manager.aresolve(sandbox, read_only=True)
+
+        with metrics.QUERY_DURATION_SECONDS.time(endpoint='database_schema', status='ok'):
+            tables, schema = await sandbox_manager.aintrospect(sandbox, with_pk=True)
+        return _json({'tables': tables, 'schema': schema})
+
+    except TeacherDatabase.DoesNotExist:
+        return _json({'error': 'Базу даних не знайдено'}, status=404)
+    except Exception as e:
+        return _json({'error': f'Неочікувана помилка: {str(e)}'}, status=500)
+
+
+@async_api_view(['GET'])
+async def task_schema(request, pk):
+    """
+    Асинхронна версія views.task_schema.
+    """
+    try:
+        task = await Task.objects.aget(pk=pk)
+    except Task.DoesNotExist:
+        return _json({'error': 'Task not found.'}, status=404)
+
+    if not task.original_db:
+        return _json({'error': 'No database dump for this task.'}, status=400)
+
+    try:
+        session_key = sandbox_identity.sandbox_key(request)
+        temp_db = await _find_task_sandbox(request.user, task, session_key, 'task_schema')
+        sandbox = Sandbox(request.user, session_key, task=task, temp_db=temp_db)
+        # Поки користувач нічого не змінював, схему дає спільна репліка дампу
+        await sandbox_manager.aresolve(sandbox, read_only=True)
+        with metrics.QUERY_DURATION_SECONDS.time(endpoint='task_schema', status='ok'):
+            tables, schema = await sandbox_manager.aintrospect(sandbox, with_pk=False)
+    except Exception as e:
+        return _json({'error': str(e)}, status=500)
+
+    return _json({'tables': tables, 'schema': schema})
+
+
+@async_api_view(['POST'])
+async def task_submit(request, pk):
+    """
+    Асинхронна версія views.task_submit («Preview SQL» задачі).
+    """
+    sql = request.data.get('sql')
+    if not sql:
+        return _json({'error': 'No SQL provided.'}, status=400)
+
+    try:
+        task = await Task.objects.aget(pk=pk)
+    except Task.DoesNotExist:
+        return _json({'error': 'Task not found.'}, status=404)
+
+    if not task.original_db:
+        return _json({'error': 'No database dump for this task.'}, status=400)
+
+    db_name = ''
+    started = None
+    try:
+        session_key = sandbox_identity.sandbox_key(request)
+        temp_db = await _find_task_sandbox(request.user, task, session_key, 'task_execute')
+
+        cache_started = time.perf_counter()
+        cache_key, cached = await _cached_result(task, 'original_db', 'original_db_sha256', temp_db, sql)
+        if cached is not None:
+            history_buffer.add(
+                user=request.user,
+                query=sql,
+                task=task,
+                duration_ms=(time.perf_counter() - cache_started) * 1000,
+                rows_returned=len(cached['results']),
+                sandbox_name=temp_db.database_name if temp_db else ''
+            )
+            return _json({**cached, 'cached': True})
+
+        # Поки користувач лише читає дані, запит іде до спільної read-only репліки дампу
+        sandbox = Sandbox(request.user, session_key, task=task, temp_db=temp_db)
+        db_name = await sandbox_manager.aresolve(sandbox, read_only=is_read_only_query(sql))
+
+        started = time.perf_counter()
+        result = await sandbox_manager.arun_query(sandbox, sql)
+        temp_db, db_name = sandbox.temp_db, sandbox.db_name
+        columns, rows, rowcount = result.columns, result.rows, result.rowcount
+        duration_ms = (time.perf_counter() - started) * 1000
+        metrics.QUERY_DURATION_SECONDS.observe(duration_ms / 1000, endpoint='task_execute', status='ok')
+        history_buffer.add(
+            user=request.user,
+            query=sql,
+            task=task,
+            duration_ms=duration_ms,
+            rows_returned=rowcount if columns else None,
+            rows_affected=rowcount if not columns and rowcount >= 0 else None,
+            sandbox_name=db_name
+        )
+    except Exception as e:
+        if started is not None:
+            duration_ms = (time.perf_counter() - started) * 1000
+            timed_out = isinstance(e, psycopg.errors.QueryCanceled)
+            metrics.QUERY_DURATION_SECONDS.observe(duration_ms / 1000, endpoint='task_execute',
+                                                   status='timeout' if timed_out else 'error')
+            history_buffer.add(
+                user=request.user,
+                query=sql,
+                task=task,
+                duration_ms=duration_ms,
+                status=SQLHistory.Status.TIMEOUT if timed_out else SQLHistory.Status.ERROR,
+                sandbox_name=db_name
+            )
+        return _json({'error': str(e)}, status=500)
+
+    response_data = {'results': rows}
+    if cache_key is not None and (temp_db is None or not temp_db.is_dirty):
+        result_cache.put(cache_key, response_data, len(rows))
+    return _json(response_data)
@@ -0,0 +1,214 @@
+"""
+Точки відновлення (checkpoints) пісочниць редактора.
+
+Точка відновлення — копія бази пісочниці, зроблена через CREATE DATABASE ... TEMPLATE
+у фоновому завданні (api/jobs.py) і позначена IS_TEMPLATE без дозволу на підключення.
+Відновлення створює нову базу з копії і переключає на неї запис TemporaryDatabase, тож
+після невдалого UPDATE/DELETE студент повертається до збереженого стану одним
+копіюванням, без відновлення дампу і повторення попередніх запитів.
+
+CREATE DATABASE ... TEMPLATE вимагає, щоб до бази пісочниці ніхто не був підключений.
+Тому перед копіюванням розриваються лише простоюючі з'єднання (state = 'idle', зокрема
+з'єднання асинхронних пулів — пул перевіряє їх перед видачею і відкриває нові), а запит,
+який саме виконує студент, не переривається: копіювання повторюється через RETRY_DELAY.
+Якщо пісочниця так і лишилася зайнятою, точка отримує статус failed з помилкою BUSY_ERROR,
+і її можна створити повторно з тією самою назвою.
+
+Підтримуються лише пісочниці з окремою базою (не режим схем).
+"""
+import logging
+import time
+import uuid
+
+import psycopg2.errors
+from django.conf import settings
+
+from . import jobs, metrics, sandbox_db, tracing
+from .models import SandboxCheckpoint
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT_SETTINGS = {
+    'MAX_PER_SANDBOX': 5,   # Точок відновлення на одну пісочницю
+    'COPY_ATTEMPTS': 5,     # Спроб копіювання, поки пісочниця виконує запит студента
+    'RETRY_DELAY': 1.0,     # Секунд між спробами
+}
+
+BUSY_ERROR = 'Пісочниця виконувала запит під час копіювання; повторіть створення точки відновлення'
+CREATE_NOTICE = ("Під час копіювання простоюючі з'єднання з пісочницею ненадовго розриваються; "
+                 "запити, що виконуються, не перериваються")
+
+
+def checkpoint_settings():
+    return {**DEFAULT_CHECKPOINT_SETTINGS, **getattr(settings, 'SANDBOX_CHECKPOINTS', {})}
+
+
+def _terminate_idle(admin_cursor, db_name):
+    admin_cursor.execute(
+        "SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+        "WHERE datname = %s AND state = 'idle' AND pid <> pg_backend_pid()",
+        (db_name,)
+    )
+
+
+def _terminate(admin_cursor, db_name):
+    admin_cursor.execute(
+        "SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE datname = %s AND pid <> pg_backend_pid()",
+        (db_name,)
+    )
+
+
+def _drop_copy(admin_cursor, db_name):
+    admin_cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", (db_name,))
+    if admin_cursor.fetchone():
+        admin_cursor.execute(f"ALTER DATABASE {db_name} WITH IS_TEMPLATE false")
+        admin_cursor.execute(f"DROP DATABASE IF EXISTS {db_name}")
+
+
+def _build(checkpoint_id):
+    """Фонове завдання: копіює базу пісочниці в базу точки відновлення."""
+    checkpoint = SandboxCheckpoint.objects.select_related('temporary_database').get(pk=checkpoint_id)
+    source_name = checkpoint.temporary_database.database_name
+    server = checkpoint.temporary_database.server
+    admin_conn = sandbox_db.connect(alias=server)
+    try:
+        admin_cursor = admin_conn.cursor()
+        create_started = time.perf_counter()
+        conf = checkpoint_settings()
+        for attempt in range(1, conf['COPY_ATTEMPTS'] + 1):
+            # Запит студента, що виконується, не перериваємо — чекаємо, поки з'єднання простоюватиме
+            _terminate_idle(admin_cursor, source_name)
+            try:
+                admin_cursor.execute(
+                    f"CREATE DATABASE {checkpoint.database_name} TEMPLATE {source_name}"
+                    f"{sandbox_db.tablespace_clause(server)}"
+                )
+                break
+            except psycopg2.errors.ObjectInUse:
+                if attempt == conf['COPY_ATTEMPTS']:
+                    SandboxCheckpoint.objects.filter(pk=checkpoint_id).update(
+                        status=SandboxCheckpoint.Status.FAILED, error=BUSY_ERROR)
+                    logger.info(f"Checkpoint {checkpoint.database_name}: sandbox {source_name} stayed busy")
+                    return
+                time.sleep(conf['RETRY_DELAY'])
+        admin_cursor.execute(
+            f"ALTER DATABASE {checkpoint.database_name} WITH IS_TEMPLATE true ALLOW_CONNECTIONS false"
+        )
+        metrics.SANDBOX_CREATE_SECONDS.observe(time.perf_counter() - create_started, source='checkpoint')
+        admin_cursor.close()
+    except Exception as e:
+        SandboxCheckpoint.objects.filter(pk=checkpoint_id).update(status=SandboxCheckpoint.Status.FAILED,
+                                                                  error=str(e))
+        raise
+    finally:
+        admin_conn.close()
+    SandboxCheckpoint.objects.filter(pk=checkpoint_id).update(status=SandboxCheckpoint.Status.READY)
+    logger.info(f"Created checkpoint {checkpoint.database_name} of {source_name}")
+
+
+def create_checkpoint(temp_db, name):
+    """
+    Реєструє точку відновлення name для пісочниці temp_db і ставить копіювання у фон.
+    Точка з тією самою назвою, що не створилася через зайнятість пісочниці (BUSY_ERROR),
+    створюється повторно. ValueError — якщо пісочниця не підтримує точки відновлення або їх забагато.
+    """
+    if temp_db.schema_name:
+        raise ValueError("Checkpoints are not supported for schema sandboxes")
+    busy = temp_db.checkpoints.filter(name=name, status=SandboxCheckpoint.Status.FAILED, error=BUSY_ERROR).first()
+    if busy is not None:
+        busy.status = SandboxCheckpoint.Status.PENDING
+        busy.error = ''
+        busy.is_dirty = temp_db.is_dirty
+        busy.save(update_fields=['status', 'error', 'is_dirty'])
+        jobs.submit(_build, busy.pk)
+        return busy
+    if temp_db.checkpoints.count() >= checkpoint_settings()['MAX_PER_SANDBOX']:
+        raise ValueError("Too many checkpoints for this sandbox; delete an old one first")
+    if temp_db.checkpoints.filter(name=name).exists():
+        raise ValueError(f"Checkpoint '{name}' already exists")
+    checkpoint = SandboxCheckpoint.objects.create(
+        temporary_database=temp_db,
+        name=name,
+        database_name=f"ckpt_{uuid.uuid4().hex[:16]}",
+        is_dirty=temp_db.is_dirty
+    )
+    jobs.submit(_build, checkpoint.pk)
+    return checkpoint
+
+
+def restore_checkpoint(checkpoint, source='teacher_database'):
+    """
+    Відновлює пісочницю з готової точки відновлення: нова база копіюється з checkpoint,
+    запис TemporaryDatabase переключається на неї, а попередня база видаляється у фоні.
+    """
+    if checkpoint.status != SandboxCheckpoint.Status.READY:
+        raise ValueError("Checkpoint is not ready yet")
+    temp_db = checkpoint.temporary_database
+    old_name = temp_db.database_name
+    # Префікс імені зберігається: за ним шукаються пісочниці задач (task_{task}_{user}_{ключ})
+    new_name = f"{old_name.rsplit('_', 1)[0]}_{uuid.uuid4().hex[:8]}"
+
+    admin_conn = sandbox_db.connect(alias=temp_db.server)
+    try:
+        admin_cursor = admin_conn.cursor()
+        create_started = time.perf_counter()
+        with tracing.span('create_db'):
+            admin_cursor.execute(
+                f"CREATE DATABASE {new_name} TEMPLATE {checkpoint.database_name}"
+                f"{sandbox_db.tablespace_clause(temp_db.server, ephemeral=True)}"
+            )
+        metrics.SANDBOX_CREATE_SECONDS.observe(time.perf_counter() - create_started, source='checkpoint')
+        try:
+            temp_db.database_name = new_name
+            temp_db.is_dirty = checkpoint.is_dirty
+            temp_db.save(update_fields=['database_name', 'is_dirty', 'last_used'])
+        except Exception:
+            admin_cursor.execute(f"DROP DATABASE IF EXISTS {new_name}")
+            raise
+        admin_cursor.close()
+    finally:
+        admin_conn.close()
+
+    jobs.submit(_drop_database, old_name, source, temp_db.server)
+    logger.info(f"Restored sandbox {old_name} -> {new_name} from checkpoint {checkpoint.name}")
+    return temp_db
+
+
+def _drop_database(db_name, source, server):
+    admin_conn = sandbox_db.connect(alias=server)
+    try:
+        admin_cursor = admin_conn.cursor()
+        with metrics.SANDBOX_DROP_SECONDS.time(source=source):
+            _terminate(admin_cursor, db_name)
+            admin_cursor.execute(f"DROP DATABASE IF EXISTS {db_name}")
+        admin_cursor.close()
+    finally:
+        admin_conn.close()
+
+
+def delete_checkpoint(checkpoint):
+    """Видаляє точку відновлення разом з її базою."""
+    drop_databases([checkpoint.database_name], server=checkpoint.temporary_database.server)
+    checkpoint.delete()
+
+
+def database_names(temp_db):
+    """Імена баз точок відновлення пісочниці temp_db (до видалення самого запису)."""
+    if temp_db.pk is None:
+        return []
+    return list(temp_db.checkpoints.values_list('database_name', flat=True))
+
+
+def drop_databases(db_names, server='default'):
+    """Видаляє бази точок відновлення на сервері server (записи SandboxCheckpoint не чіпає)."""
+    if not db_names:
+        return
+    admin_conn = sandbox_db.connect(alias=server)
+    try:
+        admin_cursor = admin_conn.cursor()
+        for db_name in db_names:
+            with metrics.SANDBOX_DROP_SECONDS.time(source='checkpoint'):
+                _drop_copy(admin_cursor, db_name)
+        admin_cursor.close()
+    finally:
+        admin_conn.close()
@@ -0,0 +1,268 @@
+"""
+Фонова побудова еталонної бази задачі.
+
+save_etalon лише записує SQL вчителя і ставить побудову в чергу фонових завдань
+(api/jobs.py). Завдання:
+
+    1. копіює базу-шаблон original_db (CREATE DATABASE ... TEMPLATE, api/sandbox_templates.py)
+       замість повторного відновлення дампу; без шаблонів — відновлює дамп;
+    2. виконує SQL вчителя і зберігає отриману базу як еталон задачі (Task.etalon_database,
+       лише для читання) — submit порівнює з нею, не відновлюючи etalon_db при кожній здачі;
+    3. рахує відбитки таблиць (md5 упорядкованих рядків) для швидкої перевірки збігу
+       і записує дамп еталону у Task.etalon_db через pg_dump.
+
+Стан побудови — Task.etalon_status (GET /api/tasks/{pk}/etalon_status/). Черга завдань
+живе в пам'яті процесу, тож побудови, що зависли в pending/running після перезапуску,
+повторно запускає команда:
+
+    python manage.py rebuild_etalons
+"""
+import logging
+import os
+import subprocess
+import tempfile
+import uuid
+
+from django.core.files import File
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from psycopg2 import sql
+
+from . import jobs, locks, metrics, sandbox_db, sandbox_templates, tracing
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+SERVER = 'default'
+STATEMENT_TIMEOUT = 60000
+
+Status = Task.EtalonStatus
+
+
+def enqueue(task, etalon_sql):
+    """Записує SQL вчителя і ставить побудову еталону в чергу після коміту транзакції."""
+    Task.objects.filter(pk=task.pk).update(etalon_status=Status.PENDING, etalon_error='', etalon_sql=etalon_sql,
+                                           etalon_started_at=timezone.now())
+    task.etalon_status = Status.PENDING
+    task.etalon_error = ''
+    task.etalon_sql = etalon_sql
+    transaction.on_commit(lambda: jobs.submit(build, task.pk, etalon_sql))
+
+
+def table_columns(cursor, table):
+    """[назва, тип] колонок таблиці в порядку ordinal_position — як їх читає submit."""
+    cursor.execute(
+        "SELECT column_name, data_type FROM information_schema.columns "
+        "WHERE table_schema = 'public' AND table_name = %s ORDER BY ordinal_position", (table,)
+    )
+    return [[name, data_type] for name, data_type in cursor.fetchall()]
+
+
+def table_fingerprint(cursor, table, columns):
+    """
+    md5 таблиці для колонок columns ([назва, тип]) або None, якщо порівнювати нічого.
+
+    Відбиток повторює порядок і вибір даних детального порівняння в submit: рядки
+    впорядковуються за всіма колонками (ORDER BY у порядку columns, як у submit), а в
+    текст рядка потрапляють лише колонки без timestamp. Тож однакові відбитки таблиць з
+    однаковими columns (ті самі назви, типи і порядок) означають ту саму послідовність
+    порівнюваних значень, тобто детальне порівняння теж не знайшло б розбіжностей.
+    Різні відбитки нічого не означають — submit порівнює рядки як раніше.
+    """
+    compared = [name for name, data_type in columns if 'timestamp' not in data_type]
+    if not compared:
+        return None
+    cursor.execute(sql.SQL(
+        "SELECT md5(coalesce(string_agg(ROW({})::text, E'\\n' ORDER BY {}), '')) FROM {}"
+    ).format(
+        sql.SQL(', ').join(sql.Identifier(name) for name in compared),
+        sql.SQL(', ').join(sql.Identifier(name) for name, _ in columns),
+        sql.Identifier('public', table),
+    ))
+    return cursor.fetchone()[0]
+
+
+def fingerprints(cursor):
+    """Відбитки таблиць схеми public: {таблиця: {'columns': [[назва, тип], ...], 'md5': ...}}."""
+    cursor.execute("SELECT table_name FROM information_schema.tables "
+                   "WHERE table_schema = 'public' AND table_type = 'BASE TABLE'")
+    result = {}
+    for (table,) in cursor.fetchall():
+        columns = table_columns(cursor, table)
+        fingerprint = table_fingerprint(cursor, table, columns)
+        if fingerprint is not None:
+            result[table] = {'columns': columns, 'md5': fingerprint}
+    return result
+
+
+def matches_fingerprint(cursor, table, columns, etalon_fingerprint):
+    """
+    True, якщо таблиця студента (колонки columns) точно збігається з еталоном за
+    відбитком etalon_fingerprint (запис з fingerprints()); False — треба порівнювати рядки.
+    """
+    if not isinstance(etalon_fingerprint, dict) or etalon_fingerprint.get('columns') != columns:
+        return False
+    return table_fingerprint(cursor, table, columns) == etalon_fingerprint['md5']
+
+
+def _use_template():
+    # UNLOGGED-таблиці шаблону обнуляються після аварійного перезапуску — еталон так не зберігаємо
+    return sandbox_templates.enabled() and not sandbox_db.unlogged_enabled(SERVER)
+
+
+def _create_database(task, db_name):
+    admin_conn = sandbox_db.connect(alias=SERVER)
+    try:
+        with admin_conn.cursor() as admin_cursor, tracing.span('create_db'):
+            if _use_template():
+                template = sandbox_templates.get_template(task, 'original_db', 'original_db_sha256',
+                                                          source='task', server=SERVER)
+                admin_cursor.execute(f"CREATE DATABASE {db_name} TEMPLATE {template}"
+                                     f"{sandbox_db.tablespace_clause(SERVER)}")
+                return
+            admin_cursor.execute(f"CREATE DATABASE {db_name}{sandbox_db.tablespace_clause(SERVER)}")
+    finally:
+        admin_conn.close()
+    conn = sandbox_db.connect(db_name, alias=SERVER)
+    try:
+        with conn.cursor() as cursor, open(task.original_db.path, 'r', encoding='utf-8') as f, \
+                metrics.SANDBOX_RESTORE_SECONDS.time(source='etalon'):
+            cursor.execute(f"SET statement_timeout = {STATEMENT_TIMEOUT}")
+            cursor.execute(f.read())
+    finally:
+        conn.close()
+
+
+def drop_database(db_name):
+    """Видаляє збережену еталонну базу db_name."""
+    if not db_name:
+        return
+    admin_conn = sandbox_db.connect(alias=SERVER)
+    try:
+        with admin_conn.cursor() as admin_cursor, metrics.SANDBOX_DROP_SECONDS.time(source='etalon'):
+            admin_cursor.execute(
+                "SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE datname = %s AND pid <> pg_backend_pid()",
+                (db_name,)
+            )
+            admin_cursor.execute(f"DROP DATABASE IF EXISTS {db_name}")
+    finally:
+        admin_conn.close()
+
+
+def _write_dump(task, db_name):
+    """pg_dump еталонної бази у файл Task.etalon_db; попередній файл еталону видаляється."""
+    previous_name = task.etalon_db.name if task.etalon_db else ''
+    config = sandbox_db.server_config(SERVER)
+    with tempfile.NamedTemporaryFile(suffix='.sql', delete=False) as tmpfile:
+        dump_path = tmpfile.name
+    try:
+        with open(dump_path, 'wb') as out:
+            subprocess.run(
+                ['pg_dump', '--no-owner', '--no-privileges', '-U', config['USER'], '-h', str(config['HOST']),
+                 '-p', str(config['PORT']), db_name],
+                stdout=out, stderr=subprocess.PIPE, check=True,
+                env={**os.environ, 'PGPASSWORD': config['PASSWORD'] or ''},
+            )
+        with open(dump_path, 'rb') as dump_file:
+            task.etalon_db.save(f"etalon_{task.id}.sql", File(dump_file), save=False)
+        Task.objects.filter(pk=task.pk).update(etalon_db=task.etalon_db.name)
+    finally:
+        os.remove(dump_path)
+    if previous_name and previous_name != task.etalon_db.name:
+        task.etalon_db.storage.delete(previous_name)
+
+
+def build(task_id, etalon_sql):
+    """
+    Будує еталонну базу задачі task_id з SQL вчителя etalon_sql. Побудова, яку випередив
+    новіший save_etalon (інший etalon_sql), пропускається.
+    """
+    try:
+        with locks.single_flight('etalon', task_id):
+            return _build(task_id, etalon_sql)
+    except locks.SingleFlightTimeout as e:
+        logger.warning(f"Etalon build for task {task_id} timed out waiting for another build: {e}")
+        Task.objects.filter(pk=task_id, etalon_sql=etalon_sql).update(
+            etalon_status=Status.FAILED, etalon_error='Не дочекалися іншої побудови еталону; повторіть збереження.')
+        return False
+
+
+def stale_builds(max_age):
+    """Задачі, чия побудова еталону в pending/running довше за max_age (timedelta)."""
+    return Task.objects.filter(etalon_status__in=[Status.PENDING, Status.RUNNING]).exclude(
+        etalon_started_at__gte=timezone.now() - max_age)
+
+
+def _build(task_id, etalon_sql):
+    task = Task.objects.filter(pk=task_id).first()
+    if task is None or task.etalon_sql != etalon_sql:
+        return False
+    Task.objects.filter(pk=task_id).update(etalon_status=Status.RUNNING, etalon_started_at=timezone.now())
+
+    db_name = f"etalon_{task_id}_{uuid.uuid4().hex[:8]}"
+    try:
+        _create_database(task, db_name)
+        conn = sandbox_db.connect(db_name, alias=SERVER)
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"SET statement_timeout = {STATEMENT_TIMEOUT}")
+                cursor.execute(etalon_sql)
+        finally:
+            conn.close()
+        admin_conn = sandbox_db.connect(alias=SERVER)
+        try:
+            with admin_conn.cursor() as admin_cursor:
+                admin_cursor.execute(f"ALTER DATABASE {db_name} SET default_transaction_read_only = on")
+        finally:
+            admin_conn.close()
+    except Exception as e:
+        logger.warning(f"Etalon build for task {task_id} failed: {e}")
+        try:
+            drop_database(db_name)
+        except Exception as drop_error:
+            logger.warning(f"Failed to drop etalon database {db_name}: {drop_error}")
+        Task.objects.filter(pk=task_id).update(etalon_status=Status.FAILED, etalon_error=str(e))
+        return False
+
+    # Еталон уже придатний для submit; відбитки і дамп дописуються далі
+    previous = task.etalon_database
+    Task.objects.filter(pk=task_id).update(
+        etalon_status=Status.READY, etalon_error='', etalon_database=db_name,
+        etalon_fingerprints={}, etalon_built_at=timezone.now())
+    task.etalon_database = db_name
+    if previous and previous != db_name:
+        jobs.submit(drop_database, previous)
+
+    try:
+        conn = sandbox_db.connect(db_name, alias=SERVER)
+        try:
+            with conn.cursor() as cursor:
+                Task.objects.filter(pk=task_id).update(etalon_fingerprints=fingerprints(cursor))
+        finally:
+            conn.close()
+        _write_dump(task, db_name)
+    except Exception as e:
+        logger.warning(f"Failed to write etalon dump for task {task_id}: {e}")
+        Task.objects.filter(pk=task_id).update(etalon_error=f"Дамп еталону не записано: {e}")
+    logger.info(f"Built etalon database {db_name} for task {task_id}")
+    return True
+
+
+def invalidate(task):
+    """Скидає збережений еталон (наприклад, після заміни original_db чи etalon_db)."""
+    previous = task.etalon_database
+    Task.objects.filter(pk=task.pk).update(etalon_status=Status.NONE, etalon_database='', etalon_fingerprints={},
+                                           etalon_built_at=None)
+    task.etalon_status = Status.NONE
+    task.etalon_database = ''
+    task.etalon_fingerprints = {}
+    if previous:
+        transaction.on_commit(lambda: jobs.submit(drop_database, previous))
+
+
+@receiver(post_delete, sender=Task)
+def _drop_deleted_task_etalon(sender, instance, **kwargs):
+    if instance.etalon_database:
+        transaction.on_commit(lambda: jobs.submit(drop_database, instance.etalon_database))
@@ -0,0 +1,74 @@
+"""
+Нормалізація SQL-запитів у «відбиток» (fingerprint).
+
+Запити, що відрізняються лише пробілами, коментарями, регістром ключових слів
+чи значеннями літералів, отримують однаковий канонічний текст і хеш:
+
+    SELECT * FROM t WHERE id = 5   ->  select * from t where id = ?
+    select *  from t where id=42   ->  select * from t where id = ?
+
+Ідентифікатори можуть містити не-ASCII літери (SELECT ім_я FROM студенти); рядки
+E'...' розбираються з екрануванням зворотною косою рискою.
+"""
+import hashlib
+import re
+
+_TOKEN_RE = re.compile(r"""
+      (?P<comment>--[^\n]*|/\*.*?\*/)
+    | (?P<dollar>\$(?P<tag>[A-Za-z_]*)\$.*?\$(?P=tag)\$)
+    | (?P<estring>[Ee]'(?:[^'\\]|\\.|'')*')
+    | (?P<string>(?:[BbXxNn])?'(?:[^']|'')*')
+    | (?P<ident>"(?:[^"]|"")*")
+    | (?P<number>(?<![\w$])\d+(?:\.\d*)?(?:[eE][+-]?\d+)?)
+    | (?P<word>[^\W\d][\w$]*)
+    | (?P<param>\$\d+)
+    | (?P<space>\s+)
+    | (?P<op>::|<=|>=|<>|!=|\|\||[^\s\w])
+""", re.S | re.X)
+
+# Списки літералів IN (?, ?, ?) згортаються до IN (?)
+_PLACEHOLDER_LIST_RE = re.compile(r'\(\?(?:, \?)+\)')
+
+_NO_SPACE_BEFORE = {',', ')', '.', '::', ';', ']'}
+_NO_SPACE_AFTER = {'(', '.', '::', '['}
+
+
+def normalize_query(query, strip_literals=True):
+    """
+    Канонічний текст запиту: без коментарів, з одним пробілом між токенами,
+    ключові слова та ідентифікатори без лапок — у нижньому регістрі.
+    Якщо strip_literals, рядкові й числові літерали замінюються на '?'.
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(query):
+        kind = match.lastgroup
+        text = match.group()
+        if kind in ('comment', 'space'):
+            continue
+        if kind in ('string', 'estring', 'dollar', 'number'):
+            tokens.append('?' if strip_literals else text)
+        elif kind in ('word', 'op'):
+            tokens.append(text.lower())
+        else:
+            tokens.append(text)
+
+    # Крапка з комою в кінці не змінює запит
+    while tokens and tokens[-1] == ';':
+        tokens.pop()
+
+    parts = []
+    for i, token in enumerate(tokens):
+        if i and token not in _NO_SPACE_BEFORE and tokens[i - 1] not in _NO_SPACE_AFTER:
+            parts.append(' ')
+        parts.append(token)
+    normalized = ''.join(parts)
+
+    if strip_literals:
+        normalized = _PLACEHOLDER_LIST_RE.sub('(?)', normalized)
+    return normalized
+
+
+def fingerprint_query(query):
+    """Повертає (fingerprint, canonical_query): sha1 канонічного тексту та сам текст."""
+    canonical = normalize_query(query)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest(), canonical
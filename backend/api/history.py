@@ -0,0 +1,250 @@
+"""
+Буферизований запис історії SQL-запитів (SQLHistory).
+
+Замість SQLHistory.objects.create(...) у кожному запиті записи складаються
+в буфер процесу і пишуться пачкою через bulk_create фоновим потоком —
+коли буфер досягає MAX_SIZE або минає FLUSH_INTERVAL секунд. Пачка, яку не вдалося
+записати через недоступність бази (OperationalError/InterfaceError), повертається в
+буфер і пишеться з наступним скиданням; разом з новими записами буфер не перевищує
+MAX_PENDING (понад нього відкидаються найстаріші). Пачка з помилкою даних відкидається,
+бо повтор її не виправить.
+
+При звичайному завершенні процесу буфер скидається (atexit); записи, що не встигли
+потрапити в базу до SIGKILL чи аварійного завершення (до FLUSH_INTERVAL секунд або
+до MAX_PENDING записів, поки база недоступна), втрачаються.
+
+Під час скидання кожен запит зводиться до відбитка (QueryFingerprint): агрегати
+відбитка оновлюються одним UPDATE на групу, а рядок історії зберігає власний
+текст лише тоді, коли він відрізняється від sample_query відбитка. Перед видаленням
+відбитка (зокрема каскадом разом із базою викладача) його sample_query копіюється
+назад у такі рядки, тож історія не втрачає текст запиту.
+"""
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, InterfaceError, OperationalError, close_old_connections, transaction
+from django.db.models import F
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .fingerprint import fingerprint_query
+from .models import QueryFingerprint, SQLHistory
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger('api.slow_queries')
+
+DEFAULT_BUFFER_SETTINGS = {
+    'ENABLED': True,         # False — писати одразу (зручно для тестів і shell)
+    'MAX_SIZE': 100,         # Скидати, щойно набралося стільки записів
+    'FLUSH_INTERVAL': 2.0,   # ...або щонайменше раз на стільки секунд
+    'MAX_PENDING': 10000,    # Поки база недоступна, буфер тримає не більше стількох записів (найстаріші відкидаються)
+}
+
+
+class SQLHistoryBuffer:
+    """Потокобезпечний буфер записів SQLHistory з фоновим скиданням."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending = []
+        self._thread = None
+        self._pid = None
+
+    @property
+    def config(self):
+        return {**DEFAULT_BUFFER_SETTINGS, **getattr(settings, 'SQL_HISTORY_BUFFER', {})}
+
+    def add(self, user, query, database=None, task=None, duration_ms=None, status=SQLHistory.Status.OK,
+            rows_returned=None, rows_affected=None, sandbox_name='', executed_at=None):
+        """
+        Додає запис історії. Час виконання фіксується тут, а не під час запису в базу.
+        Запити, довші за SLOW_QUERY_THRESHOLD_MS, додатково пишуться в журнал повільних запитів.
+        """
+        record = {
+            'user_id': user.pk,
+            'query': query,
+            'database_id': database.pk if database else None,
+            'task_id': task.pk if task else None,
+            'duration_ms': duration_ms,
+            'status': status,
+            'rows_returned': rows_returned,
+            'rows_affected': rows_affected,
+            'sandbox_name': sandbox_name or '',
+            'executed_at': executed_at or timezone.now(),
+        }
+        threshold = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 1000)
+        if duration_ms is not None and duration_ms >= threshold:
+            slow_query_logger.warning(
+                f"{duration_ms:.1f} ms status={status} user={user.pk} "
+                f"database={record['database_id']} task={record['task_id']} sandbox={sandbox_name} "
+                f"rows={rows_returned if rows_returned is not None else rows_affected}: {query[:500]}"
+            )
+        config = self.config
+        if not config['ENABLED']:
+            try:
+                self._write([record])
+            except (OperationalError, InterfaceError) as e:
+                logger.error(f"Failed to write SQL history record: {e}")
+            return
+
+        with self._lock:
+            self._pending.append(record)
+            self._trim(config)
+            full = len(self._pending) >= config['MAX_SIZE']
+            self._ensure_thread()
+        if full:
+            self._wakeup.set()
+
+    def _trim(self, config):
+        # Викликається під self._lock
+        overflow = len(self._pending) - config['MAX_PENDING']
+        if overflow > 0:
+            del self._pending[:overflow]
+            logger.warning(f"SQL history buffer overflow: dropped {overflow} records")
+
+    def flush(self):
+        """
+        Синхронно записує все, що накопичилося в буфері. Якщо база недоступна, пачка
+        повертається на початок буфера (у межах MAX_PENDING) і помилка прокидається далі.
+        """
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+        try:
+            self._write(batch)
+        except (OperationalError, InterfaceError):
+            with self._lock:
+                self._pending[:0] = batch
+                self._trim(self.config)
+            logger.warning(f"SQL history database unavailable: {len(batch)} records returned to the buffer")
+            raise
+
+    def _ensure_thread(self):
+        # Після fork (gunicorn --preload) потік батьківського процесу не існує
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='sql-history-writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.config['FLUSH_INTERVAL'])
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"SQL history flush failed: {e}")
+
+    def _write(self, batch):
+        """Записує пачку; помилки з'єднання прокидаються (flush поверне пачку в буфер)."""
+        try:
+            with transaction.atomic():
+                fingerprints = self._resolve_fingerprints(batch)
+                entries = []
+                for record in batch:
+                    fp = fingerprints[record['key']]
+                    entries.append(SQLHistory(
+                        user_id=record['user_id'],
+                        database_id=record['database_id'],
+                        task_id=record['task_id'],
+                        fingerprint=fp,
+                        query='' if record['query'] == fp.sample_query else record['query'],
+                        status=record['status'],
+                        duration_ms=record['duration_ms'],
+                        rows_returned=record['rows_returned'],
+                        rows_affected=record['rows_affected'],
+                        sandbox_name=record['sandbox_name'],
+                        executed_at=record['executed_at'],
+                    ))
+                SQLHistory.objects.bulk_create(entries, batch_size=500)
+        except (OperationalError, InterfaceError):
+            raise
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} SQL history records: {e}")
+
+    def _resolve_fingerprints(self, batch):
+        """
+        Групує записи за (відбиток, користувач, база), оновлює агрегати QueryFingerprint
+        і повертає словник ключ -> QueryFingerprint.
+        """
+        groups = {}
+        for record in batch:
+            fp_hash, canonical = fingerprint_query(record['query'])
+            key = (fp_hash, record['user_id'], record['database_id'])
+            record['key'] = key
+            duration_ms = record['duration_ms'] or 0.0
+            group = groups.get(key)
+            if group is None:
+                groups[key] = {
+                    'canonical': canonical,
+                    'sample': record['query'],
+                    'count': 1,
+                    'total': duration_ms,
+                    'max': duration_ms,
+                    'first': record['executed_at'],
+                    'last': record['executed_at'],
+                }
+            else:
+                group['count'] += 1
+                group['total'] += duration_ms
+                group['max'] = max(group['max'], duration_ms)
+                group['first'] = min(group['first'], record['executed_at'])
+                group['last'] = max(group['last'], record['executed_at'])
+
+        resolved = {}
+        for key, group in groups.items():
+            resolved[key] = self._upsert_fingerprint(key, group)
+        return resolved
+
+    def _upsert_fingerprint(self, key, group):
+        fp_hash, user_id, database_id = key
+        lookup = {'fingerprint': fp_hash, 'user_id': user_id, 'database_id': database_id}
+        updated = QueryFingerprint.objects.filter(**lookup).update(
+            execution_count=F('execution_count') + group['count'],
+            total_duration_ms=F('total_duration_ms') + group['total'],
+            max_duration_ms=Greatest(F('max_duration_ms'), group['max']),
+            last_seen=Greatest(F('last_seen'), group['last']),
+        )
+        if not updated:
+            try:
+                with transaction.atomic():
+                    return QueryFingerprint.objects.create(
+                        **lookup,
+                        canonical_query=group['canonical'],
+                        sample_query=group['sample'],
+                        execution_count=group['count'],
+                        total_duration_ms=group['total'],
+                        max_duration_ms=group['max'],
+                        first_seen=group['first'],
+                        last_seen=group['last'],
+                    )
+            except IntegrityError:
+                # Інший процес щойно створив цей відбиток — додаємо свої агрегати до нього
+                return self._upsert_fingerprint(key, group)
+        return QueryFingerprint.objects.only('id', 'sample_query').get(**lookup)
+
+
+history_buffer = SQLHistoryBuffer()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        history_buffer.flush()
+    except Exception as e:
+        logger.error(f"SQL history records lost at exit: {e}")
+
+
+@receiver(pre_delete, sender=QueryFingerprint)
+def _keep_history_text(sender, instance, **kwargs):
+    # SQLHistory.fingerprint обнулиться (SET_NULL) — рядкам без власного тексту повертаємо sample_query
+    SQLHistory.objects.filter(fingerprint=instance, query='').update(query=instance.sample_query)
@@ -0,0 +1,115 @@
+"""
+Фонова перевірка (ingestion) завантажених дампів баз викладачів.
+
+Після завантаження чи заміни дампу TeacherDatabase отримує стан 'pending', і в черзі
+фонових завдань (api/jobs.py) запускається ingest: дамп відновлюється в нову базу на
+сервері пісочниць 'default', для неї збираються розмір, кількість таблиць і рядків та
+схема, після чого база стає шаблоном пісочниць (api/sandbox_templates.py). Тож перший
+студент не чекає на відновлення дампу, а помилка в дампі видна викладачу одразу
+(стан 'failed' і ingestion_error), а не під час заняття.
+
+Дампи, завантажені до появи перевірки, з помилкою або з перевіркою, що зависла в
+'running' довше за STALE_MINUTES (наприклад, процес перезапустився), обробляє команда:
+
+    python manage.py ingest_dumps
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from psycopg2 import sql
+
+from . import jobs, placement, sandbox_templates
+from .models import TeacherDatabase
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INGESTION_SETTINGS = {
+    'ENABLED': True,
+    'PREBUILD_ALL_SERVERS': False,   # Будувати шаблон і на решті серверів settings.SANDBOX_DATABASES
+    'STALE_MINUTES': 30,             # Перевірка в 'running' довше за стільки хвилин вважається завислою
+}
+
+Status = TeacherDatabase.IngestionStatus
+
+
+def ingestion_settings():
+    return {**DEFAULT_INGESTION_SETTINGS, **getattr(settings, 'DUMP_INGESTION', {})}
+
+
+def enqueue(teacher_db):
+    """Позначає дамп як 'pending' і ставить його перевірку в чергу після коміту транзакції."""
+    TeacherDatabase.objects.filter(pk=teacher_db.pk).update(ingestion_status=Status.PENDING, ingestion_error='')
+    teacher_db.ingestion_status = Status.PENDING
+    teacher_db.ingestion_error = ''
+    if ingestion_settings()['ENABLED']:
+        transaction.on_commit(lambda: jobs.submit(ingest, teacher_db.pk))
+
+
+def claimable():
+    """Умова для баз, які можна взяти на перевірку: не 'running' або перевірка зависла."""
+    cutoff = timezone.now() - timedelta(minutes=ingestion_settings()['STALE_MINUTES'])
+    return ~Q(ingestion_status=Status.RUNNING) | Q(ingestion_started_at__isnull=True) | \
+        Q(ingestion_started_at__lt=cutoff)
+
+
+def inspect_database(cursor):
+    """Розмір бази, таблиці схеми public з кількістю рядків і колонками."""
+    cursor.execute("SELECT pg_database_size(current_database())")
+    size = cursor.fetchone()[0]
+    cursor.execute("""
+        SELECT c.table_name, c.column_name, c.data_type, c.is_nullable = 'NO'
+        FROM information_schema.columns c
+        JOIN information_schema.tables t
+          ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+        WHERE c.table_schema = 'public' AND t.table_type = 'BASE TABLE'
+        ORDER BY c.table_name, c.ordinal_position
+    """)
+    schema = {}
+    for table, column, data_type, notnull in cursor.fetchall():
+        schema.setdefault(table, {'rows': 0, 'columns': []})['columns'].append(
+            {'name': column, 'type': data_type, 'notnull': notnull})
+    for table, info in schema.items():
+        cursor.execute(sql.SQL("SELECT count(*) FROM {}").format(sql.Identifier('public', table)))
+        info['rows'] = cursor.fetchone()[0]
+    return size, schema
+
+
+def ingest(teacher_db_id):
+    """
+    Перевіряє дамп бази викладача teacher_db_id і будує його шаблон; результат і стан
+    записуються в TeacherDatabase. Повертає True, якщо дамп відновився.
+    """
+    claimed = TeacherDatabase.objects.filter(claimable(), pk=teacher_db_id) \
+        .update(ingestion_status=Status.RUNNING, ingestion_error='', ingestion_started_at=timezone.now())
+    if not claimed:
+        # Бази вже немає або її саме перевіряє інше завдання
+        return False
+    teacher_db = TeacherDatabase.objects.get(pk=teacher_db_id)
+    try:
+        restore_seconds, (size, schema) = sandbox_templates.ingest_template(
+            teacher_db, 'sql_dump', 'dump_sha256', inspect_database)
+    except Exception as e:
+        logger.warning(f"Ingestion of teacher database {teacher_db_id} failed: {e}")
+        TeacherDatabase.objects.filter(pk=teacher_db_id).update(
+            ingestion_status=Status.FAILED, ingestion_error=str(e), ingested_at=timezone.now())
+        return False
+
+    TeacherDatabase.objects.filter(pk=teacher_db_id).update(
+        ingestion_status=Status.READY, ingestion_error='', ingested_at=timezone.now(),
+        restore_seconds=restore_seconds, database_size_bytes=size, table_count=len(schema),
+        row_count=sum(info['rows'] for info in schema.values()), dump_schema=schema)
+    logger.info(f"Ingested teacher database {teacher_db_id}: {len(schema)} tables in {restore_seconds:.2f}s")
+
+    if ingestion_settings()['PREBUILD_ALL_SERVERS']:
+        for server in placement.servers():
+            if server == placement.DEFAULT_SERVER:
+                continue
+            try:
+                sandbox_templates.get_template(teacher_db, 'sql_dump', 'dump_sha256', server=server)
+            except Exception as e:
+                logger.warning(f"Failed to prebuild template of teacher database {teacher_db_id} on {server}: {e}")
+    return True
@@ -0,0 +1,52 @@
+"""
+Фонові завдання в межах процесу.
+
+Повільні операції з базами, результат яких не потрібен у відповіді (наприклад,
+DROP DATABASE після скидання пісочниці), виконуються в пулі потоків:
+
+    jobs.submit(sandbox_manager.drop, temp_db)
+
+Помилки пишуться в журнал; після завдання закриваються з'єднання Django ORM потоку.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOBS_SETTINGS = {
+    'MAX_WORKERS': 4,   # Потоків для фонових завдань у процесі
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def jobs_settings():
+    return {**DEFAULT_JOBS_SETTINGS, **getattr(settings, 'BACKGROUND_JOBS', {})}
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=jobs_settings()['MAX_WORKERS'],
+                                           thread_name_prefix='api-jobs')
+        return _executor
+
+
+def submit(fn, *args, **kwargs):
+    """Ставить fn(*args, **kwargs) у чергу фонових завдань; повертає Future."""
+    def run():
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            logger.exception(f"Background job {getattr(fn, '__name__', fn)} failed")
+            raise
+        finally:
+            close_old_connections()
+
+    return _get_executor().submit(run)
@@ -0,0 +1,90 @@
+"""
+Single-flight для дорогих побудов баз (пісочниці, шаблони, репліки) між процесами.
+
+Блокування — сесійний advisory lock PostgreSQL в основній базі застосунку, ключ якого
+обчислюється з частин ключа (наприклад, ('sandbox', user, workspace, source)). Перший
+запит будує базу, решта чекають на блокуванні й після нього знаходять готовий запис,
+замість того щоб відновлювати той самий дамп паралельно. Блокування знімається
+автоматично, якщо з'єднання процесу, що будує, обірвалося.
+
+Блокування тримає окреме з'єднання: очікування — блокуючий pg_advisory_lock під
+SET lock_timeout (без опитування), а з'єднання Django запиту лишається вільним і не
+змішує блокування з його транзакціями.
+
+    with locks.single_flight('template', digest, server):
+        ...  # повторна перевірка запису, потім побудова
+"""
+import hashlib
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+from . import metrics
+
+DEFAULT_SINGLE_FLIGHT_SETTINGS = {
+    'WAIT_TIMEOUT': 120,     # Секунд очікування на побудову, яку виконує інший запит
+}
+
+LOCK_NOT_AVAILABLE = '55P03'
+
+
+class SingleFlightTimeout(Exception):
+    """Побудова, на яку чекав запит, не завершилася за WAIT_TIMEOUT."""
+
+
+def single_flight_settings():
+    return {**DEFAULT_SINGLE_FLIGHT_SETTINGS, **getattr(settings, 'SINGLE_FLIGHT', {})}
+
+
+def lock_id(*parts):
+    """64-бітний ключ advisory lock для частин ключа parts."""
+    digest = hashlib.sha1(':'.join(str(part) for part in parts).encode()).digest()
+    return int.from_bytes(digest[:8], 'big', signed=True)
+
+
+def _lock_connection():
+    """Нове autocommit-з'єднання з основною базою лише для advisory lock."""
+    conn = connection.get_new_connection(connection.get_connection_params())
+    conn.autocommit = True
+    return conn
+
+
+def _acquire(conn, key, timeout):
+    """Бере блокування key на conn; повертає True, якщо довелося чекати."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", [key])
+        if cursor.fetchone()[0]:
+            return False
+        cursor.execute(f"SET lock_timeout = {int(timeout * 1000)}")
+        cursor.execute("SELECT pg_advisory_lock(%s)", [key])
+    return True
+
+
+@contextmanager
+def single_flight(kind, *parts):
+    """
+    Виконує блок ексклюзивно для ключа (kind, *parts) в усіх процесах застосунку.
+    kind — мітка для метрик (sandbox / template / replica / etalon). Поза PostgreSQL
+    блок виконується без блокування.
+    """
+    if connection.vendor != 'postgresql':
+        yield
+        return
+
+    key = lock_id(kind, *parts)
+    timeout = single_flight_settings()['WAIT_TIMEOUT']
+    conn = _lock_connection()
+    try:
+        try:
+            waited = _acquire(conn, key, timeout)
+        except connection.Database.Error as e:
+            if (getattr(e, 'sqlstate', None) or getattr(e, 'pgcode', None)) != LOCK_NOT_AVAILABLE:
+                raise
+            metrics.SINGLE_FLIGHT_WAITS.inc(kind=kind, result='timeout')
+            raise SingleFlightTimeout(f"Timed out waiting for {kind} build {parts}") from e
+        metrics.SINGLE_FLIGHT_WAITS.inc(kind=kind, result='waited' if waited else 'acquired')
+        yield
+    finally:
+        # Закриття з'єднання знімає сесійне блокування
+        conn.close()
@@ -0,0 +1,364 @@
+"""
+Відтворюваний бенчмарк пісочниць: створення тимчасової бази, затримка запитів
+редактора, отримання схеми та перевірка рішень (TaskViewSet.submit).
+
+Запити проходять увесь стек Django/DRF (APIClient, без мережі) проти локального
+кластера пісочниць (settings.SANDBOX_DATABASES). Результати пишуться в JSON разом з комітом git,
+тож два прогони можна порівняти:
+
+    python manage.py benchmark --output bench-before.json
+    python manage.py benchmark --output bench-after.json --compare bench-before.json
+
+Для сценарію grading потрібна утиліта psql (нею submit відновлює еталон).
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import uuid
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api import replicas, sandbox_templates
+from api.history import history_buffer
+from api.models import Task, TeacherDatabase, TemporaryDatabase, User
+from api.sandbox_manager import sandbox_manager
+
+SCENARIOS = ('provision', 'query', 'schema', 'grading')
+
+# Перший запит сесії в сценарії provision; now() — щоб відповідь не бралася з кешу результатів
+PROVISION_QUERIES = {
+    'read': 'SELECT now()',
+    'write': 'CREATE TEMP TABLE bench_probe (id int)',
+}
+
+# Запити редактора до sample_database.sql: від тривіального до агрегації з JOIN
+EDITOR_QUERIES = {
+    'trivial': 'SELECT 1',
+    'scan': 'SELECT * FROM customers',
+    'join_aggregate': (
+        'SELECT c.country, COUNT(DISTINCT o.order_id) AS orders, SUM(oi.subtotal) AS revenue '
+        'FROM customers c JOIN orders o ON o.customer_id = c.customer_id '
+        'JOIN order_items oi ON oi.order_id = o.order_id GROUP BY c.country ORDER BY revenue DESC'
+    ),
+}
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(',') if v]
+
+
+def _float_list(value):
+    return [float(v) for v in value.split(',') if v]
+
+
+def _stats(samples):
+    """Зведення вибірки в мілісекундах."""
+    ordered = sorted(samples)
+    result = {
+        'count': len(ordered),
+        'min': ordered[0],
+        'median': statistics.median(ordered),
+        'mean': statistics.fmean(ordered),
+        'max': ordered[-1],
+    }
+    if len(ordered) >= 2:
+        cuts = statistics.quantiles(ordered, n=100, method='inclusive')
+        result['p95'] = cuts[94]
+        result['p99'] = cuts[98]
+    else:
+        result['p95'] = result['p99'] = ordered[0]
+    return {key: round(value, 3) if isinstance(value, float) else value for key, value in result.items()}
+
+
+def _items_dump(rows, table='items'):
+    """Дамп однієї таблиці з rows рядків (generate_series — файл лишається маленьким)."""
+    return (
+        f"CREATE TABLE {table} (\n"
+        "    item_id INTEGER PRIMARY KEY,\n"
+        "    name VARCHAR(50) NOT NULL,\n"
+        "    category INTEGER NOT NULL,\n"
+        "    price NUMERIC(10, 2) NOT NULL,\n"
+        "    in_stock BOOLEAN NOT NULL\n"
+        ");\n"
+        f"INSERT INTO {table} SELECT g, 'item_' || g, g % 100, (g % 1000) / 10.0, g % 3 <> 0 "
+        f"FROM generate_series(1, {int(rows)}) AS g;\n"
+    )
+
+
+def _wide_dump(tables, columns=6):
+    """Дамп з tables невеликих таблиць по columns колонок — для бенчмарку схеми."""
+    parts = []
+    for t in range(tables):
+        cols = ',\n'.join(['    id INTEGER PRIMARY KEY'] +
+                          [f'    col_{c} VARCHAR(50)' for c in range(1, columns)])
+        parts.append(f"CREATE TABLE table_{t:04d} (\n{cols}\n);\n")
+    return ''.join(parts)
+
+
+def _git_info():
+    root = Path(settings.BASE_DIR).parent
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'dirty': None}
+    return {'commit': commit, 'dirty': dirty}
+
+
+class Command(BaseCommand):
+    help = ("Бенчмарк пісочниць: створення тимчасової бази, запити редактора, схема, перевірка рішень. "
+            "Результати — JSON для порівняння між комітами.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', default=','.join(SCENARIOS),
+                            help=f"Сценарії через кому ({', '.join(SCENARIOS)})")
+        parser.add_argument('--repeat', type=int, default=5, help='Повторів кожного виміру')
+        parser.add_argument('--dump', action='append', default=[],
+                            help='Додатковий SQL-дамп для сценарію provision (можна кілька разів)')
+        parser.add_argument('--large-rows', type=int, default=1_000_000,
+                            help='Рядків у згенерованому великому дампі для provision (0 — пропустити)')
+        parser.add_argument('--table-counts', type=_int_list, default=[10, 50, 200],
+                            help='Кількості таблиць для сценарію schema')
+        parser.add_argument('--row-counts', type=_int_list, default=[1_000, 10_000, 100_000],
+                            help='Розміри таблиці для сценарію grading')
+        parser.add_argument('--diff-rates', type=_float_list, default=[0.0, 0.01, 0.1],
+                            help='Частка змінених студентом рядків для сценарію grading')
+        parser.add_argument('--output', help='Файл для JSON-результатів')
+        parser.add_argument('--compare', help='JSON попереднього прогону: вивести зміну медіан')
+
+    def handle(self, *args, **options):
+        scenarios = [s for s in options['only'].split(',') if s]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Невідомі сценарії: {', '.join(sorted(unknown))}")
+        self.repeat = max(1, options['repeat'])
+        self.options = options
+        self.results = []
+        self.fixtures = []
+
+        self.user = User.objects.create_user(
+            username=f'bench_{uuid.uuid4().hex[:8]}',
+            email=f'bench_{uuid.uuid4().hex[:8]}@example.com',
+            password=uuid.uuid4().hex,
+            role=User.Role.TEACHER,
+        )
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                for scenario in scenarios:
+                    self.stdout.write(self.style.MIGRATE_HEADING(f'== {scenario}'))
+                    getattr(self, f'bench_{scenario}')()
+        finally:
+            self._cleanup()
+
+        report = {'meta': self._meta(), 'results': self.results}
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Результати записано в {options['output']}"))
+        else:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+        if options['compare']:
+            self._compare(options['compare'])
+
+    # ------------------------------------------------------------------
+    # Сценарії
+    # ------------------------------------------------------------------
+    def bench_provision(self):
+        """
+        Перший запит нової сесії. read: SELECT іде до спільної репліки дампу (створюється
+        лише для першої сесії); write: запит на запис — CREATE DATABASE + відновлення дампу.
+        """
+        dumps = [('sample_database', self._sample_dump_path().read_text(encoding='utf-8'))]
+        if self.options['large_rows']:
+            dumps.append((f"items_{self.options['large_rows']}", _items_dump(self.options['large_rows'])))
+        for path in self.options['dump']:
+            dumps.append((Path(path).name, Path(path).read_text(encoding='utf-8')))
+
+        for label, content in dumps:
+            teacher_db = self._teacher_database(label, content)
+            for first_query, query in PROVISION_QUERIES.items():
+                samples = []
+                for _ in range(self.repeat):
+                    client = self._client()
+                    elapsed, _ = self._timed(client.post, reverse('execute-sql'),
+                                             {'query': query, 'database_id': teacher_db.id}, format='json')
+                    samples.append(elapsed)
+                    self._drop_sandboxes()
+                self._record('provision', {'dump': label, 'dump_bytes': len(content.encode('utf-8')),
+                                           'first_query': first_query}, samples)
+
+    def bench_query(self):
+        """Затримка запитів редактора в уже створеній пісочниці sample_database."""
+        teacher_db = self._teacher_database('sample_database', self._sample_dump_path().read_text(encoding='utf-8'))
+        client = self._client()
+        self._request(client.post, reverse('execute-sql'), {'query': 'SELECT 1', 'database_id': teacher_db.id},
+                      format='json')
+        for label, query in EDITOR_QUERIES.items():
+            samples = []
+            for _ in range(self.repeat):
+                elapsed, _ = self._timed(client.post, reverse('execute-sql'),
+                                         {'query': query, 'database_id': teacher_db.id}, format='json')
+                samples.append(elapsed)
+            self._record('query', {'query': label}, samples)
+        self._drop_sandboxes()
+
+    def bench_schema(self):
+        """get_database_schema для баз з різною кількістю таблиць (пісочниця вже існує)."""
+        for tables in self.options['table_counts']:
+            teacher_db = self._teacher_database(f'tables_{tables}', _wide_dump(tables))
+            client = self._client()
+            url = reverse('database-schema', args=[teacher_db.id])
+            self._request(client.get, url)
+            samples = []
+            for _ in range(self.repeat):
+                elapsed, _ = self._timed(client.get, url)
+                samples.append(elapsed)
+            self._record('schema', {'tables': tables}, samples)
+            self._drop_sandboxes()
+
+    def bench_grading(self):
+        """TaskViewSet.submit для різних розмірів таблиці та частки розбіжностей з еталоном."""
+        for rows in self.options['row_counts']:
+            dump = _items_dump(rows)
+            task = self._task(f'items_{rows}', dump)
+            for rate in self.options['diff_rates']:
+                samples = []
+                for _ in range(self.repeat):
+                    client = self._client()
+                    self._request(client.get, reverse('task-schema', args=[task.id]))
+                    changed = int(rows * rate)
+                    if changed:
+                        self._mutate_student_sandbox(client, task, changed)
+                    elapsed, _ = self._timed(client.post, reverse('task-submit', args=[task.id]))
+                    samples.append(elapsed)
+                    self._drop_sandboxes()
+                self._record('grading', {'rows': rows, 'diff_rate': rate}, samples)
+
+    # ------------------------------------------------------------------
+    # Допоміжне
+    # ------------------------------------------------------------------
+    def _client(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client
+
+    def _request(self, method, *args, **kwargs):
+        response = method(*args, **kwargs)
+        if response.status_code >= 400:
+            raise CommandError(f"{args[0]} -> {response.status_code}: {response.content[:500]!r}")
+        return response
+
+    def _timed(self, method, *args, **kwargs):
+        started = time.perf_counter()
+        response = self._request(method, *args, **kwargs)
+        return (time.perf_counter() - started) * 1000, response
+
+    def _record(self, benchmark, params, samples):
+        stats = _stats(samples)
+        self.results.append({'benchmark': benchmark, 'params': params, 'samples_ms': samples, 'stats': stats})
+        label = ' '.join(f'{k}={v}' for k, v in params.items())
+        self.stdout.write(f"  {benchmark:<10} {label:<40} median {stats['median']:>10.1f} ms   "
+                          f"p95 {stats['p95']:>10.1f} ms")
+
+    def _sample_dump_path(self):
+        for candidate in (Path(settings.BASE_DIR).parent / 'sample_database.sql',
+                          Path(settings.BASE_DIR) / 'sample_database.sql'):
+            if candidate.exists():
+                return candidate
+        raise CommandError('sample_database.sql не знайдено')
+
+    def _teacher_database(self, label, content):
+        teacher_db = TeacherDatabase(name=f'bench {label}', teacher=self.user)
+        teacher_db.sql_dump.save(f'bench_{label}.sql', ContentFile(content.encode('utf-8')), save=True)
+        self.fixtures.append(teacher_db)
+        return teacher_db
+
+    def _task(self, label, dump):
+        task = Task(title=f'bench {label}')
+        # Еталон збігається з початковим станом: розбіжності вносить лише _mutate_student_sandbox
+        task.original_db.save(f'bench_{label}.sql', ContentFile(dump.encode('utf-8')), save=False)
+        task.etalon_db.save(f'bench_{label}_etalon.sql', ContentFile(dump.encode('utf-8')), save=False)
+        task.save()
+        self.fixtures.append(task)
+        return task
+
+    def _mutate_student_sandbox(self, client, task, changed):
+        # Через API, як студент: перший запит на запис створює приватну копію замість спільної репліки
+        self._request(client.post, reverse('task-execute', args=[task.id]),
+                      {'sql': f'UPDATE items SET price = price + 1 WHERE item_id <= {int(changed)}'}, format='json')
+
+    def _drop_sandboxes(self):
+        """Видаляє всі тимчасові бази користувача бенчмарку, щоб наступний вимір почався з нуля."""
+        temp_dbs = list(TemporaryDatabase.objects.filter(user=self.user))
+        if not temp_dbs:
+            return
+        for temp_db in temp_dbs:
+            # Пісочниця може бути на будь-якому сервері кластера (TemporaryDatabase.server)
+            sandbox_manager.drop(temp_db)
+            temp_db.delete()
+
+    def _cleanup(self):
+        history_buffer.flush()
+        try:
+            self._drop_sandboxes()
+        finally:
+            for obj in self.fixtures:
+                for field in ('sql_dump', 'original_db', 'etalon_db'):
+                    file = getattr(obj, field, None)
+                    if file:
+                        file.delete(save=False)
+                obj.delete()
+            self.user.delete()
+            replicas.drop_stale_replicas()
+            sandbox_templates.drop_stale_templates()
+
+    def _meta(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT version()')
+            pg_version = cursor.fetchone()[0]
+        return {
+            'git': _git_info(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'host': platform.node(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'postgres': pg_version,
+            'cpu_count': os.cpu_count(),
+            'repeat': self.repeat,
+        }
+
+    def _compare(self, path):
+        with open(path, encoding='utf-8') as f:
+            baseline = json.load(f)
+        previous = {
+            (r['benchmark'], json.dumps(r['params'], sort_keys=True)): r['stats']['median']
+            for r in baseline['results']
+        }
+        commit = (baseline['meta'].get('git') or {}).get('commit') or '?'
+        self.stdout.write(self.style.MIGRATE_HEADING(f'== порівняння з {path} ({commit[:10]})'))
+        for result in self.results:
+            key = (result['benchmark'], json.dumps(result['params'], sort_keys=True))
+            if key not in previous:
+                continue
+            before, after = previous[key], result['stats']['median']
+            ratio = after / before if before else float('inf')
+            label = ' '.join(f'{k}={v}' for k, v in result['params'].items())
+            line = f"  {result['benchmark']:<10} {label:<40} {before:>10.1f} -> {after:>10.1f} ms  x{ratio:.2f}"
+            if ratio > 1.1:
+                line = self.style.ERROR(line)
+            elif ratio < 0.9:
+                line = self.style.SUCCESS(line)
+            self.stdout.write(line)
@@ -0,0 +1,533 @@
+"""
+Генератор великих наборів даних зі схемою sample_database.sql
+(customers, categories, products, orders, order_items, reviews, employees + представлення).
+
+Обсяг задається приблизною загальною кількістю рядків (--scale, від 10 тис. до 50 млн);
+розподіли наближені до реальних: кілька активних клієнтів роблять більшість замовлень,
+популярні товари продаються частіше, рейтинги зміщені до 4–5, замовлення зростають з часом
+і частішають у листопаді–грудні. Генерація детермінована (--seed) і потокова — дані не
+тримаються в пам'яті, тож 50 млн рядків не потребують гігабайтів RAM.
+
+Результат — або SQL-дамп (--output), або одразу заповнена база (--database):
+
+    python manage.py generate_dataset --scale 1000000 --output shop_1m.sql
+    python manage.py generate_dataset --scale 1000000 --format insert --output shop_1m_upload.sql
+    python manage.py generate_dataset --scale 10000000 --database shop_10m --as-template
+
+Формат copy (COPY ... FROM stdin) відновлюється лише через psql; для завантаження через
+інтерфейс вчителя (дамп виконується одним cursor.execute) потрібен --format insert.
+Обмеження зовнішніх ключів і первинні ключі створюються після завантаження даних.
+"""
+import datetime
+import random
+import time
+from pathlib import Path
+
+import psycopg2
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import sandbox_db
+
+FIRST_NAMES = [
+    'John', 'Jane', 'Michael', 'Emily', 'David', 'Sarah', 'Robert', 'Jennifer', 'William', 'Elizabeth',
+    'James', 'Patricia', 'Richard', 'Linda', 'Thomas', 'Barbara', 'Charles', 'Susan', 'Joseph', 'Margaret',
+    'Daniel', 'Nancy', 'Olena', 'Andrii', 'Iryna', 'Taras', 'Oksana', 'Dmytro', 'Natalia', 'Serhii',
+    'Maria', 'Jose', 'Anna', 'Lukas', 'Sofia', 'Mateo', 'Emma', 'Noah', 'Mia', 'Liam',
+]
+LAST_NAMES = [
+    'Doe', 'Smith', 'Johnson', 'Brown', 'Wilson', 'Taylor', 'Anderson', 'Thomas', 'Jackson', 'White',
+    'Clark', 'Lewis', 'Walker', 'Hall', 'Young', 'Allen', 'Scott', 'Green', 'Baker', 'Nelson',
+    'Carter', 'Mitchell', 'Shevchenko', 'Kovalenko', 'Bondarenko', 'Tkachenko', 'Kravchenko', 'Melnyk',
+    'Garcia', 'Martinez', 'Muller', 'Schmidt', 'Rossi', 'Novak', 'Kowalski', 'Dubois', 'Silva', 'Costa',
+]
+# (місто, країна, вага): більшість клієнтів з кількох великих міст
+CITIES = [
+    ('New York', 'USA', 14), ('Los Angeles', 'USA', 10), ('Chicago', 'USA', 7), ('Houston', 'USA', 5),
+    ('Seattle', 'USA', 4), ('Boston', 'USA', 4), ('Kyiv', 'Ukraine', 9), ('Lviv', 'Ukraine', 5),
+    ('Chernivtsi', 'Ukraine', 3), ('Kharkiv', 'Ukraine', 4), ('Berlin', 'Germany', 6), ('Munich', 'Germany', 3),
+    ('Warsaw', 'Poland', 5), ('Krakow', 'Poland', 3), ('Paris', 'France', 5), ('Lyon', 'France', 2),
+    ('Madrid', 'Spain', 4), ('Lisbon', 'Portugal', 2), ('Toronto', 'Canada', 4), ('London', 'UK', 7),
+]
+STREETS = ['Main St', 'Oak Ave', 'Pine Rd', 'Maple Dr', 'Cedar Ln', 'Birch Blvd', 'Elm St', 'Walnut Ave',
+           'Cherry Rd', 'Spruce Dr', 'Shevchenka St', 'Franka Ave', 'Central Sq', 'Park Ln', 'River Rd']
+CATEGORIES = [
+    ('Electronics', 'Electronic devices and accessories', 250.0),
+    ('Clothing', 'Apparel and fashion items', 40.0),
+    ('Books', 'Books, e-books, and publications', 25.0),
+    ('Home & Kitchen', 'Home appliances and kitchen items', 80.0),
+    ('Sports & Outdoors', 'Sports equipment and outdoor gear', 60.0),
+    ('Toys & Games', 'Toys, board games and puzzles', 30.0),
+    ('Beauty', 'Cosmetics and personal care', 20.0),
+    ('Garden', 'Garden tools and supplies', 45.0),
+    ('Automotive', 'Car parts and accessories', 90.0),
+    ('Office', 'Office supplies and furniture', 35.0),
+    ('Pet Supplies', 'Food and accessories for pets', 25.0),
+    ('Health', 'Health and wellness products', 30.0),
+]
+ADJECTIVES = ['Basic', 'Pro', 'Ultra', 'Classic', 'Smart', 'Compact', 'Deluxe', 'Eco', 'Mini', 'Max',
+              'Premium', 'Lite', 'Wireless', 'Vintage', 'Sport']
+NOUNS = ['Phone', 'Laptop', 'Headphones', 'Shirt', 'Jeans', 'Guide', 'Coffee Maker', 'Blender', 'Mat',
+         'Racket', 'Lamp', 'Chair', 'Backpack', 'Watch', 'Camera', 'Kettle', 'Jacket', 'Novel', 'Puzzle', 'Ball']
+DEPARTMENTS = [('Sales', 'Sales Representative'), ('IT', 'IT Specialist'), ('Marketing', 'Marketing Specialist'),
+               ('Human Resources', 'HR Specialist'), ('Logistics', 'Warehouse Operator'),
+               ('Support', 'Support Agent'), ('Finance', 'Accountant')]
+REVIEW_TEXTS = {
+    1: ['Terrible quality, broke after a week', 'Not as described', 'Would not recommend'],
+    2: ['Disappointing', 'Below expectations', 'Works, but barely'],
+    3: ['Average product', 'OK for the price', 'Does the job'],
+    4: ['Good product', 'Happy with the purchase', 'Good value for money'],
+    5: ['Excellent!', 'Best purchase this year', 'Exceeded my expectations', 'Highly recommend'],
+}
+RATING_WEIGHTS = [5, 7, 13, 30, 45]
+
+# Кінець періоду даних фіксований, щоб однаковий seed давав однаковий дамп
+END_DATE = datetime.datetime(2024, 12, 31, 23, 59, 59)
+ORDER_DAYS = 3 * 365
+
+SCHEMA_SQL = """
+CREATE TABLE customers (
+    customer_id SERIAL,
+    first_name VARCHAR(50) NOT NULL,
+    last_name VARCHAR(50) NOT NULL,
+    email VARCHAR(100) NOT NULL,
+    phone VARCHAR(20),
+    address VARCHAR(200),
+    city VARCHAR(50),
+    country VARCHAR(50),
+    postal_code VARCHAR(20),
+    registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE categories (
+    category_id SERIAL,
+    category_name VARCHAR(50) NOT NULL,
+    description TEXT
+);
+
+CREATE TABLE products (
+    product_id SERIAL,
+    product_name VARCHAR(100) NOT NULL,
+    category_id INTEGER,
+    price DECIMAL(10, 2) NOT NULL,
+    description TEXT,
+    stock_quantity INTEGER NOT NULL DEFAULT 0,
+    is_available BOOLEAN DEFAULT TRUE
+);
+
+CREATE TABLE orders (
+    order_id SERIAL,
+    customer_id INTEGER,
+    order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    total_amount DECIMAL(12, 2) NOT NULL,
+    status VARCHAR(20) CHECK (status IN ('Pending', 'Processing', 'Shipped', 'Delivered', 'Cancelled')) DEFAULT 'Pending'
+);
+
+CREATE TABLE order_items (
+    item_id SERIAL,
+    order_id INTEGER,
+    product_id INTEGER,
+    quantity INTEGER NOT NULL,
+    unit_price DECIMAL(10, 2) NOT NULL,
+    subtotal DECIMAL(10, 2) GENERATED ALWAYS AS (quantity * unit_price) STORED
+);
+
+CREATE TABLE reviews (
+    review_id SERIAL,
+    product_id INTEGER,
+    customer_id INTEGER,
+    rating INTEGER CHECK (rating BETWEEN 1 AND 5),
+    comment TEXT,
+    review_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE employees (
+    employee_id SERIAL,
+    first_name VARCHAR(50) NOT NULL,
+    last_name VARCHAR(50) NOT NULL,
+    email VARCHAR(100) NOT NULL,
+    hire_date DATE NOT NULL,
+    job_title VARCHAR(50) NOT NULL,
+    department VARCHAR(50),
+    salary DECIMAL(10, 2),
+    manager_id INTEGER
+);
+"""
+
+# Ключі та обмеження після завантаження даних — так COPY не перевіряє кожен рядок
+CONSTRAINTS_SQL = """
+ALTER TABLE customers ADD PRIMARY KEY (customer_id);
+ALTER TABLE customers ADD UNIQUE (email);
+ALTER TABLE categories ADD PRIMARY KEY (category_id);
+ALTER TABLE products ADD PRIMARY KEY (product_id);
+ALTER TABLE orders ADD PRIMARY KEY (order_id);
+ALTER TABLE order_items ADD PRIMARY KEY (item_id);
+ALTER TABLE reviews ADD PRIMARY KEY (review_id);
+ALTER TABLE employees ADD PRIMARY KEY (employee_id);
+ALTER TABLE employees ADD UNIQUE (email);
+ALTER TABLE products ADD FOREIGN KEY (category_id) REFERENCES categories(category_id);
+ALTER TABLE orders ADD FOREIGN KEY (customer_id) REFERENCES customers(customer_id);
+ALTER TABLE order_items ADD FOREIGN KEY (order_id) REFERENCES orders(order_id);
+ALTER TABLE order_items ADD FOREIGN KEY (product_id) REFERENCES products(product_id);
+ALTER TABLE reviews ADD FOREIGN KEY (product_id) REFERENCES products(product_id);
+ALTER TABLE reviews ADD FOREIGN KEY (customer_id) REFERENCES customers(customer_id);
+ALTER TABLE employees ADD FOREIGN KEY (manager_id) REFERENCES employees(employee_id);
+"""
+
+SEQUENCES = [
+    ('customers', 'customer_id'), ('categories', 'category_id'), ('products', 'product_id'),
+    ('orders', 'order_id'), ('order_items', 'item_id'), ('reviews', 'review_id'), ('employees', 'employee_id'),
+]
+
+VIEWS_MARKER = '-- Create some useful views'
+
+
+def _views_sql():
+    """Представлення беремо з sample_database.sql, щоб схема лишалася ідентичною."""
+    for candidate in (Path(settings.BASE_DIR).parent / 'sample_database.sql',
+                      Path(settings.BASE_DIR) / 'sample_database.sql'):
+        if candidate.exists():
+            text = candidate.read_text(encoding='utf-8')
+            if VIEWS_MARKER in text:
+                return text[text.index(VIEWS_MARKER):]
+    return ''
+
+
+def _row_counts(scale, overrides):
+    """Кількість рядків кожної таблиці для приблизно scale рядків разом."""
+    counts = {
+        'categories': len(CATEGORIES),
+        'employees': min(max(scale // 10_000, 12), 5_000),
+        'customers': max(scale // 10, 10),
+        'products': max(scale // 100, 10),
+        'orders': max(scale // 4, 10),
+        'reviews': max(scale // 12, 10),
+    }
+    counts.update({key: value for key, value in overrides.items() if value})
+    return counts
+
+
+def _skewed(rng, n, power):
+    """Випадковий id 1..n з перекосом до малих id (power > 1 — сильніший перекос)."""
+    return int(n * rng.random() ** power) + 1
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    text = str(value)
+    if any(ch in text for ch in '\\\t\n\r'):
+        text = text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+    return text
+
+
+def _sql_value(value):
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class DatasetGenerator:
+    """Потокові генератори рядків кожної таблиці; id послідовні з 1, тож FK завжди цілісні."""
+
+    def __init__(self, counts, seed):
+        self.counts = counts
+        self.seed = seed
+        self.product_prices = None
+        self.order_items_total = 0
+
+    def _rng(self, table):
+        return random.Random(f'{self.seed}:{table}')
+
+    def tables(self):
+        """Список (таблиця, колонки, функція-генератор рядків) у порядку завантаження."""
+        return [
+            ('categories', ['category_id', 'category_name', 'description'], self.categories),
+            ('employees', ['employee_id', 'first_name', 'last_name', 'email', 'hire_date', 'job_title',
+                           'department', 'salary', 'manager_id'], self.employees),
+            ('customers', ['customer_id', 'first_name', 'last_name', 'email', 'phone', 'address', 'city',
+                           'country', 'postal_code', 'registration_date'], self.customers),
+            ('products', ['product_id', 'product_name', 'category_id', 'price', 'description', 'stock_quantity',
+                          'is_available'], self.products),
+            ('orders', ['order_id', 'customer_id', 'order_date', 'total_amount', 'status'], self.orders),
+            ('order_items', ['item_id', 'order_id', 'product_id', 'quantity', 'unit_price'], self.order_items),
+            ('reviews', ['review_id', 'product_id', 'customer_id', 'rating', 'comment', 'review_date'], self.reviews),
+        ]
+
+    def categories(self):
+        for i, (name, description, _) in enumerate(CATEGORIES, start=1):
+            yield (i, name, description)
+
+    def employees(self):
+        rng = self._rng('employees')
+        yield (1, 'James', 'Clark', 'james.clark@company.com', '2015-01-15', 'CEO', 'Executive', 150000.00, None)
+        members = {}
+        for i in range(2, self.counts['employees'] + 1):
+            department, title = DEPARTMENTS[(i - 2) % len(DEPARTMENTS)]
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            hire_date = datetime.date(2015, 1, 15) + datetime.timedelta(days=rng.randint(30, 3600))
+            if department not in members:
+                # Перший працівник відділу — його керівник, підпорядкований CEO
+                members[department] = [i]
+                yield (i, first, last, f'{first}.{last}.{i}@company.com'.lower(), hire_date.isoformat(),
+                       f'{department} Manager'[:50], department, round(rng.uniform(80000, 120000), 2), 1)
+                continue
+            # Керівник — хтось із відділу з меншим id (частіше сам керівник відділу): ієрархія без циклів
+            department_members = members[department]
+            manager = department_members[0] if rng.random() < 0.5 else rng.choice(department_members)
+            department_members.append(i)
+            yield (i, first, last, f'{first}.{last}.{i}@company.com'.lower(), hire_date.isoformat(),
+                   title, department, round(rng.lognormvariate(10.9, 0.25), 2), manager)
+
+    def customers(self):
+        rng = self._rng('customers')
+        cities = [(city, country) for city, country, _ in CITIES]
+        weights = [weight for _, _, weight in CITIES]
+        registration_span = 5 * 365 * 86400
+        for i in range(1, self.counts['customers'] + 1):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            city, country = rng.choices(cities, weights)[0]
+            registered = END_DATE - datetime.timedelta(seconds=int(registration_span * rng.random() ** 0.7))
+            yield (
+                i, first, last, f'{first}.{last}.{i}@example.com'.lower(),
+                f'555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}' if rng.random() < 0.9 else None,
+                f'{rng.randint(1, 9999)} {rng.choice(STREETS)}',
+                city, country, f'{rng.randint(1000, 99999):05d}',
+                registered.isoformat(sep=' '),
+            )
+
+    def products(self):
+        rng = self._rng('products')
+        prices = []
+        for i in range(1, self.counts['products'] + 1):
+            category = _skewed(rng, len(CATEGORIES), 1.5)
+            _, _, mean_price = CATEGORIES[category - 1]
+            price = round(max(0.99, rng.lognormvariate(0, 0.6) * mean_price), 2)
+            prices.append(price)
+            stock = 0 if rng.random() < 0.05 else rng.randint(1, 500)
+            yield (i, f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}', category, price,
+                   f'{CATEGORIES[category - 1][0]} item #{i}', stock, stock > 0 or rng.random() < 0.2)
+        self.product_prices = prices
+
+    def _order_lines(self, rng):
+        """Позиції одного замовлення: [(product_id, quantity, unit_price)]."""
+        count = 1
+        while count < 8 and rng.random() < 0.45:
+            count += 1
+        lines = []
+        for _ in range(count):
+            product = _skewed(rng, self.counts['products'], 3)
+            quantity = 1 if rng.random() < 0.7 else rng.randint(2, 5)
+            lines.append((product, quantity, self.product_prices[product - 1]))
+        return lines
+
+    def _order_rng(self, order_id):
+        # Окремий детермінований генератор на замовлення: orders і order_items генеруються
+        # двома проходами, але дають однакові позиції без збереження їх у пам'яті
+        return random.Random(self.seed * 1_000_003 + order_id)
+
+    def orders(self):
+        rng = self._rng('orders')
+        for i in range(1, self.counts['orders'] + 1):
+            lines = self._order_lines(self._order_rng(i))
+            total = round(sum(quantity * price for _, quantity, price in lines), 2)
+            # Замовлень більшає ближче до кінця періоду, плюс пік у листопаді–грудні
+            days_ago = ORDER_DAYS * (1 - rng.random() ** 0.75)
+            order_date = END_DATE - datetime.timedelta(days=int(days_ago), seconds=rng.randint(0, 86399))
+            if order_date.month < 11 and rng.random() < 0.12:
+                order_date = order_date.replace(month=rng.choice((11, 12)), day=min(order_date.day, 28))
+            age = (END_DATE - order_date).days
+            if age > 30:
+                status = rng.choices(['Delivered', 'Cancelled', 'Shipped'], [90, 7, 3])[0]
+            elif age > 7:
+                status = rng.choices(['Delivered', 'Shipped', 'Processing', 'Cancelled'], [50, 35, 10, 5])[0]
+            else:
+                status = rng.choices(['Pending', 'Processing', 'Shipped', 'Cancelled'], [40, 35, 20, 5])[0]
+            yield (i, _skewed(rng, self.counts['customers'], 2), order_date.isoformat(sep=' '), total, status)
+
+    def order_items(self):
+        item_id = 0
+        for order_id in range(1, self.counts['orders'] + 1):
+            for product, quantity, price in self._order_lines(self._order_rng(order_id)):
+                item_id += 1
+                yield (item_id, order_id, product, quantity, price)
+        self.order_items_total = item_id
+
+    def reviews(self):
+        rng = self._rng('reviews')
+        for i in range(1, self.counts['reviews'] + 1):
+            rating = rng.choices(range(1, 6), RATING_WEIGHTS)[0]
+            review_date = END_DATE - datetime.timedelta(seconds=rng.randint(0, ORDER_DAYS * 86400))
+            yield (i, _skewed(rng, self.counts['products'], 3), rng.randint(1, self.counts['customers']), rating,
+                   rng.choice(REVIEW_TEXTS[rating]) if rng.random() < 0.8 else None, review_date.isoformat(sep=' '))
+
+
+class _CopyStream:
+    """Файлоподібний об'єкт для cursor.copy_expert: віддає рядки генератора у форматі COPY text."""
+
+    def __init__(self, rows, on_row=None):
+        self.rows = iter(rows)
+        self.buffer = b''
+        self.on_row = on_row
+
+    def read(self, size=-1):
+        chunks = [self.buffer]
+        length = len(self.buffer)
+        while size < 0 or length < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            line = ('\t'.join(_copy_value(value) for value in row) + '\n').encode('utf-8')
+            chunks.append(line)
+            length += len(line)
+            if self.on_row:
+                self.on_row()
+        data = b''.join(chunks)
+        if size < 0:
+            self.buffer = b''
+            return data
+        self.buffer = data[size:]
+        return data[:size]
+
+
+class Command(BaseCommand):
+    help = ("Генерує набір даних зі схемою sample_database.sql заданого обсягу (10 тис. – 50 млн рядків): "
+            "SQL-дамп (COPY або INSERT) чи одразу заповнену базу PostgreSQL.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=100_000,
+                            help='Приблизна загальна кількість рядків (10000 – 50000000)')
+        parser.add_argument('--customers', type=int, help='Перевизначити кількість клієнтів')
+        parser.add_argument('--products', type=int, help='Перевизначити кількість товарів')
+        parser.add_argument('--orders', type=int, help='Перевизначити кількість замовлень')
+        parser.add_argument('--reviews', type=int, help='Перевизначити кількість відгуків')
+        parser.add_argument('--seed', type=int, default=42, help='Seed генератора (однаковий seed — однаковий дамп)')
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument('--output', help='Записати SQL-дамп у файл')
+        target.add_argument('--database', help='Створити базу з цим іменем і завантажити дані напряму (COPY)')
+        parser.add_argument('--format', choices=['copy', 'insert'], default='copy',
+                            help='Формат дампу: copy (для psql, швидко) або insert (для завантаження через інтерфейс)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Рядків в одному INSERT (--format insert)')
+        parser.add_argument('--replace', action='store_true', help='Видалити базу --database, якщо вона існує')
+        parser.add_argument('--as-template', action='store_true',
+                            help='Позначити базу --database як шаблон (CREATE DATABASE ... TEMPLATE)')
+
+    def handle(self, *args, **options):
+        scale = options['scale']
+        if not 10_000 <= scale <= 50_000_000:
+            raise CommandError('--scale має бути в межах 10000 – 50000000')
+        counts = _row_counts(scale, {key: options[key] for key in ('customers', 'products', 'orders', 'reviews')})
+        generator = DatasetGenerator(counts, options['seed'])
+        self.stdout.write('Таблиці: ' + ', '.join(f'{table}={count}' for table, count in counts.items())
+                          + f", order_items≈{int(counts['orders'] * 1.8)}")
+
+        started = time.perf_counter()
+        if options['output']:
+            self._write_dump(generator, options)
+        else:
+            self._load_database(generator, options)
+        self.stdout.write(self.style.SUCCESS(f'Готово за {time.perf_counter() - started:.1f} с'))
+
+    def _progress(self, table, rows, started):
+        self.stdout.write(f'  {table:<12} {rows:>12,} рядків  {time.perf_counter() - started:8.1f} с')
+
+    def _epilogue(self):
+        parts = [CONSTRAINTS_SQL]
+        for table, column in SEQUENCES:
+            parts.append(f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), "
+                         f"COALESCE((SELECT MAX({column}) FROM {table}), 0) + 1, false);\n")
+        parts.append('\n' + _views_sql())
+        parts.append('\nANALYZE;\n')
+        return ''.join(parts)
+
+    def _write_dump(self, generator, options):
+        path = options['output']
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"-- Generated by manage.py generate_dataset --scale {options['scale']} "
+                    f"--seed {options['seed']} --format {options['format']}\n")
+            f.write(SCHEMA_SQL)
+            for table, columns, rows_fn in generator.tables():
+                started = time.perf_counter()
+                count = 0
+                f.write(f'\n-- {table}\n')
+                if options['format'] == 'copy':
+                    f.write(f"COPY {table} ({', '.join(columns)}) FROM stdin;\n")
+                    for row in rows_fn():
+                        f.write('\t'.join(_copy_value(value) for value in row))
+                        f.write('\n')
+                        count += 1
+                    f.write('\\.\n')
+                else:
+                    batch = []
+                    header = f"INSERT INTO {table} ({', '.join(columns)}) VALUES\n"
+                    for row in rows_fn():
+                        batch.append('(' + ', '.join(_sql_value(value) for value in row) + ')')
+                        count += 1
+                        if len(batch) >= options['batch_size']:
+                            f.write(header + ',\n'.join(batch) + ';\n')
+                            batch = []
+                    if batch:
+                        f.write(header + ',\n'.join(batch) + ';\n')
+                self._progress(table, count, started)
+            f.write('\n')
+            f.write(self._epilogue())
+        size = Path(path).stat().st_size
+        self.stdout.write(f'Дамп: {path} ({size / 1024 / 1024:.1f} МБ)')
+
+    def _load_database(self, generator, options):
+        db_name = options['database']
+        if not db_name.replace('_', '').isalnum():
+            raise CommandError("Ім'я бази може містити лише літери, цифри та _")
+        db_config = sandbox_db.server_config()
+        connect_params = {
+            'user': db_config['USER'],
+            'password': db_config['PASSWORD'],
+            'host': db_config['HOST'],
+            'port': db_config['PORT'],
+        }
+        admin_conn = psycopg2.connect(dbname=db_config['NAME'], **connect_params)
+        admin_conn.autocommit = True
+        admin_cursor = admin_conn.cursor()
+        try:
+            admin_cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", (db_name,))
+            if admin_cursor.fetchone():
+                if not options['replace']:
+                    raise CommandError(f'База {db_name} вже існує (додайте --replace)')
+                admin_cursor.execute(f'ALTER DATABASE "{db_name}" IS_TEMPLATE false')
+                admin_cursor.execute(f'DROP DATABASE "{db_name}"')
+            admin_cursor.execute(f'CREATE DATABASE "{db_name}"{sandbox_db.tablespace_clause()}')
+
+            conn = psycopg2.connect(dbname=db_name, **connect_params)
+            try:
+                cursor = conn.cursor()
+                cursor.execute(SCHEMA_SQL)
+                for table, columns, rows_fn in generator.tables():
+                    started = time.perf_counter()
+                    counter = [0]
+
+                    def count_row(counter=counter):
+                        counter[0] += 1
+                    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN",
+                                       _CopyStream(rows_fn(), on_row=count_row))
+                    self._progress(table, counter[0], started)
+                started = time.perf_counter()
+                cursor.execute(self._epilogue().replace('\nANALYZE;\n', '\n'))
+                conn.commit()
+                self.stdout.write(f'  ключі, обмеження, представлення {time.perf_counter() - started:8.1f} с')
+                conn.autocommit = True
+                cursor.execute('ANALYZE')
+            finally:
+                conn.close()
+
+            if options['as_template']:
+                admin_cursor.execute(f'ALTER DATABASE "{db_name}" IS_TEMPLATE true')
+                self.stdout.write(f'База {db_name} позначена як шаблон: CREATE DATABASE ... TEMPLATE {db_name}')
+        finally:
+            admin_cursor.close()
+            admin_conn.close()
@@ -0,0 +1,42 @@
+"""
+Перевірка дампів баз викладачів, які ще не пройшли фонову перевірку (api/ingestion.py):
+бази, завантажені до її появи, і дампи з помилкою після виправлення середовища.
+
+    python manage.py ingest_dumps              # стани pending, failed і завислі running
+    python manage.py ingest_dumps --id 3 --id 5
+    python manage.py ingest_dumps --all        # повторно всі бази
+"""
+from django.core.management.base import BaseCommand
+
+from api import ingestion
+from api.models import TeacherDatabase
+
+
+class Command(BaseCommand):
+    help = 'Перевіряє дампи баз викладачів і будує їхні бази-шаблони'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--id', type=int, action='append', default=[], help='id бази викладача')
+        parser.add_argument('--all', action='store_true', help='Перевірити всі бази, зокрема готові')
+
+    def handle(self, *args, **options):
+        queryset = TeacherDatabase.objects.order_by('id')
+        if options['id']:
+            queryset = queryset.filter(id__in=options['id'])
+        elif not options['all']:
+            queryset = queryset.filter(ingestion.claimable(), ingestion_status__in=[
+                TeacherDatabase.IngestionStatus.PENDING, TeacherDatabase.IngestionStatus.RUNNING,
+                TeacherDatabase.IngestionStatus.FAILED])
+        failed = 0
+        for teacher_db_id in queryset.values_list('id', flat=True):
+            if ingestion.ingest(teacher_db_id):
+                teacher_db = TeacherDatabase.objects.get(pk=teacher_db_id)
+                self.stdout.write(self.style.SUCCESS(
+                    f"{teacher_db_id}: {teacher_db.table_count} таблиць, {teacher_db.row_count} рядків, "
+                    f"{teacher_db.restore_seconds:.2f} с"))
+            else:
+                failed += 1
+                error = TeacherDatabase.objects.filter(pk=teacher_db_id).values_list('ingestion_error', flat=True).first()
+                self.stdout.write(self.style.ERROR(f"{teacher_db_id}: {error or 'пропущено'}"))
+        if failed:
+            self.stdout.write(self.style.WARNING(f"Не вдалося перевірити: {failed}"))
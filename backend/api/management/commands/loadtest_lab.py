@@ -0,0 +1,331 @@
+"""
+Навантажувальний тест «лабораторне заняття»: N синтетичних студентів одночасно
+відкривають задачу, виконують набір запитів і здають рішення під дедлайн.
+
+Кожен студент — окремий потік з власними cookie (отже, власною сесією й
+тимчасовою базою) та JWT. Сценарій студента:
+
+    1. реєстрація і вхід нового користувача — POST auth/register/, auth/login/
+    2. GET tasks/{pk}/schema/ — створення пісочниці задачі
+    3. запити зі сценарію через POST tasks/{pk}/execute/ (та execute-sql/, якщо задано --database-id)
+    4. POST tasks/{pk}/submit/ — одночасно для всіх, якщо задано --submit-at
+
+Тест працює проти вже запущеного сервера (--base-url). Паралельно опитується
+pg_database, щоб отримати пікову кількість баз на сервері PostgreSQL.
+
+    python manage.py loadtest_lab --task 3 --students 200 --ramp 60 --submit-at 180
+"""
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+
+import psycopg2
+from django.core.management.base import BaseCommand, CommandError
+
+from api import sandbox_db
+
+DEFAULT_QUERIES = [
+    'SELECT 1',
+    "SELECT table_name FROM information_schema.tables WHERE table_schema = 'public'",
+    "SELECT COUNT(*) FROM information_schema.columns WHERE table_schema = 'public'",
+]
+
+
+class LoadStats:
+    """Потокобезпечний збір затримок і помилок за типами операцій."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def add(self, operation, elapsed_ms, error=None):
+        with self._lock:
+            self.latencies.setdefault(operation, []).append(elapsed_ms)
+            if error is not None:
+                self.errors.setdefault(operation, {})
+                self.errors[operation][error] = self.errors[operation].get(error, 0) + 1
+
+    def summary(self, wall_seconds):
+        operations = {}
+        total = 0
+        total_errors = 0
+        for operation, samples in sorted(self.latencies.items()):
+            ordered = sorted(samples)
+            errors = sum(self.errors.get(operation, {}).values())
+            total += len(ordered)
+            total_errors += errors
+            cuts = statistics.quantiles(ordered, n=100, method='inclusive') if len(ordered) >= 2 else [ordered[0]] * 99
+            operations[operation] = {
+                'count': len(ordered),
+                'errors': errors,
+                'error_rate': round(errors / len(ordered), 4),
+                'error_kinds': self.errors.get(operation, {}),
+                'throughput_rps': round(len(ordered) / wall_seconds, 3) if wall_seconds else None,
+                'p50_ms': round(cuts[49], 1),
+                'p90_ms': round(cuts[89], 1),
+                'p95_ms': round(cuts[94], 1),
+                'p99_ms': round(cuts[98], 1),
+                'max_ms': round(ordered[-1], 1),
+            }
+        return {
+            'requests': total,
+            'errors': total_errors,
+            'error_rate': round(total_errors / total, 4) if total else 0.0,
+            'throughput_rps': round(total / wall_seconds, 3) if wall_seconds else None,
+            'operations': operations,
+        }
+
+
+class DatabaseCountPoller(threading.Thread):
+    """Фоновий потік: кількість баз у pg_database з інтервалом interval секунд."""
+
+    def __init__(self, interval):
+        super().__init__(name='loadtest-db-poller', daemon=True)
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.baseline = None
+        self.peak = None
+        self.samples = []
+        self.error = None
+
+    def run(self):
+        try:
+            conn = sandbox_db.connect()
+        except psycopg2.Error as e:
+            self.error = str(e)
+            return
+        started = time.perf_counter()
+        try:
+            cursor = conn.cursor()
+            while True:
+                cursor.execute("SELECT COUNT(*) FROM pg_database WHERE NOT datistemplate")
+                count = cursor.fetchone()[0]
+                if self.baseline is None:
+                    self.baseline = count
+                self.peak = count if self.peak is None else max(self.peak, count)
+                self.samples.append((round(time.perf_counter() - started, 1), count))
+                if self.stop_event.wait(self.interval):
+                    break
+        except psycopg2.Error as e:
+            self.error = str(e)
+        finally:
+            conn.close()
+
+
+class SyntheticStudent:
+    """HTTP-клієнт одного студента: власний CookieJar (сесія) і JWT."""
+
+    def __init__(self, base_url, stats, timeout):
+        self.base_url = base_url.rstrip('/') + '/'
+        self.stats = stats
+        self.timeout = timeout
+        self.token = None
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+
+    def request(self, operation, method, path, payload=None):
+        """Виконує запит, записує затримку; повертає (status, тіло JSON або None)."""
+        headers = {'Accept': 'application/json'}
+        data = None
+        if payload is not None:
+            data = json.dumps(payload).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+
+        started = time.perf_counter()
+        status, body, error = None, None, None
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                status = response.status
+                body = response.read()
+        except urllib.error.HTTPError as e:
+            status = e.code
+            body = e.read()
+            error = f'http_{e.code}'
+        except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+            reason = getattr(e, 'reason', e)
+            error = 'timeout' if isinstance(reason, TimeoutError) else type(reason).__name__
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stats.add(operation, elapsed_ms, error)
+
+        try:
+            parsed = json.loads(body) if body else None
+        except ValueError:
+            parsed = None
+        return status, parsed
+
+
+class Command(BaseCommand):
+    help = ("Симуляція лабораторного заняття: N студентів одночасно відкривають задачу, виконують запити "
+            "і здають рішення. Звіт: пропускна здатність, перцентилі затримок, частка помилок, пік кількості баз.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000/api/', help='Адреса API сервера')
+        parser.add_argument('--task', type=int, required=True, help='ID задачі')
+        parser.add_argument('--database-id', type=int,
+                            help='ID бази вчителя: додатково виконувати запити через execute-sql/')
+        parser.add_argument('--students', type=int, default=50, help='Кількість синтетичних студентів')
+        parser.add_argument('--ramp', type=float, default=60.0,
+                            help='За скільки секунд усі студенти відкривають задачу')
+        parser.add_argument('--queries', help='Файл зі сценарієм запитів (один запит на рядок)')
+        parser.add_argument('--iterations', type=int, default=3, help='Скільки разів студент проходить сценарій')
+        parser.add_argument('--think-time', type=float, default=2.0,
+                            help='Середня пауза між запитами студента, с (експоненційний розподіл)')
+        parser.add_argument('--submit-at', type=float,
+                            help='Секунда від старту, коли всі студенти одночасно здають рішення (дедлайн). '
+                                 'Без неї кожен здає одразу після своїх запитів')
+        parser.add_argument('--no-submit', action='store_true', help='Не викликати submit')
+        parser.add_argument('--user-prefix', default='loadtest', help='Префікс імен синтетичних користувачів')
+        parser.add_argument('--password', default='LoadTest-Passw0rd!', help='Пароль синтетичних користувачів')
+        parser.add_argument('--timeout', type=float, default=120.0, help='Таймаут HTTP-запиту, с')
+        parser.add_argument('--poll-interval', type=float, default=0.5,
+                            help='Інтервал опитування pg_database, с (0 — не опитувати)')
+        parser.add_argument('--cleanup', action='store_true',
+                            help='Після тесту видалити синтетичних користувачів і їхні тимчасові бази '
+                                 '(потрібен доступ до тієї ж бази, що й у сервера)')
+        parser.add_argument('--seed', type=int, help='Seed генератора випадкових пауз')
+        parser.add_argument('--output', help='Файл для JSON-звіту')
+
+    def handle(self, *args, **options):
+        if options['students'] < 1:
+            raise CommandError('--students має бути >= 1')
+        if options['queries']:
+            with open(options['queries'], encoding='utf-8') as f:
+                queries = [line.strip() for line in f if line.strip() and not line.startswith('--')]
+        else:
+            queries = DEFAULT_QUERIES
+        if not queries:
+            raise CommandError('Сценарій запитів порожній')
+
+        self.options = options
+        self.queries = queries
+        self.stats = LoadStats()
+        self.random = random.Random(options['seed'])
+        self.random_lock = threading.Lock()
+        self.run_id = uuid.uuid4().hex[:6]
+
+        poller = None
+        if options['poll_interval'] > 0:
+            poller = DatabaseCountPoller(options['poll_interval'])
+            poller.start()
+
+        self.stdout.write(f"{options['students']} студентів, задача {options['task']}, {options['base_url']}")
+        self.started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['students'], thread_name_prefix='student') as pool:
+            futures = [pool.submit(self._student, index) for index in range(options['students'])]
+            for future in futures:
+                future.result()
+        wall_seconds = time.perf_counter() - self.started
+
+        if poller is not None:
+            poller.stop_event.set()
+            poller.join()
+
+        report = {
+            'config': {key: options[key] for key in (
+                'base_url', 'task', 'database_id', 'students', 'ramp', 'iterations', 'think_time',
+                'submit_at', 'no_submit')},
+            'queries': len(queries),
+            'wall_seconds': round(wall_seconds, 2),
+            **self.stats.summary(wall_seconds),
+        }
+        if poller is not None:
+            report['databases'] = {
+                'baseline': poller.baseline,
+                'peak': poller.peak,
+                'peak_delta': (poller.peak - poller.baseline) if poller.peak is not None else None,
+                'error': poller.error,
+                'samples': poller.samples,
+            }
+        self._print(report)
+        if options['cleanup']:
+            self._cleanup()
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Звіт записано в {options['output']}"))
+
+    def _pause(self, mean):
+        if mean <= 0:
+            return
+        with self.random_lock:
+            delay = self.random.expovariate(1 / mean)
+        time.sleep(delay)
+
+    def _student(self, index):
+        options = self.options
+        task = options['task']
+        student = SyntheticStudent(options['base_url'], self.stats, options['timeout'])
+
+        # Студенти приходять рівномірно протягом --ramp секунд
+        arrival = options['ramp'] * index / options['students']
+        time.sleep(max(0.0, arrival - (time.perf_counter() - self.started)))
+
+        username = f"{options['user_prefix']}_{self.run_id}_{index:04d}"
+        student.request('register', 'POST', 'auth/register/', {
+            'username': username,
+            'email': f'{username}@example.com',
+            'password': options['password'],
+            'role': 'STUDENT',
+        })
+        status, body = student.request('login', 'POST', 'auth/login/',
+                                       {'username': username, 'password': options['password']})
+        if status != 200 or not body or 'access' not in body:
+            return
+        student.token = body['access']
+
+        student.request('task_schema', 'GET', f'tasks/{task}/schema/')
+
+        for _ in range(options['iterations']):
+            for query in self.queries:
+                self._pause(options['think_time'])
+                student.request('task_execute', 'POST', f'tasks/{task}/execute/', {'sql': query})
+                if options['database_id']:
+                    student.request('execute_sql', 'POST', 'execute-sql/',
+                                    {'query': query, 'database_id': options['database_id']})
+
+        if options['no_submit']:
+            return
+        if options['submit_at'] is not None:
+            time.sleep(max(0.0, options['submit_at'] - (time.perf_counter() - self.started)))
+        student.request('submit', 'POST', f'tasks/{task}/submit/')
+
+    def _cleanup(self):
+        from api.models import TemporaryDatabase, User
+        from api.sandbox_manager import sandbox_manager
+
+        users = User.objects.filter(username__startswith=f"{self.options['user_prefix']}_{self.run_id}_")
+        temp_dbs = list(TemporaryDatabase.objects.filter(user__in=users))
+        for temp_db in temp_dbs:
+            # Окрема база чи схема, на сервері, записаному в пісочниці
+            sandbox_manager.drop(temp_db)
+        users.delete()
+        self.stdout.write(f"Видалено {len(temp_dbs)} тимчасових баз і синтетичних користувачів")
+
+    def _print(self, report):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"== {report['requests']} запитів за {report['wall_seconds']} с: "
+            f"{report['throughput_rps']} запит/с, помилок {report['error_rate'] * 100:.1f}%"))
+        self.stdout.write(f"  {'операція':<14}{'к-сть':>7}{'помилки':>9}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+        for operation, row in report['operations'].items():
+            line = (f"  {operation:<14}{row['count']:>7}{row['errors']:>9}{row['p50_ms']:>10.1f}"
+                    f"{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}")
+            self.stdout.write(self.style.ERROR(line) if row['errors'] else line)
+            for kind, count in row['error_kinds'].items():
+                self.stdout.write(f"      {kind}: {count}")
+        databases = report.get('databases')
+        if databases:
+            if databases['error']:
+                self.stdout.write(self.style.WARNING(f"  pg_database недоступна: {databases['error']}"))
+            else:
+                self.stdout.write(f"  баз у PostgreSQL: на старті {databases['baseline']}, "
+                                  f"пік {databases['peak']} (+{databases['peak_delta']})")
@@ -0,0 +1,42 @@
+"""
+Повторна побудова еталонів задач (api/etalons.py), що зависли в pending/running після
+перезапуску процесу (черга фонових завдань живе в пам'яті), або завершилися з помилкою.
+
+    python manage.py rebuild_etalons                  # pending/running довше 30 хвилин
+    python manage.py rebuild_etalons --stale-minutes 5
+    python manage.py rebuild_etalons --failed         # також стан failed
+    python manage.py rebuild_etalons --id 3 --id 5
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from api import etalons
+from api.models import Task
+
+
+class Command(BaseCommand):
+    help = 'Повторно будує завислі або невдалі еталони задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--id', type=int, action='append', default=[], help='id задачі')
+        parser.add_argument('--stale-minutes', type=int, default=30,
+                            help='Вважати завислими побудови в pending/running довше за стільки хвилин')
+        parser.add_argument('--failed', action='store_true', help='Повторити також побудови зі станом failed')
+
+    def handle(self, *args, **options):
+        queryset = etalons.stale_builds(timedelta(minutes=options['stale_minutes']))
+        if options['failed']:
+            queryset = queryset | Task.objects.filter(etalon_status=Task.EtalonStatus.FAILED)
+        if options['id']:
+            queryset = queryset.filter(id__in=options['id'])
+        failed = 0
+        for task_id, etalon_sql in queryset.exclude(etalon_sql='').order_by('id').values_list('id', 'etalon_sql'):
+            if etalons.build(task_id, etalon_sql):
+                self.stdout.write(self.style.SUCCESS(f"{task_id}: еталон збудовано"))
+            else:
+                failed += 1
+                error = Task.objects.filter(pk=task_id).values_list('etalon_error', flat=True).first()
+                self.stdout.write(self.style.ERROR(f"{task_id}: {error or 'пропущено'}"))
+        if failed:
+            self.stdout.write(self.style.WARNING(f"Не вдалося збудувати: {failed}"))
@@ -0,0 +1,321 @@
+"""
+Метрики пісочниць у текстовому форматі Prometheus (без зовнішніх залежностей).
+
+Лічильники й гістограми живуть у пам'яті процесу; /metrics віддає їх разом
+із gauge-метриками, що обчислюються під час збору (кількість активних
+тимчасових баз і їхній сумарний розмір на диску).
+
+Кожен воркер (gunicorn/uvicorn) має власний реєстр, тому Prometheus слід
+налаштовувати на збір з кожного процесу окремо або запускати один воркер.
+
+Розмір пісочниць на диску (pg_database_size кожної бази) кешується на
+METRICS_DISK_CACHE_SECONDS, щоб часті збори не навантажували сервери пісочниць.
+Без DEBUG ендпоінт відкритий лише з токеном METRICS_TOKEN або з мереж
+METRICS_ALLOWED_NETWORKS.
+"""
+import hmac
+import ipaddress
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SANDBOX_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_registry = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(self._render_samples(items))
+        return lines
+
+    def _render_samples(self, items):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in items]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """
+    Gauge; якщо задано collect, значення обчислюються під час збору:
+    collect() повертає список пар (значення міток, значення).
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self):
+        if self.collect is not None:
+            values = {}
+            for label_values, value in self.collect():
+                values[tuple(str(v) for v in label_values)] = value
+            with self._lock:
+                self._values = values
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Вимірює тривалість блоку with у секундах."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_samples(self, items):
+        lines = []
+        for key, (bucket_counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+def _collect_active_sandboxes():
+    from django.db.models import Count
+    from .models import TemporaryDatabase
+    rows = TemporaryDatabase.objects.values('server').annotate(total=Count('id')).values_list('server', 'total')
+    return [((server,), total) for server, total in rows]
+
+
+_disk_samples = None
+_disk_samples_at = 0.0
+_disk_samples_lock = threading.Lock()
+
+
+def _collect_sandbox_disk_bytes():
+    """Розмір пісочниць на диску; результат кешується на METRICS_DISK_CACHE_SECONDS."""
+    global _disk_samples, _disk_samples_at
+    ttl = getattr(settings, 'METRICS_DISK_CACHE_SECONDS', 60)
+    with _disk_samples_lock:
+        if _disk_samples is not None and time.monotonic() - _disk_samples_at < ttl:
+            return _disk_samples
+        samples = _measure_sandbox_disk_bytes()
+        _disk_samples, _disk_samples_at = samples, time.monotonic()
+        return samples
+
+
+def _measure_sandbox_disk_bytes():
+    from . import sandbox_db
+    from .models import TemporaryDatabase
+
+    names_by_server = {}
+    for server, name in TemporaryDatabase.objects.values_list('server', 'database_name'):
+        names_by_server.setdefault(server, []).append(name)
+    samples = []
+    for server, names in names_by_server.items():
+        conn = sandbox_db.connect(alias=server)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT COALESCE(SUM(pg_database_size(datname)), 0) FROM pg_database WHERE datname = ANY(%s)",
+                (names,)
+            )
+            samples.append(((server,), cursor.fetchone()[0]))
+        finally:
+            conn.close()
+    return samples
+
+
+def _collect_result_cache_bytes():
+    from .result_cache import result_cache
+    return [((), result_cache.stats()[1])]
+
+
+# ---------------------------------------------------------------------------
+# Метрики застосунку
+# ---------------------------------------------------------------------------
+SANDBOX_CREATE_SECONDS = Histogram(
+    'sandbox_create_seconds',
+    'Total time to create a sandbox database (CREATE DATABASE + dump restore).',
+    ['source'], buckets=SANDBOX_BUCKETS,
+)
+SANDBOX_RESTORE_SECONDS = Histogram(
+    'sandbox_restore_seconds',
+    'Time spent replaying a SQL dump into a freshly created database.',
+    ['source'], buckets=SANDBOX_BUCKETS,
+)
+SANDBOX_DROP_SECONDS = Histogram(
+    'sandbox_drop_seconds',
+    'Time to drop a sandbox database.',
+    ['source'], buckets=SANDBOX_BUCKETS,
+)
+SANDBOX_LOOKUPS = Counter(
+    'sandbox_lookups_total',
+    'Sandbox lookups by endpoint: hit reuses an existing database, miss builds a new one.',
+    ['endpoint', 'result'],
+)
+SHARED_REPLICA_LOOKUPS = Counter(
+    'shared_replica_lookups_total',
+    'Shared read-only replica lookups (api/replicas.py): miss restores the dump into a new replica.',
+    ['source', 'result'],
+)
+CONNECTION_POOL_LOOKUPS = Counter(
+    'connection_pool_lookups_total',
+    'Async connection pool lookups (api/async_db.py): hit reuses an open pool, miss opens one.',
+    ['result'],
+)
+QUERY_DURATION_SECONDS = Histogram(
+    'query_duration_seconds',
+    'Duration of student statements and schema introspection by endpoint.',
+    ['endpoint', 'status'],
+)
+GRADING_DURATION_SECONDS = Histogram(
+    'grading_duration_seconds',
+    'Time to grade a submission against the etalon database.',
+    ['task'], buckets=SANDBOX_BUCKETS,
+)
+ACTIVE_SANDBOXES = Gauge(
+    'sandbox_active',
+    'Number of TemporaryDatabase records (live sandbox databases) per sandbox server.',
+    ['server'], collect=_collect_active_sandboxes,
+)
+SANDBOX_STORAGE_PLACEMENTS = Counter(
+    'sandbox_storage_placements_total',
+    'Ephemeral databases placed in the fast tablespace or falling back when its budget is exhausted.',
+    ['server', 'tier'],
+)
+SINGLE_FLIGHT_WAITS = Counter(
+    'single_flight_waits_total',
+    'Single-flight build locks (api/locks.py): waited means another request was already building.',
+    ['kind', 'result'],
+)
+SANDBOX_DISK_BYTES = Gauge(
+    'sandbox_disk_bytes',
+    'Total on-disk size of sandbox databases per sandbox server.',
+    ['server'], collect=_collect_sandbox_disk_bytes,
+)
+QUERY_RESULT_CACHE_LOOKUPS = Counter(
+    'query_result_cache_lookups_total',
+    'Read-only query result cache lookups (api/result_cache.py) for pristine sandboxes.',
+    ['result'],
+)
+QUERY_RESULT_CACHE_BYTES = Gauge(
+    'query_result_cache_bytes',
+    'Size of cached query results held by this process.',
+    collect=_collect_result_cache_bytes,
+)
+
+
+def render():
+    """Усі метрики реєстру в текстовому форматі експозиції."""
+    lines = []
+    for metric in _registry:
+        try:
+            lines.extend(metric.render())
+        except Exception as e:
+            # Недоступна база не повинна ламати збір решти метрик
+            lines.append(f'# {metric.name} collection failed: {e}'.replace('\n', ' '))
+    return '\n'.join(lines) + '\n'
+
+
+def _from_allowed_network(request):
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False)
+               for network in getattr(settings, 'METRICS_ALLOWED_NETWORKS', ()))
+
+
+def _allowed(request):
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    return settings.DEBUG or _from_allowed_network(request)
+
+
+def metrics_view(request):
+    """
+    GET /metrics. Якщо задано settings.METRICS_TOKEN, вимагає заголовок
+    Authorization: Bearer <token>. Без токена ендпоінт відкритий лише з DEBUG або для
+    адрес з settings.METRICS_ALLOWED_NETWORKS.
+    """
+    if not _allowed(request):
+        return HttpResponseForbidden('Forbidden')
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_alter_temporarydatabase_teacher_database'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='sqlhistory',
+            options={'ordering': ['-executed_at']},
+        ),
+        migrations.AlterField(
+            model_name='sqlhistory',
+            name='executed_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='teacherdatabase',
+            name='sql_dump',
+            field=models.FileField(upload_to='teacher_dumps/'),
+        ),
+        migrations.AlterField(
+            model_name='temporarydatabase',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='temporarydatabase',
+            name='database_name',
+            field=models.CharField(db_index=True, max_length=100, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='temporarydatabase',
+            name='last_used',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='temporarydatabase',
+            name='session_key',
+            field=models.CharField(db_index=True, max_length=40),
+        ),
+        migrations.AddIndex(
+            model_name='sqlhistory',
+            index=models.Index(fields=['user', '-executed_at'], name='sql_history_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='temporarydatabase',
+            index=models.Index(fields=['user', 'session_key'], name='temp_db_user_session_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='temporarydatabase',
+            index=models.Index(fields=['last_used'], name='temp_db_last_used_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:35
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_sqlhistory_executed_at_default'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RemoveIndex(
+            model_name='sqlhistory',
+            name='sql_history_user_time_idx',
+        ),
+        migrations.AddIndex(
+            model_name='sqlhistory',
+            index=models.Index(fields=['user', '-executed_at', '-id'], name='sql_history_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sqlhistory',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('query'), name='gin_trgm_ops'), name='sql_history_query_trgm_idx'),
+        ),
+    ]
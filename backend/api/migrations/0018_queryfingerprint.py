@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:36
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+import django.db.models.functions.text
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_sqlhistory_keyset_and_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sqlhistory',
+            name='query',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.CreateModel(
+            name='QueryFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=40)),
+                ('canonical_query', models.TextField()),
+                ('sample_query', models.TextField()),
+                ('execution_count', models.PositiveIntegerField(default=0)),
+                ('total_duration_ms', models.FloatField(default=0)),
+                ('max_duration_ms', models.FloatField(default=0)),
+                ('first_seen', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_seen', models.DateTimeField(default=django.utils.timezone.now)),
+                ('database', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='query_fingerprints', to='api.teacherdatabase')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='query_fingerprints', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='sqlhistory',
+            name='fingerprint',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='executions', to='api.queryfingerprint'),
+        ),
+        migrations.AddIndex(
+            model_name='queryfingerprint',
+            index=models.Index(fields=['database', 'fingerprint'], name='query_fp_db_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='queryfingerprint',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('sample_query'), name='gin_trgm_ops'), name='query_fp_sample_trgm_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='queryfingerprint',
+            constraint=models.UniqueConstraint(condition=models.Q(('database__isnull', False)), fields=('fingerprint', 'user', 'database'), name='query_fp_user_db_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='queryfingerprint',
+            constraint=models.UniqueConstraint(condition=models.Q(('database__isnull', True)), fields=('fingerprint', 'user'), name='query_fp_user_nodb_uniq'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_queryfingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sqlhistory',
+            name='duration_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sqlhistory',
+            name='rows_affected',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sqlhistory',
+            name='rows_returned',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sqlhistory',
+            name='sandbox_name',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='sqlhistory',
+            name='status',
+            field=models.CharField(choices=[('ok', 'Успішно'), ('error', 'Помилка'), ('timeout', 'Перевищено ліміт часу')], default='ok', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='sqlhistory',
+            name='task',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sql_history', to='api.task'),
+        ),
+        migrations.AddIndex(
+            model_name='sqlhistory',
+            index=models.Index(fields=['task', 'executed_at'], name='sql_history_task_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sqlhistory',
+            index=models.Index(fields=['database', 'executed_at'], name='sql_history_db_time_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_sqlhistory_execution_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='original_db_sha256',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='teacherdatabase',
+            name='dump_sha256',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='temporarydatabase',
+            name='is_dirty',
+            field=models.BooleanField(default=False),
+        ),
+    ]
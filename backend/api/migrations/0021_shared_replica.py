@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_dump_hash_and_dirty_flag'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SharedReplica',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dump_sha256', models.CharField(max_length=64, unique=True)),
+                ('database_name', models.CharField(max_length=100, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_shared_replica'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SandboxHost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dump_sha256', models.CharField(max_length=64, unique=True)),
+                ('database_name', models.CharField(max_length=100, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='teacherdatabase',
+            name='isolation_mode',
+            field=models.CharField(choices=[('database', 'Окрема база на користувача'), ('schema', 'Окрема схема в спільній базі')], default='database', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='temporarydatabase',
+            name='schema_name',
+            field=models.CharField(blank=True, default='', max_length=63),
+        ),
+        migrations.AlterField(
+            model_name='temporarydatabase',
+            name='database_name',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AddConstraint(
+            model_name='temporarydatabase',
+            constraint=models.UniqueConstraint(fields=('database_name', 'schema_name'), name='temp_db_name_schema_uniq'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_sandbox_template'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SandboxCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('database_name', models.CharField(max_length=100, unique=True)),
+                ('status', models.CharField(choices=[('pending', 'Створюється'), ('ready', 'Готова'), ('failed', 'Помилка')], default='pending', max_length=10)),
+                ('error', models.TextField(blank=True, default='')),
+                ('is_dirty', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('temporary_database', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='api.temporarydatabase')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'constraints': [models.UniqueConstraint(fields=('temporary_database', 'name'), name='checkpoint_sandbox_name_uniq')],
+            },
+        ),
+    ]
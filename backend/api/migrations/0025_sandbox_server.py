@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_sandbox_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sandboxtemplate',
+            name='server',
+            field=models.CharField(default='default', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='temporarydatabase',
+            name='server',
+            field=models.CharField(default='default', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='sandboxtemplate',
+            name='dump_sha256',
+            field=models.CharField(max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='sandboxtemplate',
+            constraint=models.UniqueConstraint(fields=('dump_sha256', 'server'), name='sandbox_template_dump_server_uniq'),
+        ),
+    ]
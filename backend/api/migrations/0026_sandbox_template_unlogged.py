@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_sandbox_server'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sandboxtemplate',
+            name='unlogged',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0026_sandbox_template_unlogged'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='teacherdatabase',
+            name='database_size_bytes',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='teacherdatabase',
+            name='dump_schema',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='teacherdatabase',
+            name='ingested_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='teacherdatabase',
+            name='ingestion_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='teacherdatabase',
+            name='ingestion_status',
+            field=models.CharField(choices=[('pending', 'В черзі'), ('running', 'Перевіряється'), ('ready', 'Готова'), ('failed', 'Помилка')], default='pending', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='teacherdatabase',
+            name='restore_seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='teacherdatabase',
+            name='row_count',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='teacherdatabase',
+            name='table_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
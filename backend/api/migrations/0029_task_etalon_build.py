@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0028_dump_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='etalon_built_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='etalon_database',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='etalon_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='etalon_fingerprints',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='etalon_sql',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='etalon_status',
+            field=models.CharField(choices=[('none', 'Не будувалася'), ('pending', 'В черзі'), ('running', 'Будується'), ('ready', 'Готова'), ('failed', 'Помилка')], default='none', max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0030_list_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='etalon_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
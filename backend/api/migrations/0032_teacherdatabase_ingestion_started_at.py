@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0031_task_etalon_started_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='teacherdatabase',
+            name='ingestion_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,5 +1,10 @@
+import uuid
+
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
+from django.utils import timezone
 
 class User(AbstractUser):
     """
@@ -70,11 +75,32 @@ class Course(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Курсорна пагінація списку курсів (api/pagination.py): загальний і для вчителя
+            models.Index(fields=['-created_at', '-id'], name='course_created_idx'),
+            models.Index(fields=['teacher', '-created_at', '-id'], name='course_teacher_created_idx'),
+        ]
 
 class TeacherDatabase(models.Model):
     """
     SQL-дамп бази даних, завантажений вчителем.
     """
+    class IsolationMode(models.TextChoices):
+        """
+        Як ізолюються пісочниці студентів (див. api/schema_sandboxes.py).
+        """
+        DATABASE = 'database', 'Окрема база на користувача'
+        SCHEMA = 'schema', 'Окрема схема в спільній базі'
+
+    class IngestionStatus(models.TextChoices):
+        """
+        Стан фонової перевірки дампу і побудови його бази-шаблону (див. api/ingestion.py).
+        """
+        PENDING = 'pending', 'В черзі'
+        RUNNING = 'running', 'Перевіряється'
+        READY = 'ready', 'Готова'
+        FAILED = 'failed', 'Помилка'
+
     name = models.CharField(max_length=100)
     teacher = models.ForeignKey(
         User, on_delete=models.CASCADE,
@@ -83,6 +109,28 @@ class TeacherDatabase(models.Model):
     )
     sql_dump = models.FileField(upload_to='teacher_dumps/')
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # sha256 вмісту дампу; обчислюється ліниво (api/result_cache.py), скидається при заміні файлу
+    dump_sha256 = models.CharField(max_length=64, blank=True, default='')
+    isolation_mode = models.CharField(max_length=10, choices=IsolationMode.choices, default=IsolationMode.DATABASE)
+    ingestion_status = models.CharField(max_length=10, choices=IngestionStatus.choices,
+                                        default=IngestionStatus.PENDING)
+    ingestion_error = models.TextField(blank=True, default='')
+    ingested_at = models.DateTimeField(null=True, blank=True)
+    # Початок поточної перевірки; за ним повторно беруться перевірки, що зависли в 'running'
+    ingestion_started_at = models.DateTimeField(null=True, blank=True)
+    # Результати перевірки: час створення бази з дампу, розмір бази, кількість таблиць і рядків
+    restore_seconds = models.FloatField(null=True, blank=True)
+    database_size_bytes = models.BigIntegerField(null=True, blank=True)
+    table_count = models.PositiveIntegerField(null=True, blank=True)
+    row_count = models.BigIntegerField(null=True, blank=True)
+    # {таблиця: {'rows': кількість, 'columns': [{'name', 'type', 'notnull'}, ...]}}
+    dump_schema = models.JSONField(default=dict, blank=True)
+
+    def save(self, *args, **kwargs):
+        if self.sql_dump and not self.sql_dump._committed:
+            self.dump_sha256 = ''
+            self.ingestion_status = self.IngestionStatus.PENDING
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.name} ({self.teacher.username})"
@@ -94,21 +142,116 @@ class TemporaryDatabase(models.Model):
     """
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='temporary_databases')
     teacher_database = models.ForeignKey(TeacherDatabase, on_delete=models.CASCADE, related_name='temporary_instances', null=True, blank=True)
-    database_name = models.CharField(max_length=100, unique=True, db_index=True)
+    database_name = models.CharField(max_length=100, db_index=True)
+    # Порожня для окремої бази; у режимі SCHEMA — схема (і роль) користувача в спільній базі database_name
+    schema_name = models.CharField(max_length=63, blank=True, default='')
+    # Сервер кластера пісочниць (ключ settings.SANDBOX_DATABASES), на якому створено базу
+    server = models.CharField(max_length=50, default='default')
     session_key = models.CharField(max_length=40, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     last_used = models.DateTimeField(auto_now=True, db_index=True)
+    # True після першого запиту, що міг змінити базу; до того вміст збігається з дампом
+    is_dirty = models.BooleanField(default=False)
 
     class Meta:
         indexes = [
             models.Index(fields=['user', 'session_key'], name='temp_db_user_session_idx'),
             models.Index(fields=['last_used'], name='temp_db_last_used_idx'),
         ]
+        constraints = [
+            models.UniqueConstraint(fields=['database_name', 'schema_name'], name='temp_db_name_schema_uniq'),
+        ]
 
     def __str__(self):
         return f"Temp DB: {self.database_name} (User: {self.user.username})"
 
+class SandboxCheckpoint(models.Model):
+    """
+    Іменована точка відновлення пісочниці: копія бази TemporaryDatabase (IS_TEMPLATE,
+    без підключень), з якої пісочницю можна відновити одним CREATE DATABASE ... TEMPLATE.
+    """
+    class Status(models.TextChoices):
+        """
+        Стан фонового створення копії (див. api/checkpoints.py).
+        """
+        PENDING = 'pending', 'Створюється'
+        READY = 'ready', 'Готова'
+        FAILED = 'failed', 'Помилка'
+
+    temporary_database = models.ForeignKey(TemporaryDatabase, on_delete=models.CASCADE, related_name='checkpoints')
+    name = models.CharField(max_length=100)
+    database_name = models.CharField(max_length=100, unique=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    error = models.TextField(blank=True, default='')
+    # Значення TemporaryDatabase.is_dirty на момент створення; повертається при відновленні
+    is_dirty = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['temporary_database', 'name'], name='checkpoint_sandbox_name_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Checkpoint {self.name}: {self.database_name}"
+
+class SharedReplica(models.Model):
+    """
+    Спільна read-only копія дампу (одна на вміст дампу) для сесій, що лише читають дані.
+    Приватна TemporaryDatabase створюється лише під час першого запиту, що змінює дані.
+    """
+    dump_sha256 = models.CharField(max_length=64, unique=True)
+    database_name = models.CharField(max_length=100, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Replica: {self.database_name}"
+
+class SandboxTemplate(models.Model):
+    """
+    Незмінна база-шаблон дампу (IS_TEMPLATE, без підключень): нова пісочниця створюється
+    через CREATE DATABASE ... TEMPLATE замість повторного виконання дампу.
+    Шаблон створюється окремо на кожному сервері пісочниць під час першого використання там.
+    """
+    dump_sha256 = models.CharField(max_length=64)
+    server = models.CharField(max_length=50, default='default')
+    database_name = models.CharField(max_length=100, unique=True)
+    # Таблиці створено як UNLOGGED: після аварійного перезапуску сервера їх вміст втрачено
+    unlogged = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dump_sha256', 'server'], name='sandbox_template_dump_server_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Template: {self.database_name}"
+
+class SandboxHost(models.Model):
+    """
+    Спільна база дампу для пісочниць у режимі IsolationMode.SCHEMA: містить схему-шаблон
+    і по схемі на кожну TemporaryDatabase.
+    """
+    dump_sha256 = models.CharField(max_length=64, unique=True)
+    database_name = models.CharField(max_length=100, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Sandbox host: {self.database_name}"
+
 class Task(models.Model):
+    class EtalonStatus(models.TextChoices):
+        """
+        Стан фонової побудови еталонної бази з SQL вчителя (див. api/etalons.py).
+        """
+        NONE = 'none', 'Не будувалася'
+        PENDING = 'pending', 'В черзі'
+        RUNNING = 'running', 'Будується'
+        READY = 'ready', 'Готова'
+        FAILED = 'failed', 'Помилка'
+
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     # Оригінальний файл бази (завантажений вчителем)
@@ -119,21 +262,143 @@ class Task(models.Model):
     due_date = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # sha256 вмісту original_db; обчислюється ліниво, скидається при заміні файлу
+    original_db_sha256 = models.CharField(max_length=64, blank=True, default='')
+    etalon_status = models.CharField(max_length=10, choices=EtalonStatus.choices, default=EtalonStatus.NONE)
+    etalon_error = models.TextField(blank=True, default='')
+    # SQL вчителя, з якого будується (або збудовано) еталон
+    etalon_sql = models.TextField(blank=True, default='')
+    # Збережена еталонна база на сервері пісочниць 'default'; з нею порівнюється submit
+    etalon_database = models.CharField(max_length=100, blank=True, default='')
+    # {таблиця: md5 упорядкованих рядків без timestamp-колонок} — швидка перевірка збігу таблиць
+    etalon_fingerprints = models.JSONField(default=dict, blank=True)
+    etalon_built_at = models.DateTimeField(null=True, blank=True)
+    # Коли побудову поставлено в чергу чи запущено — за ним rebuild_etalons знаходить завислі
+    etalon_started_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Курсорна пагінація списку задач і фільтри ?course= / ?due_before= / ?due_after=
+            models.Index(fields=['-created_at', '-id'], name='task_created_idx'),
+            models.Index(fields=['course', '-created_at', '-id'], name='task_course_created_idx'),
+            models.Index(fields=['course', 'due_date'], name='task_course_due_idx'),
+            models.Index(fields=['due_date'], name='task_due_date_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.original_db and not self.original_db._committed:
+            self.original_db_sha256 = ''
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.title
 
+class DumpUpload(models.Model):
+    """
+    Незавершене покрокове (chunked) завантаження дампу (див. api/uploads.py).
+    Частини дописуються у файл на диску; після останньої частини upload передається
+    в TeacherDatabase або Task замість файлу в multipart-запиті.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='dump_uploads')
+    filename = models.CharField(max_length=255)
+    # Заявлений розмір файлу і кількість уже отриманих байтів
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    # sha256 вмісту; заповнюється, коли отримано останню частину
+    sha256 = models.CharField(max_length=64, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    @property
+    def is_complete(self):
+        return self.offset >= self.size
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+class QueryFingerprint(models.Model):
+    """
+    Нормалізований SQL-запит (без літералів і зайвих пробілів, див. api/fingerprint.py)
+    з агрегатами виконань для пари користувач + база.
+    Рядки SQLHistory посилаються на відбиток замість того, щоб зберігати однаковий текст.
+    """
+    fingerprint = models.CharField(max_length=40)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='query_fingerprints')
+    database = models.ForeignKey(TeacherDatabase, on_delete=models.CASCADE, null=True, blank=True,
+                                 related_name='query_fingerprints')
+    canonical_query = models.TextField()
+    # Перший текст запиту з цим відбитком; історія зберігає власний текст лише якщо він інший
+    sample_query = models.TextField()
+    execution_count = models.PositiveIntegerField(default=0)
+    total_duration_ms = models.FloatField(default=0)
+    max_duration_ms = models.FloatField(default=0)
+    first_seen = models.DateTimeField(default=timezone.now)
+    last_seen = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fingerprint', 'user', 'database'],
+                                    condition=models.Q(database__isnull=False),
+                                    name='query_fp_user_db_uniq'),
+            models.UniqueConstraint(fields=['fingerprint', 'user'],
+                                    condition=models.Q(database__isnull=True),
+                                    name='query_fp_user_nodb_uniq'),
+        ]
+        indexes = [
+            # «Найчастіші запити» по базі для вчителя
+            models.Index(fields=['database', 'fingerprint'], name='query_fp_db_idx'),
+            GinIndex(OpClass(Upper('sample_query'), name='gin_trgm_ops'), name='query_fp_sample_trgm_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.canonical_query[:30]}... (x{self.execution_count})"
+
+
 class SQLHistory(models.Model):
+    class Status(models.TextChoices):
+        """
+        Результат виконання запиту.
+        """
+        OK = 'ok', 'Успішно'
+        ERROR = 'error', 'Помилка'
+        TIMEOUT = 'timeout', 'Перевищено ліміт часу'
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sql_history')
-    query = models.TextField()
-    executed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    fingerprint = models.ForeignKey(QueryFingerprint, on_delete=models.SET_NULL, null=True, blank=True,
+                                    related_name='executions')
+    # Порожній, якщо текст збігається з fingerprint.sample_query (див. full_query)
+    query = models.TextField(blank=True, default='')
+    # Не auto_now_add: записи пишуться пачками (api/history.py), тож час фіксується при виконанні
+    executed_at = models.DateTimeField(default=timezone.now, db_index=True)
     database = models.ForeignKey(TeacherDatabase, on_delete=models.SET_NULL, null=True, blank=True)
+    # Запити «Preview SQL» задачі (task_submit) прив'язані до задачі, а не до TeacherDatabase
+    task = models.ForeignKey(Task, on_delete=models.SET_NULL, null=True, blank=True, related_name='sql_history')
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.OK)
+    duration_ms = models.FloatField(null=True, blank=True)
+    rows_returned = models.IntegerField(null=True, blank=True)
+    rows_affected = models.IntegerField(null=True, blank=True)
+    # Ім'я тимчасової бази (сама TemporaryDatabase може бути вже видалена)
+    sandbox_name = models.CharField(max_length=100, blank=True, default='')
 
     class Meta:
         indexes = [
-            models.Index(fields=['user', '-executed_at'], name='sql_history_user_time_idx'),
+            # Keyset-пагінація історії: ORDER BY executed_at DESC, id DESC
+            models.Index(fields=['user', '-executed_at', '-id'], name='sql_history_user_time_idx'),
+            # Пошук q= (icontains → UPPER(query) LIKE ...) через pg_trgm
+            GinIndex(OpClass(Upper('query'), name='gin_trgm_ops'), name='sql_history_query_trgm_idx'),
+            # Статистика затримок по задачах і базах за період (query_stats)
+            models.Index(fields=['task', 'executed_at'], name='sql_history_task_time_idx'),
+            models.Index(fields=['database', 'executed_at'], name='sql_history_db_time_idx'),
         ]
         ordering = ['-executed_at']
 
+    @property
+    def full_query(self):
+        """Текст виконаного запиту (власний або спільний текст відбитка)."""
+        if self.query or not self.fingerprint_id:
+            return self.query
+        return self.fingerprint.sample_query
+
     def __str__(self):
-        return f"{self.user.username}: {self.query[:30]}... ({self.executed_at})"
+        return f"{self.user.username}: {self.full_query[:30]}... ({self.executed_at})"
@@ -0,0 +1,16 @@
+"""
+Курсорна пагінація списків ViewSet-ів (курси, задачі).
+
+Сторінка обирається умовою WHERE (created_at, id) < позиції курсора по індексу, а не
+OFFSET, і без COUNT(*) — вартість запиту залежить лише від розміру сторінки.
+Відповідь: { "next": url | null, "previous": url | null, "results": [...] }.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedCursorPagination(CursorPagination):
+    """Від нових до старих; page_size — до 100 записів."""
+    page_size = 25
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
@@ -0,0 +1,130 @@
+"""
+Розміщення нових пісочниць між кількома серверами PostgreSQL.
+
+Сервери — ключі settings.SANDBOX_DATABASES (див. api/sandbox_db.py). Для кожного
+сервера періодично знімається навантаження: активні з'єднання відносно
+max_connections, кількість пісочниць (TemporaryDatabase.server) відносно MAX_SANDBOXES
+і зайняте місце (сума pg_database_size) відносно DISK_BYTES. Нова пісочниця йде на
+сервер з найменшою найбільшою з цих часток; сервер, що не відповідає за PROBE_TIMEOUT
+секунд, позначається недоступним до наступного зрізу і пропускається. Зріз знімається
+поза блокуванням, тож повільний сервер не затримує вибір для інших запитів.
+Усі подальші запити до пісочниці йдуть на записаний у ній сервер.
+
+PostgreSQL не повідомляє вільне місце на диску, тому замість нього використовується
+бюджет DISK_BYTES у налаштуваннях сервера (не задано — диск не враховується).
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count
+
+from . import sandbox_db
+from .models import TemporaryDatabase
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SERVER = 'default'
+
+DEFAULT_PLACEMENT_SETTINGS = {
+    'LOAD_TTL': 5,        # Секунд, протягом яких використовується знятий зріз навантаження
+    'PROBE_TIMEOUT': 2,   # Секунд на підключення до сервера і запит навантаження
+}
+
+_loads = {}
+_loads_at = 0.0
+_loads_refreshing = False
+_loads_lock = threading.Lock()
+
+
+def placement_settings():
+    return {**DEFAULT_PLACEMENT_SETTINGS, **getattr(settings, 'SANDBOX_PLACEMENT', {})}
+
+
+def servers():
+    """Імена серверів пісочниць; 'default' є завжди."""
+    names = list(getattr(settings, 'SANDBOX_DATABASES', {}))
+    if DEFAULT_SERVER not in names:
+        names.insert(0, DEFAULT_SERVER)
+    return names
+
+
+def _probe(server, timeout):
+    conn = sandbox_db.connect(alias=server, connect_timeout=timeout)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SET statement_timeout = {int(timeout * 1000)}")
+        cursor.execute(
+            "SELECT (SELECT count(*) FROM pg_stat_activity), current_setting('max_connections')::int, "
+            "(SELECT COALESCE(SUM(pg_database_size(datname)), 0) FROM pg_database)"
+        )
+        connections, max_connections, used_bytes = cursor.fetchone()
+        cursor.close()
+    finally:
+        conn.close()
+    return {'connections': connections, 'max_connections': max_connections, 'used_bytes': used_bytes}
+
+
+def _score(load, config):
+    ratios = [load['connections'] / max(load['max_connections'], 1)]
+    if config.get('MAX_SANDBOXES'):
+        ratios.append(load['sandboxes'] / config['MAX_SANDBOXES'])
+    if config.get('DISK_BYTES'):
+        ratios.append(load['used_bytes'] / config['DISK_BYTES'])
+    return max(ratios)
+
+
+def server_loads(refresh=False):
+    """
+    Навантаження серверів: {server: {available, connections, max_connections, sandboxes,
+    used_bytes, score}}; для недоступного сервера — {available: False, error}. Зріз кешується
+    на LOAD_TTL секунд; поки його оновлює інший потік, повертається попередній.
+    """
+    global _loads, _loads_at, _loads_refreshing
+    conf = placement_settings()
+    with _loads_lock:
+        fresh = time.monotonic() - _loads_at < conf['LOAD_TTL']
+        if (not refresh and fresh) or (_loads_refreshing and _loads):
+            return _loads
+        _loads_refreshing = True
+
+    try:
+        counts = dict(
+            TemporaryDatabase.objects.values('server').annotate(total=Count('id')).values_list('server', 'total')
+        )
+        configured = getattr(settings, 'SANDBOX_DATABASES', {})
+        loads = {}
+        for server in servers():
+            try:
+                load = _probe(server, conf['PROBE_TIMEOUT'])
+            except Exception as e:
+                logger.warning(f"Sandbox server {server} is unavailable: {e}")
+                loads[server] = {'available': False, 'error': str(e)}
+                continue
+            load['available'] = True
+            load['sandboxes'] = counts.get(server, 0)
+            load['score'] = _score(load, configured.get(server, {}))
+            loads[server] = load
+        with _loads_lock:
+            _loads, _loads_at = loads, time.monotonic()
+        return loads
+    finally:
+        with _loads_lock:
+            _loads_refreshing = False
+
+
+def choose_server():
+    """Сервер для нової пісочниці — найменш навантажений з доступних."""
+    if len(servers()) == 1:
+        return DEFAULT_SERVER
+    loads = {name: load for name, load in server_loads().items() if load['available']}
+    if not loads:
+        return DEFAULT_SERVER
+    server = min(loads, key=lambda name: (loads[name]['score'], loads[name]['sandboxes']))
+    # Враховуємо нову пісочницю одразу, щоб серія створень у межах LOAD_TTL не пішла на один сервер
+    with _loads_lock:
+        if _loads.get(server, {}).get('available'):
+            _loads[server]['sandboxes'] += 1
+            _loads[server]['score'] = _score(_loads[server], getattr(settings, 'SANDBOX_DATABASES', {}).get(server, {}))
+    return server
@@ -0,0 +1,144 @@
+"""
+Спільні read-only репліки дампів.
+
+Більшість запитів у редакторі — SELECT, тож приватна копія дампу для кожного
+користувача здебільшого зайва. Поки користувач не виконав жодного запиту, що
+змінює дані, його read-only запити та отримання схеми йдуть до однієї спільної
+бази на дамп (ключ — sha256 вмісту), для якої встановлено
+default_transaction_read_only = on. Приватна TemporaryDatabase створюється під час
+першого запиту на запис (див. views.execute_sql_query і views.task_submit).
+"""
+import logging
+import time
+import uuid
+
+from django.conf import settings
+from django.db import IntegrityError
+
+from . import locks, metrics, sandbox_db, tracing
+from .models import SharedReplica, TeacherDatabase, Task
+from .result_cache import dump_sha256
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPLICA_SETTINGS = {
+    'ENABLED': True,
+}
+
+
+def replica_settings():
+    return {**DEFAULT_REPLICA_SETTINGS, **getattr(settings, 'SHARED_REPLICAS', {})}
+
+
+def enabled():
+    return replica_settings()['ENABLED']
+
+
+def _create_replica(db_name, dump_path, source):
+    """Створює базу db_name з дампу і переводить її в режим лише читання."""
+    admin_conn = sandbox_db.connect()
+    admin_cursor = admin_conn.cursor()
+    try:
+        create_started = time.perf_counter()
+        with tracing.span('create_db'):
+            admin_cursor.execute(f"CREATE DATABASE {db_name}{sandbox_db.tablespace_clause()}")
+        try:
+            temp_conn = sandbox_db.connect(db_name)
+            try:
+                temp_cursor = temp_conn.cursor()
+                temp_cursor.execute("SET statement_timeout = 60000")
+                with open(dump_path, 'r', encoding='utf-8') as f, tracing.span('restore'), \
+                        metrics.SANDBOX_RESTORE_SECONDS.time(source='replica'):
+                    temp_cursor.execute(f.read())
+            finally:
+                temp_conn.close()
+            # Діє на всі нові з'єднання; запит, що намагається писати, отримає ReadOnlySqlTransaction
+            admin_cursor.execute(f"ALTER DATABASE {db_name} SET default_transaction_read_only = on")
+        except Exception:
+            admin_cursor.execute(f"DROP DATABASE IF EXISTS {db_name}")
+            raise
+        metrics.SANDBOX_CREATE_SECONDS.observe(time.perf_counter() - create_started, source='replica')
+        logger.info(f"Created shared replica {db_name} for {source}")
+    finally:
+        admin_cursor.close()
+        admin_conn.close()
+
+
+def _drop_replica(admin_cursor, db_name):
+    with metrics.SANDBOX_DROP_SECONDS.time(source='replica'):
+        admin_cursor.execute(
+            "SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE datname = %s AND pid <> pg_backend_pid()",
+            (db_name,)
+        )
+        admin_cursor.execute(f"DROP DATABASE IF EXISTS {db_name}")
+
+
+def hashes_in_use():
+    """sha256 дампів, які зараз використовують бази викладачів і задачі."""
+    in_use = set(TeacherDatabase.objects.exclude(dump_sha256='').values_list('dump_sha256', flat=True))
+    in_use.update(Task.objects.exclude(original_db_sha256='').values_list('original_db_sha256', flat=True))
+    return in_use
+
+
+def drop_stale_replicas():
+    """Видаляє репліки дампів, які більше не використовує жодна база викладача чи задача."""
+    stale = list(SharedReplica.objects.exclude(dump_sha256__in=hashes_in_use()))
+    if not stale:
+        return 0
+    admin_conn = sandbox_db.connect()
+    try:
+        admin_cursor = admin_conn.cursor()
+        for replica in stale:
+            _drop_replica(admin_cursor, replica.database_name)
+            replica.delete()
+            logger.info(f"Dropped stale shared replica {replica.database_name}")
+        admin_cursor.close()
+    finally:
+        admin_conn.close()
+    return len(stale)
+
+
+def get_replica(instance, file_field, hash_field, source='teacher_database'):
+    """
+    Ім'я спільної read-only бази для дампу instance.<file_field>; створює її за потреби.
+    source — мітка для метрик (teacher_database / task).
+    """
+    dump_hash = dump_sha256(instance, file_field, hash_field)
+    with tracing.span('lookup'):
+        replica = SharedReplica.objects.filter(dump_sha256=dump_hash).first()
+    if replica:
+        metrics.SHARED_REPLICA_LOOKUPS.inc(source=source, result='hit')
+        return replica.database_name
+    metrics.SHARED_REPLICA_LOOKUPS.inc(source=source, result='miss')
+
+    # Репліку будує один запит; паралельні (наприклад, схема і перший запит при відкритті
+    # редактора) чекають на нього і беруть готову
+    with locks.single_flight('replica', dump_hash):
+        replica = SharedReplica.objects.filter(dump_sha256=dump_hash).first()
+        if replica:
+            return replica.database_name
+        return _build_replica(instance, file_field, dump_hash, source)
+
+
+def _build_replica(instance, file_field, dump_hash, source):
+    db_name = f"replica_{dump_hash[:16]}_{uuid.uuid4().hex[:8]}"
+    _create_replica(db_name, getattr(instance, file_field).path, source)
+    try:
+        SharedReplica.objects.create(dump_sha256=dump_hash, database_name=db_name)
+    except IntegrityError:
+        # Паралельний запит уже зареєстрував репліку цього дампу — використовуємо її
+        admin_conn = sandbox_db.connect()
+        try:
+            admin_cursor = admin_conn.cursor()
+            _drop_replica(admin_cursor, db_name)
+            admin_cursor.close()
+        finally:
+            admin_conn.close()
+        return SharedReplica.objects.get(dump_sha256=dump_hash).database_name
+
+    # Нова репліка зазвичай означає, що дамп замінено: прибираємо попередні
+    try:
+        drop_stale_replicas()
+    except Exception as e:
+        logger.warning(f"Failed to drop stale shared replicas: {e}")
+    return db_name
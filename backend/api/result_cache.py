@@ -0,0 +1,212 @@
+"""
+Кеш результатів read-only запитів до «чистих» пісочниць.
+
+Поки тимчасова база не змінювалася (TemporaryDatabase.is_dirty == False), її вміст
+збігається з дампом, тож результат SELECT залежить лише від дампу і тексту запиту.
+Ключ кешу — (sha256 вмісту дампу, запит, нормалізований зі збереженням літералів).
+Однакові «розминкові» запити цілої групи обслуговуються без звернення до PostgreSQL,
+а якщо пісочниці ще немає — вона навіть не створюється.
+
+Кеш живе в пам'яті процесу (LRU з обмеженням за кількістю записів і байтами);
+результати з більш ніж MAX_ROWS рядків не кешуються.
+"""
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+
+import psycopg
+import psycopg2.errors
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import sandbox_identity
+from .fingerprint import normalize_query
+
+DEFAULT_CACHE_SETTINGS = {
+    'ENABLED': True,
+    'MAX_ENTRIES': 5000,          # Записів у кеші процесу
+    'MAX_BYTES': 64 * 1024 ** 2,  # Сумарний розмір результатів (JSON), байт
+    'MAX_ROWS': 1000,             # Більші результати не кешуються
+    'MAX_ENTRY_BYTES': 1024 ** 2, # ...як і результати, більші за цей розмір
+}
+
+# Перше ключове слово запиту, що лише читає дані
+_READ_ONLY_STARTS = {'select', 'with', 'values', 'table', 'show', 'explain'}
+# SHOW повертає налаштування сесії (search_path у режимі схем) — не кешується
+_UNCACHEABLE_STARTS = {'show'}
+# Слова, що означають (можливий) запис усередині SELECT/WITH: data-modifying CTE,
+# SELECT ... INTO, FOR UPDATE, зміна послідовностей і налаштувань
+_WRITE_WORDS = {'insert', 'update', 'delete', 'merge', 'into', 'nextval', 'setval', 'set_config'}
+# Функції, результат яких змінюється між викликами: такі запити не кешуються
+_VOLATILE_WORDS = {
+    'now', 'current_timestamp', 'current_date', 'current_time', 'localtime', 'localtimestamp',
+    'clock_timestamp', 'statement_timestamp', 'transaction_timestamp', 'timeofday', 'random',
+    'gen_random_uuid', 'uuid_generate_v4', 'txid_current', 'pg_backend_pid', 'currval', 'lastval',
+    'pg_sleep', 'current_user', 'session_user', 'user',
+    # Залежать від сесії (у режимі схем — від ролі й search_path користувача)
+    'current_role', 'current_schema', 'current_schemas', 'current_catalog', 'current_database',
+    'current_setting', 'search_path', 'pg_my_temp_schema', 'inet_client_addr', 'inet_client_port',
+    'has_table_privilege', 'has_schema_privilege', 'pg_has_role',
+}
+_WORD_RE = re.compile(r'[^\W\d][\w$]*')
+
+
+def _words(query):
+    # normalize_query прибирає коментарі та літерали, тож слова з рядків не заважають
+    normalized = normalize_query(query)
+    return normalized, _WORD_RE.findall(normalized)
+
+
+def is_read_only_query(query):
+    """
+    Чи лише читає запит дані (одна інструкція SELECT/WITH/VALUES/TABLE/SHOW/EXPLAIN без
+    слів запису). Класифікація консервативна; остаточно read-only гарантує
+    default_transaction_read_only під час виконання.
+    """
+    normalized, words = _words(query)
+    if not words or ';' in normalized:
+        return False
+    if words[0] not in _READ_ONLY_STARTS:
+        return False
+    if words[0] == 'explain' and 'analyze' in words:
+        return False
+    return not any(word in _WRITE_WORDS for word in words)
+
+
+def is_cacheable_query(query):
+    """Read-only запит без volatile- і сесійних функцій (now(), random(), current_schema() тощо)."""
+    if not is_read_only_query(query):
+        return False
+    _, words = _words(query)
+    if words[0] in _UNCACHEABLE_STARTS:
+        return False
+    return not any(word in _VOLATILE_WORDS for word in words)
+
+
+def dump_sha256(instance, file_field, hash_field):
+    """
+    sha256 вмісту файлу дампу instance.<file_field>; обчислюється один раз
+    і зберігається в instance.<hash_field>.
+    """
+    digest = getattr(instance, hash_field)
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    with getattr(instance, file_field).open('rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(chunk)
+    digest = hasher.hexdigest()
+    type(instance).objects.filter(pk=instance.pk).update(**{hash_field: digest})
+    setattr(instance, hash_field, digest)
+    return digest
+
+
+def mark_dirty(temp_db):
+    """Позначає пісочницю зміненою: її результати більше не можна брати з кешу."""
+    if temp_db is not None and not temp_db.is_dirty:
+        type(temp_db).objects.filter(pk=temp_db.pk).update(is_dirty=True)
+        temp_db.is_dirty = True
+        sandbox_identity.forget(temp_db)
+
+
+def execute_tracking_dirty(cursor, query, temp_db):
+    """
+    Виконує query (psycopg2, autocommit) у пісочниці temp_db, підтримуючи is_dirty.
+    Поки пісочниця чиста, read-only запит виконується з default_transaction_read_only:
+    якщо він усе ж намагається писати (наприклад, через функцію), пісочниця
+    позначається зміненою і запит повторюється без обмеження.
+    """
+    if _guard_read_only(temp_db, query):
+        cursor.execute("SET default_transaction_read_only = on")
+        try:
+            cursor.execute(query)
+            return
+        except psycopg2.errors.ReadOnlySqlTransaction:
+            cursor.execute("SET default_transaction_read_only = off")
+    mark_dirty(temp_db)
+    cursor.execute(query)
+
+
+async def aexecute_tracking_dirty(cursor, query, temp_db):
+    """
+    Асинхронний (psycopg 3) варіант execute_tracking_dirty; пул з'єднань скидає
+    налаштування через RESET ALL.
+    """
+    if _guard_read_only(temp_db, query):
+        await cursor.execute("SET default_transaction_read_only = on")
+        try:
+            await cursor.execute(query)
+            return
+        except psycopg.errors.ReadOnlySqlTransaction:
+            await cursor.execute("SET default_transaction_read_only = off")
+    await sync_to_async(mark_dirty)(temp_db)
+    await cursor.execute(query)
+
+
+def _guard_read_only(temp_db, query):
+    """Чи виконувати query в чистій пісочниці з default_transaction_read_only."""
+    return not temp_db.is_dirty and is_read_only_query(query)
+
+
+class QueryResultCache:
+    """Потокобезпечний LRU-кеш відповідей з обмеженням за кількістю записів і байтами."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # ключ -> (payload, розмір у байтах)
+        self._bytes = 0
+
+    @property
+    def config(self):
+        return {**DEFAULT_CACHE_SETTINGS, **getattr(settings, 'QUERY_RESULT_CACHE', {})}
+
+    @property
+    def enabled(self):
+        return self.config['ENABLED']
+
+    @staticmethod
+    def key(dump_hash, query):
+        normalized = normalize_query(query, strip_literals=False)
+        return hashlib.sha1(f'{dump_hash}\0{normalized}'.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, payload, row_count):
+        """Зберігає відповідь, якщо вона вкладається в MAX_ROWS і MAX_ENTRY_BYTES."""
+        config = self.config
+        if row_count > config['MAX_ROWS']:
+            return False
+        size = len(json.dumps(payload, cls=JSONEncoder).encode('utf-8'))
+        if size > config['MAX_ENTRY_BYTES']:
+            return False
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (payload, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > config['MAX_ENTRIES'] or self._bytes > config['MAX_BYTES']):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return len(self._entries), self._bytes
+
+
+result_cache = QueryResultCache()
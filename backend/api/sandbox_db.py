@@ -0,0 +1,138 @@
+"""
+Параметри підключення до кластера PostgreSQL з пісочницями.
+
+Пісочниці (тимчасові бази, репліки, шаблони, бази перевірки) можуть жити на окремому
+інстансі з послабленою надійністю (fsync off, tmpfs-табличний простір), щоб важке
+заняття не сповільнювало основну базу застосунку з користувачами, курсами та сесіями.
+Налаштування — settings.SANDBOX_DATABASES: 'default' і, за потреби, додаткові сервери,
+між якими api/placement.py розподіляє нові пісочниці. Ключі, яких немає в записі
+сервера, беруться з DATABASES['default'], тож без окремої конфігурації все працює як раніше.
+
+    conn = sandbox_db.connect()            # службова база кластера, autocommit
+    conn = sandbox_db.connect(db_name, alias=temp_db.server)   # конкретна пісочниця
+
+Опційний швидкий режим зберігання: тимчасові бази (пісочниці, бази перевірки) створюються
+в табличному просторі FAST_TABLESPACE (наприклад, на tmpfs), поки його розмір не перевищить
+FAST_TABLESPACE_BYTES, а з UNLOGGED_TABLES таблиці дампу створюються як UNLOGGED — без WAL
+і fsync. Шаблони, репліки й точки відновлення лишаються в звичайному табличному просторі.
+"""
+import logging
+import re
+
+import psycopg2
+from django.conf import settings
+from psycopg.conninfo import make_conninfo
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+CONNECTION_KEYS = ('NAME', 'USER', 'PASSWORD', 'HOST', 'PORT')
+
+DEFAULT_STORAGE_SETTINGS = {
+    'TABLESPACE': '',             # Табличний простір нових баз ('' — за замовчуванням кластера)
+    'FAST_TABLESPACE': '',        # Табличний простір для тимчасових баз (tmpfs), '' — вимкнено
+    'FAST_TABLESPACE_BYTES': 0,   # Бюджет FAST_TABLESPACE; при перевищенні — звичайний (0 — без ліміту)
+    'UNLOGGED_TABLES': False,     # Створювати таблиці дампу як UNLOGGED
+}
+
+# CREATE TABLE на початку рядка (так їх пише pg_dump); CREATE TEMP/UNLOGGED TABLE не збігаються
+_CREATE_TABLE_RE = re.compile(r'^(\s*)CREATE\s+TABLE\b', re.IGNORECASE | re.MULTILINE)
+# Секціоновані таблиці не можуть бути UNLOGGED
+_PARTITION_RE = re.compile(r'\bPARTITION\s+(?:BY|OF)\b', re.IGNORECASE)
+
+
+def server_config(alias='default'):
+    """
+    Параметри кластера пісочниць: NAME (службова база для CREATE/DROP DATABASE), USER,
+    PASSWORD, HOST, PORT і TABLESPACE (порожній — табличний простір за замовчуванням).
+    """
+    app_config = settings.DATABASES['default']
+    config = getattr(settings, 'SANDBOX_DATABASES', {}).get(alias, {})
+    merged = {key: config.get(key) or app_config.get(key) for key in CONNECTION_KEYS}
+    for key, default in DEFAULT_STORAGE_SETTINGS.items():
+        merged[key] = config.get(key) or default
+    return merged
+
+
+def connect(dbname=None, alias='default', autocommit=True, connect_timeout=None, user=None, password=None):
+    """
+    psycopg2-з'єднання з базою dbname кластера пісочниць (None — службова база).
+    connect_timeout — секунд на встановлення з'єднання (None — без обмеження).
+    user/password — інша роль замість адміністратора (роль пісочниці-схеми).
+    """
+    config = server_config(alias)
+    extra = {'connect_timeout': int(connect_timeout)} if connect_timeout else {}
+    conn = psycopg2.connect(
+        dbname=dbname or config['NAME'],
+        user=user or config['USER'],
+        password=password if user else config['PASSWORD'],
+        host=config['HOST'],
+        port=config['PORT'],
+        **extra
+    )
+    conn.autocommit = autocommit
+    return conn
+
+
+def conninfo(dbname, statement_timeout=None, alias='default', user=None, password=None):
+    """Рядок підключення psycopg 3 до бази dbname кластера пісочниць (user/password — як у connect)."""
+    config = server_config(alias)
+    params = {
+        'dbname': dbname or config['NAME'],
+        'user': user or config['USER'],
+        'password': password if user else config['PASSWORD'],
+        'host': config['HOST'],
+        'port': config['PORT'],
+    }
+    if statement_timeout:
+        params['options'] = f'-c statement_timeout={int(statement_timeout)}'
+    return make_conninfo(**{k: v for k, v in params.items() if v})
+
+
+def _fast_tablespace_has_room(alias, config):
+    if not config['FAST_TABLESPACE_BYTES']:
+        return True
+    try:
+        conn = connect(alias=alias)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT pg_tablespace_size(%s)", (config['FAST_TABLESPACE'],))
+            used = cursor.fetchone()[0]
+            cursor.close()
+        finally:
+            conn.close()
+    except psycopg2.Error as e:
+        logger.warning(f"Cannot measure tablespace {config['FAST_TABLESPACE']} on {alias}: {e}")
+        return False
+    return used < config['FAST_TABLESPACE_BYTES']
+
+
+def tablespace_clause(alias='default', ephemeral=False):
+    """
+    Суфікс TABLESPACE для CREATE DATABASE (порожній рядок, якщо не налаштовано).
+    ephemeral — база живе не довше за сесію (пісочниця, база перевірки), тож може піти
+    у FAST_TABLESPACE, доки в ньому є місце.
+    """
+    config = server_config(alias)
+    if ephemeral and config['FAST_TABLESPACE']:
+        if _fast_tablespace_has_room(alias, config):
+            metrics.SANDBOX_STORAGE_PLACEMENTS.inc(server=alias, tier='fast')
+            return f" TABLESPACE {config['FAST_TABLESPACE']}"
+        metrics.SANDBOX_STORAGE_PLACEMENTS.inc(server=alias, tier='fallback')
+    tablespace = config['TABLESPACE']
+    return f" TABLESPACE {tablespace}" if tablespace else ''
+
+
+def unlogged_enabled(alias='default'):
+    return bool(server_config(alias)['UNLOGGED_TABLES'])
+
+
+def prepare_dump(dump_sql, alias='default'):
+    """
+    Текст дампу для відновлення на сервері alias: з UNLOGGED_TABLES усі CREATE TABLE
+    стають CREATE UNLOGGED TABLE. Дампи з секціонованими таблицями не змінюються.
+    """
+    if not unlogged_enabled(alias) or _PARTITION_RE.search(dump_sql):
+        return dump_sql
+    return _CREATE_TABLE_RE.sub(r'\1CREATE UNLOGGED TABLE', dump_sql)
@@ -0,0 +1,184 @@
+"""
+Ідентичність пісочниці без Django-сесій.
+
+Пісочниця належить парі (користувач, робочий простір). Робочий простір береться із
+заголовка X-Workspace-Id, з claim 'workspace' JWT-токена (задається при вході) або
+дорівнює 'default', тож API-клієнти з JWT без cookie сесії щоразу знаходять ту саму
+пісочницю, а ендпоінти не пишуть рядки в django_session. Ключ пісочниці — sha1 від
+користувача і робочого простору — зберігається в TemporaryDatabase.session_key.
+
+Пошук пісочниці (користувач, ключ, джерело) кешується в кеші Django: повторні запити
+не звертаються до таблиці TemporaryDatabase. Запис кешу скидається сигналами
+post_save/post_delete і в mark_dirty. Запис містить is_dirty та ім'я бази, тож кеш
+коректний лише зі спільним для всіх процесів бекендом (settings.CACHES): з кешем у
+пам'яті процесу інший worker міг би віддати з кешу результат для вже зміненої
+пісочниці чи посилання на видалену базу. Тому за замовчуванням (CACHE_ENABLED=None)
+кеш пошуку вмикається лише для спільного бекенду (не LocMemCache/DummyCache).
+"""
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import TemporaryDatabase
+
+WORKSPACE_HEADER = 'HTTP_X_WORKSPACE_ID'
+WORKSPACE_CLAIM = 'workspace'
+DEFAULT_WORKSPACE = 'default'
+
+DEFAULT_IDENTITY_SETTINGS = {
+    'CACHE_ENABLED': None,       # None — лише якщо бекенд кешу спільний для процесів
+    'CACHE_TTL': 300,            # Секунд зберігання запису пошуку пісочниці в кеші
+    'LAST_USED_INTERVAL': 60,    # last_used оновлюється не частіше, ніж раз на стільки секунд
+}
+
+_WORKSPACE_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# Бекенди кешу, не спільні між процесами
+_PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def identity_settings():
+    return {**DEFAULT_IDENTITY_SETTINGS, **getattr(settings, 'SANDBOX_IDENTITY', {})}
+
+
+def cache_enabled():
+    enabled = identity_settings()['CACHE_ENABLED']
+    if enabled is None:
+        return settings.CACHES.get('default', {}).get('BACKEND') not in _PROCESS_LOCAL_CACHES
+    return enabled
+
+
+def is_valid_workspace(workspace):
+    return isinstance(workspace, str) and bool(_WORKSPACE_RE.match(workspace))
+
+
+def workspace_id(request):
+    """Робочий простір запиту: заголовок X-Workspace-Id, claim JWT або 'default'."""
+    workspace = request.META.get(WORKSPACE_HEADER)
+    if not workspace:
+        token = getattr(request, 'auth', None)
+        workspace = token.get(WORKSPACE_CLAIM) if hasattr(token, 'get') else None
+    return workspace if is_valid_workspace(workspace) else DEFAULT_WORKSPACE
+
+
+def sandbox_key(request):
+    """Ключ пісочниць користувача в робочому просторі запиту (40 hex-символів)."""
+    return hashlib.sha1(f"{request.user.pk}:{workspace_id(request)}".encode()).hexdigest()
+
+
+def task_prefix(user, task_id, key):
+    """Префікс імені бази пісочниці задачі: task_{task}_{user}_{ключ[:8]}."""
+    return f"task_{task_id}_{user.id}_{key[:8]}"
+
+
+def _source(teacher_db_id=None, task_id=None):
+    return f"task:{task_id}" if task_id else f"db:{teacher_db_id}"
+
+
+def _cache_key(user_id, key, teacher_db_id=None, task_id=None):
+    if not cache_enabled():
+        return None
+    if not teacher_db_id and not task_id:
+        # Будь-яка пісочниця без бази викладача — такий пошук не кешується
+        return None
+    return f"sandbox:{user_id}:{key}:{_source(teacher_db_id, task_id)}"
+
+
+def _instance_cache_key(temp_db):
+    if temp_db.teacher_database_id:
+        return _cache_key(temp_db.user_id, temp_db.session_key, teacher_db_id=temp_db.teacher_database_id)
+    if temp_db.database_name.startswith('task_'):
+        return _cache_key(temp_db.user_id, temp_db.session_key, task_id=temp_db.database_name.split('_')[1])
+    return None
+
+
+def _dump(temp_db):
+    return [getattr(temp_db, field.attname) for field in temp_db._meta.concrete_fields]
+
+
+def _load(values):
+    field_names = [field.attname for field in TemporaryDatabase._meta.concrete_fields]
+    return TemporaryDatabase.from_db(DEFAULT_DB_ALIAS, field_names, values)
+
+
+def _lookup_queryset(user, key, teacher_db_id, task_id):
+    queryset = TemporaryDatabase.objects.filter(user=user, session_key=key)
+    if task_id:
+        return queryset.filter(teacher_database=None, database_name__startswith=task_prefix(user, task_id, key))
+    return queryset.filter(teacher_database_id=teacher_db_id).order_by('-id')
+
+
+def find_sandbox(user, key, teacher_db_id=None, task_id=None):
+    """
+    Пісочниця користувача з ключем key для бази викладача teacher_db_id або задачі
+    task_id; None, якщо її немає. Спершу перевіряється кеш.
+    """
+    cache_key = _cache_key(user.id, key, teacher_db_id, task_id)
+    values = cache.get(cache_key) if cache_key else None
+    if values is not None:
+        return _load(values)
+    temp_db = _lookup_queryset(user, key, teacher_db_id, task_id).first()
+    if temp_db is not None and cache_key:
+        cache.set(cache_key, _dump(temp_db), identity_settings()['CACHE_TTL'])
+    return temp_db
+
+
+async def afind_sandbox(user, key, teacher_db_id=None, task_id=None):
+    """Асинхронний варіант find_sandbox."""
+    cache_key = _cache_key(user.id, key, teacher_db_id, task_id)
+    values = await cache.aget(cache_key) if cache_key else None
+    if values is not None:
+        return _load(values)
+    temp_db = await _lookup_queryset(user, key, teacher_db_id, task_id).afirst()
+    if temp_db is not None and cache_key:
+        await cache.aset(cache_key, _dump(temp_db), identity_settings()['CACHE_TTL'])
+    return temp_db
+
+
+def _stale_last_used(temp_db, now):
+    return (now - temp_db.last_used).total_seconds() >= identity_settings()['LAST_USED_INTERVAL']
+
+
+def touch(temp_db):
+    """Оновлює last_used (для очищення застарілих пісочниць) не частіше за LAST_USED_INTERVAL."""
+    now = timezone.now()
+    if not _stale_last_used(temp_db, now):
+        return
+    TemporaryDatabase.objects.filter(pk=temp_db.pk).update(last_used=now)
+    temp_db.last_used = now
+    # Запис кешу не перезаписується копією temp_db: паралельний запит міг уже позначити її зміненою
+    forget(temp_db)
+
+
+async def atouch(temp_db):
+    """Асинхронний варіант touch."""
+    now = timezone.now()
+    if not _stale_last_used(temp_db, now):
+        return
+    await TemporaryDatabase.objects.filter(pk=temp_db.pk).aupdate(last_used=now)
+    temp_db.last_used = now
+    cache_key = _instance_cache_key(temp_db)
+    if cache_key:
+        await cache.adelete(cache_key)
+
+
+def forget(temp_db):
+    """Скидає запис кешу пошуку для пісочниці temp_db."""
+    cache_key = _instance_cache_key(temp_db)
+    if cache_key:
+        cache.delete(cache_key)
+
+
+@receiver(post_save, sender=TemporaryDatabase)
+@receiver(post_delete, sender=TemporaryDatabase)
+def _forget_changed_sandbox(sender, instance, **kwargs):
+    forget(instance)
@@ -0,0 +1,510 @@
+"""
+Єдиний сервіс життєвого циклу пісочниць SQL-редактора.
+
+Ендпоінти редактора і задач (синхронні й асинхронні) працюють з пісочницею лише
+через SandboxManager:
+
+    sandbox = Sandbox(user, sandbox_identity.sandbox_key(request), task=task)
+    sandbox_manager.lookup(sandbox)                 # існуюча пісочниця або None
+    sandbox_manager.resolve(sandbox, read_only=...) # ім'я бази: пісочниця, репліка або нова копія
+    sandbox_manager.run_query(sandbox, query)       # виконання з відстеженням is_dirty
+    sandbox_manager.introspect(sandbox)             # таблиці та колонки
+    sandbox_manager.reset(temp_db) / release(temp_db)
+
+Асинхронні ендпоінти викликають aresolve / arun_query / aintrospect: ті самі рішення
+(пісочниця, репліка чи нова копія, перехід з репліки на копію при спробі запису) і ті
+самі перетворення результатів, але запити йдуть через пули psycopg 3 (api/async_db.py),
+а створення пісочниці — в окремому потоці.
+
+Створення (acquire) виконується під блокуванням на (користувач, робочий простір, джерело):
+паралельні перші запити з кількох вкладок чекають на одну пісочницю, а не відновлюють
+дамп кожен окремо. У межах процесу це threading.Lock, між процесами — advisory lock
+PostgreSQL (api/locks.py).
+"""
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+import psycopg
+import psycopg2.errors
+import psycopg2.extras
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from psycopg.rows import dict_row
+
+from . import (async_db, checkpoints, jobs, locks, metrics, placement, replicas, sandbox_db, sandbox_identity,
+    sandbox_templates, schema_sandboxes, tracing)
+from .models import TeacherDatabase, TemporaryDatabase
+from .result_cache import aexecute_tracking_dirty, execute_tracking_dirty, mark_dirty
+
+logger = logging.getLogger(__name__)
+
+# Таймаут запиту студента в пісочниці, мс
+STATEMENT_TIMEOUT = 30000
+# Таймаут відновлення SQL-дампу, мс
+RESTORE_TIMEOUT = 60000
+
+# Максимальна кількість рядків, що повертається редактором
+MAX_RESULTS = 1000
+
+# Запити інтроспекції схеми (спільні для синхронних та асинхронних ендпоінтів)
+SCHEMA_TABLES_SQL = """
+    SELECT table_name
+    FROM information_schema.tables
+    WHERE table_schema = current_schema()
+    ORDER BY table_name;
+"""
+
+SCHEMA_COLUMNS_WITH_PK_SQL = """
+    SELECT
+        column_name,
+        data_type,
+        CASE WHEN is_nullable = 'NO' THEN 1 ELSE 0 END as notnull,
+        CASE WHEN column_name IN (
+            SELECT kcu.column_name
+            FROM information_schema.table_constraints tc
+            JOIN information_schema.key_column_usage kcu
+              ON tc.constraint_name = kcu.constraint_name
+            WHERE tc.constraint_type = 'PRIMARY KEY'
+              AND tc.table_schema = current_schema()
+              AND tc.table_name = %s
+        ) THEN 1 ELSE 0 END as pk
+    FROM information_schema.columns
+    WHERE table_schema = current_schema() AND table_name = %s
+    ORDER BY ordinal_position;
+"""
+
+SCHEMA_COLUMNS_SQL = """
+    SELECT column_name, data_type, is_nullable, column_default
+    FROM information_schema.columns
+    WHERE table_schema = current_schema() AND table_name = %s
+    ORDER BY ordinal_position;
+"""
+
+
+@dataclass
+class Sandbox:
+    """
+    Пісочниця користувача user з ключем key (див. api/sandbox_identity.py) для бази
+    викладача teacher_db або задачі task. temp_db і db_name заповнює SandboxManager.
+    """
+    user: object
+    key: str
+    teacher_db: object = None
+    task: object = None
+    temp_db: object = None
+    db_name: str = ''
+
+    @property
+    def source(self):
+        """Мітка для метрик і журналу: teacher_database або task."""
+        return 'task' if self.task is not None else 'teacher_database'
+
+    @property
+    def lock_key(self):
+        source_id = self.task.id if self.task is not None else self.teacher_db.id
+        return self.user.id, self.key, self.source, source_id
+
+    def replica(self):
+        """Спільна read-only репліка дампу (створюється за потреби)."""
+        if self.task is not None:
+            return replicas.get_replica(self.task, 'original_db', 'original_db_sha256', source='task')
+        return replicas.get_replica(self.teacher_db, 'sql_dump', 'dump_sha256')
+
+
+@dataclass
+class QueryResult:
+    """Результат run_query: rows — список словників, rowcount — рядки результату або змінені DML."""
+    columns: list = field(default_factory=list)
+    rows: list = field(default_factory=list)
+    has_more: bool = False
+    rowcount: int = -1
+
+
+class SandboxManager:
+    """
+    Пошук, створення, скидання і видалення пісочниць та виконання запитів у них.
+    """
+
+    def __init__(self):
+        # lock_key -> [threading.Lock, кількість запитів, що його тримають або чекають]
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    @contextmanager
+    def _creation_lock(self, lock_key):
+        with self._locks_guard:
+            entry = self._locks.setdefault(lock_key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._locks_guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[lock_key]
+
+    # --- Пошук і створення ---
+
+    def lookup(self, sandbox):
+        """Існуюча пісочниця (записується в sandbox.temp_db) або None."""
+        with tracing.span('lookup'):
+            sandbox.temp_db = sandbox_identity.find_sandbox(
+                sandbox.user, sandbox.key,
+                teacher_db_id=sandbox.teacher_db.id if sandbox.teacher_db is not None else None,
+                task_id=sandbox.task.id if sandbox.task is not None else None
+            )
+        return sandbox.temp_db
+
+    def acquire(self, sandbox):
+        """
+        Приватна пісочниця sandbox; створюється, якщо її ще немає. Паралельні виклики для
+        того самого користувача, робочого простору і джерела створюють лише одну пісочницю.
+        """
+        if sandbox.temp_db is None:
+            self.lookup(sandbox)
+        if sandbox.temp_db is None:
+            # Потоки процесу чекають на threading.Lock, інші процеси — на advisory lock у PostgreSQL
+            with self._creation_lock(sandbox.lock_key), locks.single_flight('sandbox', *sandbox.lock_key):
+                # Поки чекали, пісочницю могла створити паралельна вкладка
+                if self.lookup(sandbox) is None:
+                    sandbox.temp_db = self._create(sandbox)
+        sandbox.db_name = sandbox.temp_db.database_name
+        return sandbox.temp_db
+
+    def _acquire_in_thread(self, sandbox):
+        try:
+            return self.acquire(sandbox)
+        finally:
+            close_old_connections()
+
+    async def aacquire(self, sandbox):
+        """Асинхронний acquire: CREATE DATABASE і відновлення дампу — в окремому потоці."""
+        return await sync_to_async(self._acquire_in_thread, thread_sensitive=False)(sandbox)
+
+    def _route(self, sandbox, read_only, create):
+        """Звідки брати базу для запиту: 'sandbox', 'replica', 'acquire' або None."""
+        if sandbox.temp_db is not None:
+            return 'sandbox'
+        if read_only and replicas.enabled():
+            return 'replica'
+        return 'acquire' if create else None
+
+    def resolve(self, sandbox, read_only=False, create=True):
+        """
+        Ім'я бази для запиту до sandbox (також записується в sandbox.db_name): база
+        пісочниці; для read_only-запиту без пісочниці — спільна репліка дампу; інакше нова
+        пісочниця (create=False — None замість створення).
+        """
+        route = self._route(sandbox, read_only, create)
+        if route == 'sandbox':
+            sandbox.db_name = sandbox.temp_db.database_name
+        elif route == 'replica':
+            sandbox.db_name = sandbox.replica()
+        elif route == 'acquire':
+            self.acquire(sandbox)
+        else:
+            return None
+        return sandbox.db_name
+
+    async def aresolve(self, sandbox, read_only=False, create=True):
+        """Асинхронний resolve."""
+        route = self._route(sandbox, read_only, create)
+        if route == 'sandbox':
+            sandbox.db_name = sandbox.temp_db.database_name
+        elif route == 'replica':
+            sandbox.db_name = await sync_to_async(sandbox.replica)()
+        elif route == 'acquire':
+            await self.aacquire(sandbox)
+        else:
+            return None
+        return sandbox.db_name
+
+    def _create(self, sandbox):
+        teacher_db = sandbox.teacher_db
+        if teacher_db is not None and teacher_db.isolation_mode == TeacherDatabase.IsolationMode.SCHEMA:
+            return schema_sandboxes.create_schema_sandbox(sandbox.user, sandbox.key, teacher_db)
+
+        server = placement.choose_server()
+        if sandbox.task is not None:
+            instance, file_field, hash_field = sandbox.task, 'original_db', 'original_db_sha256'
+            prefix = sandbox_identity.task_prefix(sandbox.user, sandbox.task.id, sandbox.key)
+            db_name = f"{prefix}_{uuid.uuid4().hex[:8]}"
+        else:
+            instance, file_field, hash_field = teacher_db, 'sql_dump', 'dump_sha256'
+            db_name = f"temp_db_{uuid.uuid4().hex[:16]}"
+        template = None
+        if sandbox_templates.enabled():
+            template = sandbox_templates.get_template(instance, file_field, hash_field, source=sandbox.source,
+                                                      server=server)
+        self._create_database(db_name, getattr(instance, file_field).path, server, sandbox.source, template)
+        try:
+            temp_db = TemporaryDatabase.objects.create(
+                user=sandbox.user,
+                teacher_database=teacher_db,
+                database_name=db_name,
+                server=server,
+                session_key=sandbox.key
+            )
+        except Exception:
+            self._drop_database(db_name, server, sandbox.source)
+            raise
+        logger.info(f"Created temporary database {db_name} on {server} for user {sandbox.user.username}")
+        return temp_db
+
+    def _create_database(self, db_name, dump_path, server, source, template=None):
+        """
+        Створює базу db_name: копією бази-шаблону template (CREATE DATABASE ... TEMPLATE)
+        або відновленням SQL-дампу dump_path. При помилці база видаляється.
+        """
+        # Валідуємо назву бази даних (додаткова безпека)
+        if not db_name.replace('_', '').replace('-', '').isalnum():
+            raise ValueError("Invalid database name generated")
+
+        admin_conn = sandbox_db.connect(alias=server)
+        try:
+            admin_cursor = admin_conn.cursor()
+            create_started = time.perf_counter()
+            template_clause = f" TEMPLATE {template}" if template else ''
+            with tracing.span('create_db'):
+                admin_cursor.execute(
+                    f"CREATE DATABASE {db_name}{template_clause}"
+                    f"{sandbox_db.tablespace_clause(server, ephemeral=True)}"
+                )
+            if not template:
+                try:
+                    temp_conn = sandbox_db.connect(db_name, alias=server)
+                    try:
+                        temp_cursor = temp_conn.cursor()
+                        temp_cursor.execute(f"SET statement_timeout = {RESTORE_TIMEOUT}")
+                        with open(dump_path, 'r', encoding='utf-8') as f, tracing.span('restore'), \
+                                metrics.SANDBOX_RESTORE_SECONDS.time(source=source):
+                            temp_cursor.execute(sandbox_db.prepare_dump(f.read(), server))
+                    finally:
+                        temp_conn.close()
+                except Exception as e:
+                    logger.error(f"Failed to restore dump into {db_name}: {e}")
+                    admin_cursor.execute(f"DROP DATABASE IF EXISTS {db_name}")
+                    raise
+            metrics.SANDBOX_CREATE_SECONDS.observe(time.perf_counter() - create_started, source=source)
+            admin_cursor.close()
+        finally:
+            admin_conn.close()
+
+    # --- Скидання і видалення ---
+
+    def reset(self, temp_db):
+        """
+        Скидає пісочницю: запис видаляється одразу, а DROP DATABASE виконується у фоні,
+        тож наступний запит отримує репліку або нову копію шаблону, не чекаючи видалення.
+        """
+        checkpoint_databases = checkpoints.database_names(temp_db)
+        temp_db.delete()
+        jobs.submit(self.drop, temp_db, checkpoint_databases=checkpoint_databases)
+
+    def release(self, temp_db):
+        """Видаляє пісочницю в PostgreSQL (помилки лише журналюються) і її запис."""
+        try:
+            self.drop(temp_db)
+        except Exception as e:
+            logger.warning(f"Failed to drop sandbox {temp_db.database_name}: {e}")
+        temp_db.delete()
+
+    def drop(self, temp_db, checkpoint_databases=None):
+        """
+        Видаляє базу або схему пісочниці temp_db у PostgreSQL разом з базами її точок відновлення
+        (запис TemporaryDatabase не чіпає). checkpoint_databases передається, якщо запис уже видалено.
+        """
+        if checkpoint_databases is None:
+            checkpoint_databases = checkpoints.database_names(temp_db)
+        checkpoints.drop_databases(checkpoint_databases, server=temp_db.server)
+        if temp_db.schema_name:
+            schema_sandboxes.drop_schema_sandbox(temp_db)
+            return
+        self._drop_database(temp_db.database_name, temp_db.server,
+                            'teacher_database' if temp_db.teacher_database_id else 'task')
+
+    def _drop_database(self, db_name, server, source):
+        admin_conn = sandbox_db.connect(alias=server)
+        try:
+            with admin_conn.cursor() as admin_cursor, metrics.SANDBOX_DROP_SECONDS.time(source=source):
+                # Відкриті з'єднання (наприклад, асинхронного пулу) інакше блокують DROP
+                admin_cursor.execute(
+                    "SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+                    "WHERE datname = %s AND pid <> pg_backend_pid()",
+                    (db_name,)
+                )
+                admin_cursor.execute(f"DROP DATABASE IF EXISTS {db_name}")
+        finally:
+            admin_conn.close()
+
+    # --- Запити ---
+
+    def connect(self, db_name, temp_db=None):
+        """
+        Autocommit-з'єднання з базою db_name з таймаутом запиту STATEMENT_TIMEOUT.
+        Підключення йде до сервера пісочниці temp_db (без неї — до сервера за замовчуванням,
+        де живуть спільні репліки). До пісочниці-схеми підключається її власна роль, у її search_path.
+        """
+        with tracing.span('connect'):
+            conn = sandbox_db.connect(db_name, alias=temp_db.server if temp_db else 'default',
+                                      **(schema_sandboxes.credentials(temp_db) or {}))
+        with conn.cursor() as cursor:
+            cursor.execute(f"SET statement_timeout = {STATEMENT_TIMEOUT}")
+            for statement in schema_sandboxes.session_statements(temp_db):
+                cursor.execute(statement)
+        return conn
+
+    def _execute(self, sandbox, query, limit):
+        conn = self.connect(sandbox.db_name, sandbox.temp_db)
+        try:
+            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            with tracing.span('execute'):
+                if sandbox.temp_db is not None:
+                    execute_tracking_dirty(cursor, query, sandbox.temp_db)
+                else:
+                    cursor.execute(query)
+            result = QueryResult(rowcount=cursor.rowcount)
+            if cursor.description:
+                result.columns = [desc[0] for desc in cursor.description]
+                with tracing.span('fetch'):
+                    if limit is None:
+                        rows = cursor.fetchall()
+                    else:
+                        rows = cursor.fetchmany(limit)
+                        # Перевіряємо, чи є ще результати
+                        result.has_more = cursor.fetchone() is not None
+                with tracing.span('serialize'):
+                    result.rows = [dict(row) for row in rows]
+            cursor.close()
+            return result
+        finally:
+            conn.close()
+
+    async def _aexecute(self, sandbox, query, limit):
+        connect_started = time.perf_counter()
+        pool = await async_db.get_pool(sandbox.db_name, sandbox.temp_db.server if sandbox.temp_db else 'default',
+                                       schema_sandboxes.credentials(sandbox.temp_db))
+        async with pool.connection() as conn:
+            tracing.record('connect', connect_started)
+            async with conn.cursor(row_factory=dict_row) as cursor:
+                for statement in schema_sandboxes.session_statements(sandbox.temp_db):
+                    await cursor.execute(statement)
+                with tracing.span('execute'):
+                    if sandbox.temp_db is not None:
+                        await aexecute_tracking_dirty(cursor, query, sandbox.temp_db)
+                    else:
+                        await cursor.execute(query)
+                result = QueryResult(rowcount=cursor.rowcount)
+                if cursor.description is not None:
+                    result.columns = [desc.name for desc in cursor.description]
+                    with tracing.span('fetch'):
+                        if limit is None:
+                            result.rows = await cursor.fetchall()
+                        else:
+                            result.rows = await cursor.fetchmany(limit)
+                            result.has_more = await cursor.fetchone() is not None
+                return result
+
+    def run_query(self, sandbox, query, limit=None):
+        """
+        Виконує query у базі sandbox.db_name (див. resolve). Якщо запит до спільної репліки
+        все ж намагається писати, створюється приватна пісочниця і запит повторюється в ній.
+        limit — максимум рядків результату (None — усі).
+        """
+        try:
+            return self._execute(sandbox, query, limit)
+        except psycopg2.errors.ReadOnlySqlTransaction:
+            if sandbox.temp_db is not None:
+                raise
+        # Запит усе ж змінює дані — переходимо на приватну копію дампу
+        self.acquire(sandbox)
+        mark_dirty(sandbox.temp_db)
+        return self._execute(sandbox, query, limit)
+
+    async def arun_query(self, sandbox, query, limit=None):
+        """Асинхронний run_query через пул з'єднань бази sandbox.db_name."""
+        try:
+            return await self._aexecute(sandbox, query, limit)
+        except psycopg.errors.ReadOnlySqlTransaction:
+            if sandbox.temp_db is not None:
+                raise
+        await self.aacquire(sandbox)
+        await sync_to_async(mark_dirty)(sandbox.temp_db)
+        return await self._aexecute(sandbox, query, limit)
+
+    @staticmethod
+    def _columns(rows, with_pk):
+        """Опис колонок з рядків SCHEMA_COLUMNS_WITH_PK_SQL (with_pk) або SCHEMA_COLUMNS_SQL."""
+        if with_pk:
+            return [
+                {
+                    'name': row['column_name'],
+                    'type': row['data_type'],
+                    'notnull': bool(row['notnull']),
+                    'pk': bool(row['pk'])
+                }
+                for row in rows
+            ]
+        return [
+            {
+                'name': row['column_name'],
+                'type': row['data_type'],
+                'notnull': row['is_nullable'] == 'NO',
+                'pk': False
+            }
+            for row in rows
+        ]
+
+    def introspect(self, sandbox, with_pk=True):
+        """Таблиці поточної схеми бази sandbox.db_name і їх колонки: (tables, schema)."""
+        introspect_started = time.perf_counter()
+        conn = self.connect(sandbox.db_name, sandbox.temp_db)
+        try:
+            cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+            cursor.execute(SCHEMA_TABLES_SQL)
+            tables = [row['table_name'] for row in cursor.fetchall()]
+
+            schema = {}
+            for table in tables:
+                if with_pk:
+                    cursor.execute(SCHEMA_COLUMNS_WITH_PK_SQL, (table, table))
+                else:
+                    cursor.execute(SCHEMA_COLUMNS_SQL, (table,))
+                schema[table] = self._columns(cursor.fetchall(), with_pk)
+            cursor.close()
+        finally:
+            conn.close()
+        tracing.record('introspect', introspect_started)
+        return tables, schema
+
+    async def aintrospect(self, sandbox, with_pk=True):
+        """Асинхронний introspect."""
+        connect_started = time.perf_counter()
+        pool = await async_db.get_pool(sandbox.db_name, sandbox.temp_db.server if sandbox.temp_db else 'default',
+                                       schema_sandboxes.credentials(sandbox.temp_db))
+        async with pool.connection() as conn:
+            tracing.record('connect', connect_started)
+            introspect_started = time.perf_counter()
+            async with conn.cursor(row_factory=dict_row) as cursor:
+                for statement in schema_sandboxes.session_statements(sandbox.temp_db):
+                    await cursor.execute(statement)
+                await cursor.execute(SCHEMA_TABLES_SQL)
+                tables = [row['table_name'] for row in await cursor.fetchall()]
+
+                schema = {}
+                for table in tables:
+                    if with_pk:
+                        await cursor.execute(SCHEMA_COLUMNS_WITH_PK_SQL, (table, table))
+                    else:
+                        await cursor.execute(SCHEMA_COLUMNS_SQL, (table,))
+                    schema[table] = self._columns(await cursor.fetchall(), with_pk)
+            tracing.record('introspect', introspect_started)
+        return tables, schema
+
+
+sandbox_manager = SandboxManager()
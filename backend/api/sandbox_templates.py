@@ -0,0 +1,217 @@
+"""
+Бази-шаблони дампів для швидкого створення пісочниць.
+
+Для кожного вмісту дампу (ключ — sha256) один раз створюється база tpl_<hash>_…
+з відновленим дампом, позначена IS_TEMPLATE і ALLOW_CONNECTIONS false. Нова
+пісочниця — це CREATE DATABASE ... TEMPLATE: PostgreSQL копіює файли бази замість
+повторного виконання SQL-дампу, тож створення (зокрема після «Скинути базу»)
+займає частку часу відновлення. Підключень до шаблону немає, тому копіювання
+ніколи не блокується сесіями студентів.
+"""
+import logging
+import time
+import uuid
+
+from django.conf import settings
+from django.db import IntegrityError
+
+from . import locks, metrics, sandbox_db, tracing
+from .models import SandboxTemplate
+from .replicas import hashes_in_use
+from .result_cache import dump_sha256
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEMPLATE_SETTINGS = {
+    'ENABLED': True,
+}
+
+
+def template_settings():
+    return {**DEFAULT_TEMPLATE_SETTINGS, **getattr(settings, 'SANDBOX_TEMPLATES', {})}
+
+
+def enabled():
+    return template_settings()['ENABLED']
+
+
+def _drop_template(admin_cursor, db_name):
+    # Базу-шаблон не можна видалити, поки вона позначена IS_TEMPLATE
+    admin_cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", (db_name,))
+    if admin_cursor.fetchone():
+        admin_cursor.execute(f"ALTER DATABASE {db_name} WITH IS_TEMPLATE false")
+        admin_cursor.execute(f"DROP DATABASE IF EXISTS {db_name}")
+
+
+def _create_template(db_name, dump_path, source, server, inspect=None):
+    """
+    Відновлює дамп у нову базу db_name і позначає її шаблоном. inspect(cursor) —
+    необов'язковий виклик для відновленої бази до того, як підключення до неї заборонено.
+    Повертає (секунди створення, результат inspect).
+    """
+    inspected = None
+    admin_conn = sandbox_db.connect(alias=server)
+    try:
+        admin_cursor = admin_conn.cursor()
+        create_started = time.perf_counter()
+        with tracing.span('create_db'):
+            admin_cursor.execute(f"CREATE DATABASE {db_name}{sandbox_db.tablespace_clause(server)}")
+        try:
+            temp_conn = sandbox_db.connect(db_name, alias=server)
+            try:
+                temp_cursor = temp_conn.cursor()
+                temp_cursor.execute("SET statement_timeout = 60000")
+                with open(dump_path, 'r', encoding='utf-8') as f, tracing.span('restore'), \
+                        metrics.SANDBOX_RESTORE_SECONDS.time(source='template'):
+                    temp_cursor.execute(sandbox_db.prepare_dump(f.read(), server))
+                if inspect is not None:
+                    inspected = inspect(temp_cursor)
+            finally:
+                temp_conn.close()
+            admin_cursor.execute(f"ALTER DATABASE {db_name} WITH IS_TEMPLATE true ALLOW_CONNECTIONS false")
+        except Exception:
+            _drop_template(admin_cursor, db_name)
+            raise
+        create_seconds = time.perf_counter() - create_started
+        metrics.SANDBOX_CREATE_SECONDS.observe(create_seconds, source='template')
+        logger.info(f"Created sandbox template {db_name} on {server} for {source}")
+        admin_cursor.close()
+    finally:
+        admin_conn.close()
+    return create_seconds, inspected
+
+
+def drop_stale_templates():
+    """Видаляє шаблони дампів, які більше не використовує жодна база викладача чи задача."""
+    stale = list(SandboxTemplate.objects.exclude(dump_sha256__in=hashes_in_use()).order_by('server'))
+    for server in {template.server for template in stale}:
+        admin_conn = sandbox_db.connect(alias=server)
+        try:
+            admin_cursor = admin_conn.cursor()
+            for template in stale:
+                if template.server != server:
+                    continue
+                _drop_template(admin_cursor, template.database_name)
+                template.delete()
+                logger.info(f"Dropped stale sandbox template {template.database_name} on {server}")
+            admin_cursor.close()
+        finally:
+            admin_conn.close()
+    return len(stale)
+
+
+def _lost_unlogged_data(template):
+    """
+    True, якщо UNLOGGED-таблиці шаблону могли бути очищені: після аварійного перезапуску
+    PostgreSQL обнуляє такі таблиці, тож шаблон, старший за запуск сервера, перебудовується.
+    """
+    conn = sandbox_db.connect(alias=template.server)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT pg_postmaster_start_time()")
+        started_at = cursor.fetchone()[0]
+        cursor.close()
+    finally:
+        conn.close()
+    return template.created_at < started_at
+
+
+def get_template(instance, file_field, hash_field, source='teacher_database', server='default'):
+    """
+    Ім'я бази-шаблону для дампу instance.<file_field> на сервері пісочниць server;
+    створює її за потреби. source — мітка для метрик і журналу (teacher_database / task).
+    """
+    digest = dump_sha256(instance, file_field, hash_field)
+    template = SandboxTemplate.objects.filter(dump_sha256=digest, server=server).first()
+    if template and not (template.unlogged and _lost_unlogged_data(template)):
+        return template.database_name
+    # Шаблон будує один запит; паралельні чекають на нього і беруть готовий
+    with locks.single_flight('template', digest, server):
+        return _build_template(instance, file_field, digest, source, server)
+
+
+def _build_template(instance, file_field, digest, source, server):
+    template = SandboxTemplate.objects.filter(dump_sha256=digest, server=server).first()
+    if template and template.unlogged and _lost_unlogged_data(template):
+        logger.warning(f"Rebuilding unlogged sandbox template {template.database_name} after server restart")
+        admin_conn = sandbox_db.connect(alias=server)
+        try:
+            _drop_template(admin_conn.cursor(), template.database_name)
+        finally:
+            admin_conn.close()
+        template.delete()
+        template = None
+    if template:
+        return template.database_name
+
+    db_name = f"tpl_{digest[:16]}_{uuid.uuid4().hex[:8]}"
+    _create_template(db_name, getattr(instance, file_field).path, source, server)
+    return _register_template(db_name, digest, server)
+
+
+def _register_template(db_name, digest, server):
+    """Реєструє шаблон db_name; якщо шаблон цього дампу вже є, нова база видаляється."""
+    try:
+        SandboxTemplate.objects.create(dump_sha256=digest, server=server, database_name=db_name,
+                                       unlogged=sandbox_db.unlogged_enabled(server))
+    except IntegrityError:
+        # Паралельний запит уже зареєстрував шаблон цього дампу — використовуємо його
+        admin_conn = sandbox_db.connect(alias=server)
+        try:
+            _drop_template(admin_conn.cursor(), db_name)
+        finally:
+            admin_conn.close()
+        return SandboxTemplate.objects.get(dump_sha256=digest, server=server).database_name
+
+    try:
+        drop_stale_templates()
+    except Exception as e:
+        logger.warning(f"Failed to drop stale sandbox templates: {e}")
+    return db_name
+
+
+def ingest_template(instance, file_field, hash_field, inspect, source='teacher_database', server='default'):
+    """
+    Завжди відновлює дамп instance.<file_field> у нову базу (перевірка дампу), викликає
+    inspect(cursor) для неї і реєструє її як шаблон. Якщо шаблон цього вмісту вже є,
+    нова база видаляється. Повертає (секунди створення, результат inspect).
+    Помилка відновлення прокидається далі.
+
+    Відновлення йде в базу з унікальною назвою без блокування 'template', тож get_template
+    для цього дампу не чекає на всю перевірку: блокування береться лише на реєстрацію.
+    """
+    digest = dump_sha256(instance, file_field, hash_field)
+    db_name = f"tpl_{digest[:16]}_{uuid.uuid4().hex[:8]}"
+    create_seconds, inspected = _create_template(db_name, getattr(instance, file_field).path, source, server,
+                                                 inspect=inspect)
+    try:
+        with locks.single_flight('template', digest, server):
+            _replace_template(db_name, digest, server)
+    except Exception:
+        if not SandboxTemplate.objects.filter(database_name=db_name, server=server).exists():
+            _drop_database_on(server, db_name)
+        raise
+    return create_seconds, inspected
+
+
+def _drop_database_on(server, db_name):
+    admin_conn = sandbox_db.connect(alias=server)
+    try:
+        _drop_template(admin_conn.cursor(), db_name)
+    finally:
+        admin_conn.close()
+
+
+def _replace_template(db_name, digest, server):
+    """
+    Реєструє перевірену базу db_name шаблоном дампу digest. Чинний шаблон залишається, а
+    db_name видаляється; шаблон з обнуленими UNLOGGED-таблицями замінюється на db_name.
+    """
+    existing = SandboxTemplate.objects.filter(dump_sha256=digest, server=server).first()
+    if existing and not (existing.unlogged and _lost_unlogged_data(existing)):
+        _drop_database_on(server, db_name)
+        return
+    if existing:
+        _drop_database_on(server, existing.database_name)
+        existing.delete()
+    _register_template(db_name, digest, server)
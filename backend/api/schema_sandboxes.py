@@ -0,0 +1,222 @@
+"""
+Пісочниці-схеми: альтернативний режим ізоляції (TeacherDatabase.IsolationMode.SCHEMA).
+
+Замість окремої бази на кожного користувача для дампу створюється одна спільна база
+(SandboxHost), а пісочниця — це схема в ній з однойменною роллю LOGIN, якій
+належать усі об'єкти схеми. Запити студента йдуть через з'єднання, автентифіковане
+саме як ця роль (connect / credentials), а не через SET ROLE з сесії адміністратора:
+роль не є членом жодної іншої ролі, а адміністратор — членом ролей пісочниць, тож
+SET ROLE, set_config('role', ...) чи SESSION AUTHORIZATION у запиті студента не
+відкривають чужі схеми за жодного написання. Пароль ролі не зберігається, а
+виводиться з SECRET_KEY (role_password); після зміни SECRET_KEY наявні пісочниці-схеми
+слід перестворити. pg_hba.conf має дозволяти ролям sbx_* вхід за паролем до баз host_*.
+
+Схема заповнюється повторним виконанням дампу з search_path на неї. Тому дамп має
+використовувати некваліфіковані імена: при створенні бази дамп один раз відновлюється
+в схему-шаблон sandbox_template, і якщо при цьому щось потрапило в public, режим
+SCHEMA для нього недоступний.
+"""
+import hashlib
+import hmac
+import logging
+import time
+import uuid
+
+from django.conf import settings
+from django.db import IntegrityError
+import psycopg2
+from psycopg2 import sql
+
+from . import metrics, sandbox_db, tracing
+from .models import SandboxHost, TemporaryDatabase
+from .result_cache import dump_sha256
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_SCHEMA = 'sandbox_template'
+
+# Скільки одночасних з'єднань може тримати роль пісочниці
+ROLE_CONNECTION_LIMIT = 10
+
+
+def _read_dump(dump_path):
+    with open(dump_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def role_password(schema_name):
+    """Пароль ролі пісочниці schema_name (HMAC від SECRET_KEY, ніде не зберігається)."""
+    return hmac.new(settings.SECRET_KEY.encode(), f"sandbox-role:{schema_name}".encode(),
+                    hashlib.sha256).hexdigest()
+
+
+def credentials(temp_db):
+    """{'user', 'password'} ролі пісочниці-схеми temp_db; None — підключатися адміністратором."""
+    if not temp_db or not temp_db.schema_name:
+        return None
+    return {'user': temp_db.schema_name, 'password': role_password(temp_db.schema_name)}
+
+
+def session_statements(temp_db):
+    """SQL, що переводить з'єднання ролі пісочниці-схеми в її схему (порожньо для окремої бази)."""
+    if not temp_db or not temp_db.schema_name:
+        return []
+    return [f'SET search_path = "{temp_db.schema_name}"']
+
+
+def connect(host_name, schema_name, alias='default'):
+    """psycopg2-з'єднання з базою host_name від імені ролі пісочниці schema_name, у її схемі."""
+    conn = sandbox_db.connect(host_name, alias=alias, user=schema_name, password=role_password(schema_name))
+    with conn.cursor() as cursor:
+        cursor.execute(f'SET search_path = "{schema_name}"')
+    return conn
+
+
+def _create_host(db_name, dump_path):
+    """Створює спільну базу з відновленою схемою-шаблоном і перевіряє, що дамп не пише в public."""
+    admin_conn = sandbox_db.connect()
+    try:
+        admin_cursor = admin_conn.cursor()
+        with tracing.span('create_db'):
+            admin_cursor.execute(f"CREATE DATABASE {db_name}{sandbox_db.tablespace_clause()}")
+        try:
+            host_conn = sandbox_db.connect(db_name)
+            try:
+                cursor = host_conn.cursor()
+                cursor.execute("SET statement_timeout = 60000")
+                # Студентські ролі не повинні нічого створювати поза своїми схемами
+                cursor.execute("REVOKE ALL ON SCHEMA public FROM PUBLIC")
+                cursor.execute(f"REVOKE TEMPORARY ON DATABASE {db_name} FROM PUBLIC")
+                cursor.execute(f"CREATE SCHEMA {TEMPLATE_SCHEMA}")
+                cursor.execute(f"REVOKE ALL ON SCHEMA {TEMPLATE_SCHEMA} FROM PUBLIC")
+                cursor.execute(f"SET search_path = {TEMPLATE_SCHEMA}")
+                with tracing.span('restore'), metrics.SANDBOX_RESTORE_SECONDS.time(source='schema_host'):
+                    cursor.execute(_read_dump(dump_path))
+                cursor.execute(
+                    "SELECT count(*) FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+                    "WHERE n.nspname = 'public'"
+                )
+                if cursor.fetchone()[0]:
+                    raise ValueError("Дамп створює об'єкти в схемі public, тож не підходить для режиму схем")
+            finally:
+                host_conn.close()
+        except Exception:
+            admin_cursor.execute(f"DROP DATABASE IF EXISTS {db_name}")
+            raise
+        admin_cursor.close()
+    finally:
+        admin_conn.close()
+
+
+def get_host(teacher_db):
+    """Ім'я спільної бази для дампу teacher_db; створює її за потреби."""
+    digest = dump_sha256(teacher_db, 'sql_dump', 'dump_sha256')
+    host = SandboxHost.objects.filter(dump_sha256=digest).first()
+    if host:
+        return host.database_name
+
+    db_name = f"host_{digest[:16]}_{uuid.uuid4().hex[:8]}"
+    _create_host(db_name, teacher_db.sql_dump.path)
+    try:
+        SandboxHost.objects.create(dump_sha256=digest, database_name=db_name)
+    except IntegrityError:
+        # Паралельний запит уже створив базу цього дампу — використовуємо її
+        admin_conn = sandbox_db.connect()
+        try:
+            admin_conn.cursor().execute(f"DROP DATABASE IF EXISTS {db_name}")
+        finally:
+            admin_conn.close()
+        return SandboxHost.objects.get(dump_sha256=digest).database_name
+    logger.info(f"Created sandbox host {db_name} for {teacher_db}")
+    return db_name
+
+
+def _create_schema(host_name, schema_name, dump_path, alias='default'):
+    """
+    Створює роль LOGIN і схему schema_name у базі host_name і відновлює в неї дамп від
+    імені цієї ролі. Роль не отримує членства в інших ролях, і нікому не видається.
+    При помилці схема й роль видаляються.
+    """
+    admin_conn = sandbox_db.connect(host_name, alias=alias)
+    try:
+        admin_cursor = admin_conn.cursor()
+        try:
+            with tracing.span('create_db'):
+                admin_cursor.execute(sql.SQL(
+                    "CREATE ROLE {} LOGIN NOSUPERUSER NOCREATEDB NOCREATEROLE NOINHERIT NOREPLICATION "
+                    "CONNECTION LIMIT {} PASSWORD {}"
+                ).format(sql.Identifier(schema_name), sql.Literal(ROLE_CONNECTION_LIMIT),
+                         sql.Literal(role_password(schema_name))))
+                # Схема належить адміністратору (він видаляє її разом з об'єктами ролі),
+                # роль отримує в ній лише USAGE і CREATE; її об'єкти належать їй
+                admin_cursor.execute(f"CREATE SCHEMA {schema_name}")
+                admin_cursor.execute(f"GRANT USAGE, CREATE ON SCHEMA {schema_name} TO {schema_name}")
+
+            conn = connect(host_name, schema_name, alias=alias)
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SET statement_timeout = 60000")
+                with tracing.span('restore'), metrics.SANDBOX_RESTORE_SECONDS.time(source='schema'):
+                    cursor.execute(_read_dump(dump_path))
+            finally:
+                conn.close()
+        except Exception:
+            _drop(admin_cursor, schema_name)
+            raise
+    finally:
+        admin_conn.close()
+
+
+def create_schema_sandbox(user, session_key, teacher_db):
+    """
+    Створює пісочницю-схему для user+session_key у спільній базі дампу teacher_db.
+    Повертає TemporaryDatabase; при помилці схема й роль видаляються.
+    """
+    host_name = get_host(teacher_db)
+    schema_name = f"sbx_{uuid.uuid4().hex[:16]}"
+    create_started = time.perf_counter()
+    _create_schema(host_name, schema_name, teacher_db.sql_dump.path)
+    try:
+        temp_db = TemporaryDatabase.objects.create(
+            user=user,
+            teacher_database=teacher_db,
+            database_name=host_name,
+            schema_name=schema_name,
+            session_key=session_key
+        )
+    except Exception:
+        _drop_schema(host_name, schema_name)
+        raise
+    metrics.SANDBOX_CREATE_SECONDS.observe(time.perf_counter() - create_started, source='schema')
+    logger.info(f"Created sandbox schema {host_name}.{schema_name} for user {user.username}")
+    return temp_db
+
+
+def _drop(cursor, schema_name):
+    # Власник схеми видаляє її з усіма об'єктами, зокрема належними ролі пісочниці
+    cursor.execute(f"DROP SCHEMA IF EXISTS {schema_name} CASCADE")
+    cursor.execute("SELECT 1 FROM pg_roles WHERE rolname = %s", (schema_name,))
+    if cursor.fetchone():
+        # Закриваємо з'єднання ролі (зокрема пули асинхронних ендпоінтів); без права
+        # pg_signal_backend вони обірвуться самі при наступному запиті від видаленої ролі
+        try:
+            cursor.execute(
+                "SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE usename = %s", (schema_name,)
+            )
+        except psycopg2.Error as e:
+            logger.warning(f"Failed to terminate connections of sandbox role {schema_name}: {e}")
+        cursor.execute(f"DROP ROLE {schema_name}")
+
+
+def _drop_schema(host_name, schema_name, alias='default'):
+    conn = sandbox_db.connect(host_name, alias=alias)
+    try:
+        with metrics.SANDBOX_DROP_SECONDS.time(source='schema'):
+            _drop(conn.cursor(), schema_name)
+    finally:
+        conn.close()
+
+
+def drop_schema_sandbox(temp_db):
+    """Видаляє схему й роль пісочниці temp_db (сам запис TemporaryDatabase не чіпає)."""
+    _drop_schema(temp_db.database_name, temp_db.schema_name, temp_db.server)
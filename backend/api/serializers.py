@@ -1,8 +1,11 @@
+from functools import partial
+
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
 from django.contrib.auth import get_user_model
-from .models import Course, TeacherDatabase, Task
+from .models import Course, TeacherDatabase, Task, SandboxCheckpoint, DumpUpload
+from . import checkpoints, sandbox_identity, uploads
 
 User = get_user_model()
 
@@ -64,8 +67,18 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     def validate(self, attrs):
         """
         Додає дані користувача до відповіді разом із токеном.
+        Необов'язкове поле workspace записується в токен як робочий простір пісочниць
+        (див. api/sandbox_identity.py).
         """
         data = super().validate(attrs)
+        workspace = self.initial_data.get('workspace')
+        if workspace:
+            if not sandbox_identity.is_valid_workspace(workspace):
+                raise serializers.ValidationError({'workspace': 'Допустимі символи: A-Z, a-z, 0-9, _ і -, до 64.'})
+            refresh = self.get_token(self.user)
+            refresh[sandbox_identity.WORKSPACE_CLAIM] = workspace
+            data['refresh'] = str(refresh)
+            data['access'] = str(refresh.access_token)
         user = self.user
         user_serializer = UserSerializer(user)
         data['user'] = user_serializer.data
@@ -91,22 +104,130 @@ class CourseSerializer(serializers.ModelSerializer):
         validated_data['teacher'] = self.context['request'].user
         return super().create(validated_data)
 
-class TeacherDatabaseSerializer(serializers.ModelSerializer):
+class CourseListSerializer(serializers.ModelSerializer):
+    """
+    Скорочений сериалізатор курсу для списку: вчитель — лише id, без вкладеного профілю.
+    """
+    assignments_count = serializers.IntegerField(read_only=True, default=0)
+
+    class Meta:
+        model = Course
+        fields = ['id', 'title', 'description', 'teacher', 'created_at', 'cover_image', 'assignments_count']
+        read_only_fields = fields
+
+class DumpUploadSerializer(serializers.ModelSerializer):
+    """
+    Сериалізатор покрокового завантаження дампу (див. api/uploads.py).
+    """
+    is_complete = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = DumpUpload
+        fields = ['id', 'filename', 'size', 'offset', 'sha256', 'is_complete', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'offset', 'sha256', 'created_at', 'updated_at']
+
+class DumpUploadFieldMixin:
+    """
+    Дозволяє передати замість файлу дампу upload — id завершеного DumpUpload.
+    upload_file_field — FileField моделі, upload_hash_field — поле його sha256.
+    """
+    upload_file_field = None
+    upload_hash_field = None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields['upload'] = serializers.PrimaryKeyRelatedField(
+            queryset=DumpUpload.objects.all(), write_only=True, required=False)
+        fields[self.upload_file_field].required = False
+        return fields
+
+    def validate_upload(self, upload):
+        if upload.user_id != self.context['request'].user.id:
+            raise serializers.ValidationError('Завантаження не знайдено.')
+        if not upload.is_complete:
+            raise serializers.ValidationError('Завантаження ще не завершено.')
+        try:
+            uploads.check_restorable(upload)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+        return upload
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if self.instance is None and not attrs.get(self.upload_file_field) and not attrs.get('upload'):
+            raise serializers.ValidationError({self.upload_file_field: 'Потрібен файл або upload.'})
+        return attrs
+
+    def _save_with_upload(self, save, validated_data):
+        upload = validated_data.pop('upload', None)
+        if upload is None:
+            return save(validated_data)
+        upload_to = self.Meta.model._meta.get_field(self.upload_file_field).upload_to
+        try:
+            # Файл переноситься й запис завантаження видаляється разом зі збереженням моделі
+            with uploads.claim(upload, upload_to) as (name, digest):
+                # Ім'я вже збереженого файлу: хеш не скидається в save() моделі
+                validated_data[self.upload_file_field] = name
+                validated_data[self.upload_hash_field] = digest
+                return save(validated_data)
+        except DumpUpload.DoesNotExist:
+            raise serializers.ValidationError({'upload': 'Завантаження вже використано.'})
+
+    def create(self, validated_data):
+        return self._save_with_upload(super().create, validated_data)
+
+    def update(self, instance, validated_data):
+        return self._save_with_upload(partial(super().update, instance), validated_data)
+
+class TeacherDatabaseSerializer(DumpUploadFieldMixin, serializers.ModelSerializer):
     """
     Сериалізатор для моделі TeacherDatabase.
     """
+    upload_file_field = 'sql_dump'
+    upload_hash_field = 'dump_sha256'
+
     class Meta:
         model = TeacherDatabase
-        fields = ['id', 'name', 'sql_dump', 'uploaded_at']
-        read_only_fields = ['id', 'uploaded_at']
+        fields = ['id', 'name', 'sql_dump', 'isolation_mode', 'uploaded_at',
+                  'ingestion_status', 'ingestion_error', 'ingested_at', 'restore_seconds',
+                  'database_size_bytes', 'table_count', 'row_count', 'dump_schema']
+        read_only_fields = ['id', 'uploaded_at',
+                            'ingestion_status', 'ingestion_error', 'ingested_at', 'restore_seconds',
+                            'database_size_bytes', 'table_count', 'row_count', 'dump_schema']
 
-class TaskSerializer(serializers.ModelSerializer):
+class TaskSerializer(DumpUploadFieldMixin, serializers.ModelSerializer):
     """
     Сериалізатор для моделі Task.
     """
+    upload_file_field = 'original_db'
+    upload_hash_field = 'original_db_sha256'
+
+    class Meta:
+        model = Task
+        fields = ['id', 'title', 'description', 'original_db', 'etalon_db', 'course', 'due_date', 'created_at', 'updated_at',
+                  'etalon_status', 'etalon_error', 'etalon_built_at']
+        read_only_fields = ['id', 'created_at', 'updated_at', 'etalon_status', 'etalon_error', 'etalon_built_at']
+
+class TaskListSerializer(serializers.ModelSerializer):
+    """
+    Скорочений сериалізатор задачі для списку: без файлів дампів і стану еталону.
+    """
     class Meta:
         model = Task
-        fields = ['id', 'title', 'description', 'original_db', 'etalon_db', 'course', 'due_date', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        fields = ['id', 'title', 'description', 'course', 'due_date', 'created_at']
+        read_only_fields = fields
 
+class SandboxCheckpointSerializer(serializers.ModelSerializer):
+    """
+    Сериалізатор точки відновлення пісочниці (лише для читання). retryable — точку не
+    створено лише через зайнятість пісочниці, і POST з тією самою назвою повторить спробу.
+    """
+    retryable = serializers.SerializerMethodField()
+
+    class Meta:
+        model = SandboxCheckpoint
+        fields = ['id', 'name', 'status', 'error', 'retryable', 'created_at']
+        read_only_fields = fields
 
+    def get_retryable(self, obj):
+        return obj.status == SandboxCheckpoint.Status.FAILED and obj.error == checkpoints.BUSY_ERROR
@@ -1,3 +1,211 @@
-from django.test import TestCase
+import os
+import tempfile
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest import SkipTest, mock
 
-# Створіть ваші тести тут.
+import psycopg2
+
+from django.db import OperationalError
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from .fingerprint import fingerprint_query, normalize_query
+from .history import SQLHistoryBuffer
+from .metrics import _allowed
+from . import sandbox_db, schema_sandboxes
+from .sandbox_db import prepare_dump
+from .views import decode_history_cursor, encode_history_cursor
+from .result_cache import is_cacheable_query
+
+
+class NormalizeQueryTests(SimpleTestCase):
+    """Нормалізація запитів у відбиток (api/fingerprint.py)."""
+
+    def test_literals_whitespace_and_case(self):
+        self.assertEqual(normalize_query('SELECT * FROM t WHERE id = 5'), 'select * from t where id = ?')
+        self.assertEqual(normalize_query('select *  from t where id=42;'), 'select * from t where id = ?')
+
+    def test_non_ascii_identifiers_are_kept(self):
+        self.assertEqual(normalize_query('SELECT * FROM студенти'), 'select * from студенти')
+        self.assertEqual(normalize_query('SELECT ім_я FROM t'), 'select ім_я from t')
+        self.assertNotEqual(fingerprint_query('SELECT * FROM студенти')[0],
+                            fingerprint_query('SELECT * FROM викладачі')[0])
+
+    def test_escape_string(self):
+        self.assertEqual(normalize_query("SELECT E'it\\'s' FROM t", strip_literals=False),
+                         "select E'it\\'s' from t")
+        self.assertEqual(normalize_query("SELECT E'it\\'s' FROM t"), 'select ? from t')
+
+
+class FingerprintQueryTests(SimpleTestCase):
+    """Відбиток запиту (api/fingerprint.py)."""
+
+    def test_same_shape_same_fingerprint(self):
+        first = fingerprint_query("SELECT * FROM t WHERE name = 'a' AND id = 1")
+        second = fingerprint_query("select *\n  from t where name='bb' and id = 22;")
+        self.assertEqual(first, second)
+        self.assertEqual(first[1], 'select * from t where name = ? and id = ?')
+
+    def test_different_shape_different_fingerprint(self):
+        self.assertNotEqual(fingerprint_query('SELECT id FROM t')[0], fingerprint_query('SELECT name FROM t')[0])
+
+
+class CacheableQueryTests(SimpleTestCase):
+    """Класифікація запитів для кешу результатів (api/result_cache.py)."""
+
+    def test_session_dependent_queries_are_not_cached(self):
+        self.assertFalse(is_cacheable_query('SHOW search_path'))
+        self.assertFalse(is_cacheable_query('SELECT current_schema()'))
+        self.assertFalse(is_cacheable_query('SELECT now()'))
+
+    def test_plain_select_is_cached(self):
+        self.assertTrue(is_cacheable_query('SELECT * FROM студенти'))
+
+
+class HistoryBufferTests(SimpleTestCase):
+    """Повернення пачки історії в буфер, коли база недоступна (api/history.py)."""
+
+    @override_settings(SQL_HISTORY_BUFFER={'MAX_PENDING': 3})
+    def test_failed_batch_is_requeued_within_max_pending(self):
+        buffer = SQLHistoryBuffer()
+        buffer._pending = [{'query': f'SELECT {i}'} for i in range(4)]
+        with mock.patch.object(buffer, '_write', side_effect=OperationalError('down')), \
+                self.assertLogs('api.history', 'WARNING'):
+            with self.assertRaises(OperationalError):
+                buffer.flush()
+        # Найстаріший запис відкинуто, решта чекає наступного скидання в тому ж порядку
+        self.assertEqual([r['query'] for r in buffer._pending], ['SELECT 1', 'SELECT 2', 'SELECT 3'])
+
+
+class MetricsAccessTests(SimpleTestCase):
+    """Доступ до /metrics без DEBUG (api/metrics.py)."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    @override_settings(DEBUG=False, METRICS_TOKEN='', METRICS_ALLOWED_NETWORKS=[])
+    def test_closed_without_token_or_networks(self):
+        self.assertFalse(_allowed(self.factory.get('/metrics', REMOTE_ADDR='203.0.113.5')))
+
+    @override_settings(DEBUG=False, METRICS_TOKEN='', METRICS_ALLOWED_NETWORKS=['10.0.0.0/8'])
+    def test_allowed_networks(self):
+        self.assertTrue(_allowed(self.factory.get('/metrics', REMOTE_ADDR='10.1.2.3')))
+        self.assertFalse(_allowed(self.factory.get('/metrics', REMOTE_ADDR='203.0.113.5')))
+
+    @override_settings(DEBUG=False, METRICS_TOKEN='secret', METRICS_ALLOWED_NETWORKS=['10.0.0.0/8'])
+    def test_token_is_required_when_set(self):
+        self.assertFalse(_allowed(self.factory.get('/metrics', REMOTE_ADDR='10.1.2.3')))
+        self.assertTrue(_allowed(self.factory.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')))
+
+
+class HistoryCursorTests(SimpleTestCase):
+    """Курсор сторінки історії SQL (api/views.py)."""
+
+    def test_round_trip(self):
+        executed_at = datetime(2025, 3, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+        cursor = encode_history_cursor(SimpleNamespace(executed_at=executed_at, id=42))
+        self.assertEqual(decode_history_cursor(cursor), (executed_at, 42))
+
+    def test_damaged_cursor(self):
+        for cursor in ['не-base64', 'bm90LWEtY3Vyc29y', 'MjAyNS0wMy0wMXx4']:
+            with self.subTest(cursor=cursor), self.assertRaises(ValueError):
+                decode_history_cursor(cursor)
+
+
+class PrepareDumpTests(SimpleTestCase):
+    """UNLOGGED-таблиці при відновленні дампу (api/sandbox_db.py)."""
+
+    dump = 'CREATE TABLE a (id int);\n  create table b (id int);\nINSERT INTO a VALUES (1);\n'
+
+    @override_settings(SANDBOX_DATABASES={'default': {'UNLOGGED_TABLES': False}})
+    def test_unchanged_when_disabled(self):
+        self.assertEqual(prepare_dump(self.dump), self.dump)
+
+    @override_settings(SANDBOX_DATABASES={'default': {'UNLOGGED_TABLES': True}})
+    def test_tables_become_unlogged(self):
+        self.assertEqual(prepare_dump(self.dump),
+                         'CREATE UNLOGGED TABLE a (id int);\n  CREATE UNLOGGED TABLE b (id int);\n'
+                         'INSERT INTO a VALUES (1);\n')
+
+    @override_settings(SANDBOX_DATABASES={'default': {'UNLOGGED_TABLES': True}})
+    def test_partitioned_dump_is_unchanged(self):
+        dump = self.dump + 'CREATE TABLE c (id int) PARTITION BY RANGE (id);\n'
+        self.assertEqual(prepare_dump(dump), dump)
+
+
+class SchemaSandboxIsolationTests(SimpleTestCase):
+    """
+    Пісочниця-схема не може перейти в чужу роль (api/schema_sandboxes.py). Потрібен сервер
+    пісочниць settings.SANDBOX_DATABASES['default']; без нього тести пропускаються.
+    """
+
+    bypasses = [
+        "SELECT set_config('ro'||'le', %(target)s, false)",
+        "SET/**/ROLE {target}",
+        "SELECT set_config($$role$$, %(target)s, false)",
+        "SET SESSION AUTHORIZATION {target}",
+        "SET LOCAL ROLE {target}",
+    ]
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        try:
+            sandbox_db.connect().close()
+        except psycopg2.OperationalError as e:
+            raise SkipTest(f"Sandbox server is unavailable: {e}")
+        with tempfile.NamedTemporaryFile('w', suffix='.sql', delete=False, encoding='utf-8') as dump:
+            dump.write("CREATE TABLE secrets (value text); INSERT INTO secrets VALUES ('hidden');")
+        cls.dump_path = dump.name
+        cls.host = f"host_test_{uuid.uuid4().hex[:8]}"
+        schema_sandboxes._create_host(cls.host, cls.dump_path)
+        cls.own = f"sbx_{uuid.uuid4().hex[:16]}"
+        cls.other = f"sbx_{uuid.uuid4().hex[:16]}"
+        schema_sandboxes._create_schema(cls.host, cls.own, cls.dump_path)
+        schema_sandboxes._create_schema(cls.host, cls.other, cls.dump_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        for schema_name in (cls.own, cls.other):
+            schema_sandboxes._drop_schema(cls.host, schema_name)
+        admin_conn = sandbox_db.connect()
+        try:
+            admin_conn.cursor().execute(f"DROP DATABASE IF EXISTS {cls.host}")
+        finally:
+            admin_conn.close()
+        os.remove(cls.dump_path)
+        super().tearDownClass()
+
+    def test_role_switch_bypasses_fail(self):
+        admin = sandbox_db.server_config()['USER']
+        conn = schema_sandboxes.connect(self.host, self.own)
+        try:
+            cursor = conn.cursor()
+            for target in (self.other, admin):
+                for statement in self.bypasses:
+                    with self.subTest(statement=statement, target=target):
+                        with self.assertRaises(psycopg2.Error):
+                            cursor.execute(statement.format(target=target), {'target': target})
+                        cursor.execute("SELECT current_user")
+                        self.assertEqual(cursor.fetchone()[0], self.own)
+            with self.assertRaises(psycopg2.errors.InsufficientPrivilege):
+                cursor.execute(f"SELECT * FROM {self.other}.secrets")
+            cursor.execute("SELECT value FROM secrets")
+            self.assertEqual(cursor.fetchone()[0], 'hidden')
+        finally:
+            conn.close()
+
+    def test_sandbox_role_is_a_plain_login_role(self):
+        conn = sandbox_db.connect(self.host)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT rolcanlogin, rolsuper, rolcreaterole, rolcreatedb FROM pg_roles WHERE rolname = %s",
+                           (self.own,))
+            self.assertEqual(cursor.fetchone(), (True, False, False, False))
+            # Роль пісочниці не входить у жодну іншу роль
+            cursor.execute("SELECT count(*) FROM pg_auth_members m JOIN pg_roles r ON r.oid = m.member "
+                           "WHERE r.rolname = %s", (self.own,))
+            self.assertEqual(cursor.fetchone()[0], 0)
+        finally:
+            conn.close()
@@ -0,0 +1,143 @@
+"""
+Легке трасування запитів: тривалість окремих фаз (пошук сесії, пошук
+TemporaryDatabase, CREATE DATABASE, відновлення дампу, підключення,
+виконання запиту, серіалізація).
+
+    with tracing.span('execute'):
+        cursor.execute(query)
+
+TracingMiddleware відкриває трасу на кожен запит, повертає фази в заголовку
+Server-Timing (видно у вкладці Network браузера) і з імовірністю
+TRACING['SAMPLE_RATE'] пише трасу одним JSON-рядком у журнал api.traces
+(logs/traces.jsonl). Поза middleware span нічого не робить.
+"""
+import contextvars
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils import timezone
+
+trace_logger = logging.getLogger('api.traces')
+
+DEFAULT_TRACING_SETTINGS = {
+    'ENABLED': True,        # Заголовок Server-Timing для кожного запиту
+    'SAMPLE_RATE': 0.0,     # Частка запитів, що пишуться в logs/traces.jsonl (0..1)
+    'TIMING_ALLOW_ORIGIN': '',  # Значення заголовка Timing-Allow-Origin (порожнє — не додавати)
+}
+
+_current_trace = contextvars.ContextVar('api_trace', default=None)
+
+
+def tracing_settings():
+    return {**DEFAULT_TRACING_SETTINGS, **getattr(settings, 'TRACING', {})}
+
+
+class Trace:
+    """Фази одного HTTP-запиту: список (назва, зсув від початку, тривалість) у секундах."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+
+    def add(self, name, started, duration):
+        self.spans.append((name, started - self.started, duration))
+
+    def totals(self):
+        """Сумарна тривалість кожної фази в порядку першої появи."""
+        totals = {}
+        for name, _, duration in self.spans:
+            totals[name] = totals.get(name, 0.0) + duration
+        return totals
+
+    def server_timing(self, total):
+        parts = [f'{name};dur={duration * 1000:.1f}' for name, duration in self.totals().items()]
+        parts.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(parts)
+
+
+@contextmanager
+def span(name):
+    """Вимірює блок with як фазу name поточної траси."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, started, time.perf_counter() - started)
+
+
+def record(name, started):
+    """
+    Записує фазу name, що почалася в момент started (time.perf_counter()) і триває досі.
+    Для довгих ділянок коду, які незручно загортати в with.
+    """
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, started, time.perf_counter() - started)
+
+
+def _start():
+    return _current_trace.set(Trace())
+
+
+def _finish(request, response, token):
+    trace = _current_trace.get()
+    _current_trace.reset(token)
+    total = time.perf_counter() - trace.started
+    response['Server-Timing'] = trace.server_timing(total)
+
+    config = tracing_settings()
+    if config['TIMING_ALLOW_ORIGIN']:
+        response['Timing-Allow-Origin'] = config['TIMING_ALLOW_ORIGIN']
+    sample_rate = config['SAMPLE_RATE']
+    if sample_rate and random.random() < sample_rate:
+        user = getattr(request, 'user', None)
+        trace_logger.info(json.dumps({
+            'timestamp': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'user_id': user.pk if user is not None and user.is_authenticated else None,
+            'total_ms': round(total * 1000, 3),
+            'spans': [
+                {'name': name, 'start_ms': round(offset * 1000, 3), 'duration_ms': round(duration * 1000, 3)}
+                for name, offset, duration in trace.spans
+            ],
+        }, ensure_ascii=False))
+    return response
+
+
+class TracingMiddleware:
+    """Відкриває трасу на час обробки запиту (працює і під WSGI, і під ASGI)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = tracing_settings()['ENABLED']
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        token = _start()
+        response = self.get_response(request)
+        return _finish(request, response, token)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        token = _start()
+        response = await self.get_response(request)
+        return _finish(request, response, token)
@@ -0,0 +1,215 @@
+"""
+Покрокове (chunked) відновлюване завантаження великих дампів.
+
+Замість одного multipart-запиту на сотні МБ клієнт:
+
+    1. POST /api/dump-uploads/ { filename, size }            → { id, offset: 0, ... }
+    2. PATCH /api/dump-uploads/{id}/ з частиною файлу в тілі (application/offset+octet-stream)
+       і заголовком Upload-Offset — зміщенням частини у файлі; відповідь — новий offset
+    3. після обриву: GET /api/dump-uploads/{id}/ повертає offset, з якого продовжувати
+    4. POST /api/teacher-databases/ або /api/tasks/ з полем upload={id} замість файлу
+
+Частина (не більше MAX_CHUNK_SIZE) спершу повністю вичитується із запиту і лише тоді
+дописується у файл під блокуванням запису, тож обмеження DATA_UPLOAD_MAX_MEMORY_SIZE
+її не стосуються, а повільний клієнт не тримає блокування. sha256 рахується інкрементально по мірі
+надходження частин (стан хешу тримається в пам'яті процесу; якщо частину приймає
+інший процес, він один раз дочитує вже отриману частину файлу), тож після останньої
+частини хеш дампу готовий і не обчислюється повторно (api/result_cache.dump_sha256).
+
+Дамп відновлюється одним execute (api/sandbox_templates.py, api/etalons.py), тому
+MAX_SIZE обмежено розміром, який так можна відновити, а дампи з COPY ... FROM stdin
+(формат pg_dump за замовчуванням) відхиляються: їх треба вивантажувати з --inserts.
+"""
+import hashlib
+import io
+import logging
+import os
+import re
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .models import DumpUpload
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_UPLOAD_SETTINGS = {
+    'DIRECTORY': None,                   # Каталог незавершених завантажень; None — MEDIA_ROOT/uploads
+    'MAX_SIZE': 256 * 1024 ** 2,         # Найбільший розмір дампу, байтів; дамп відновлюється з пам'яті
+    'MAX_CHUNK_SIZE': 16 * 1024 ** 2,    # Найбільша частина в одному запиті, байтів
+    'EXPIRE_HOURS': 24,                  # Незавершені завантаження без змін видаляються через стільки годин
+}
+
+READ_SIZE = 1024 * 1024
+
+_COPY_STDIN_RE = re.compile(rb'^\s*COPY\s.*\sFROM\s+stdin\b', re.IGNORECASE)
+
+# id завантаження -> (offset, sha256 отриманих байтів); лише прискорення, не джерело істини
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+
+class OffsetMismatch(ValueError):
+    """Upload-Offset запиту не збігається з кількістю вже отриманих байтів."""
+
+    def __init__(self, offset):
+        super().__init__(f"Очікувалося зміщення {offset}")
+        self.offset = offset
+
+
+def upload_settings():
+    return {**DEFAULT_UPLOAD_SETTINGS, **getattr(settings, 'CHUNKED_UPLOADS', {})}
+
+
+def _directory():
+    return upload_settings()['DIRECTORY'] or os.path.join(settings.MEDIA_ROOT, 'uploads')
+
+
+def part_path(upload):
+    return os.path.join(_directory(), f"{upload.id}.part")
+
+
+def create_upload(user, filename, size):
+    """Реєструє нове завантаження і створює порожній файл частин."""
+    filename = os.path.basename(filename or '')
+    if not filename:
+        raise ValueError('Не вказано назву файлу')
+    if size <= 0 or size > upload_settings()['MAX_SIZE']:
+        raise ValueError(f"Розмір файлу має бути від 1 до {upload_settings()['MAX_SIZE']} байтів")
+    try:
+        drop_expired()
+    except Exception as e:
+        logger.warning(f"Failed to drop expired dump uploads: {e}")
+
+    upload = DumpUpload.objects.create(user=user, filename=filename[:255], size=size)
+    os.makedirs(_directory(), exist_ok=True)
+    open(part_path(upload), 'wb').close()
+    return upload
+
+
+def _hasher_at(upload, f):
+    """sha256 перших upload.offset байтів файлу f: з пам'яті процесу або дочитуванням файлу."""
+    with _hashers_lock:
+        cached = _hashers.pop(upload.id, None)
+    if cached is not None and cached[0] == upload.offset:
+        return cached[1]
+    hasher = hashlib.sha256()
+    f.seek(0)
+    remaining = upload.offset
+    while remaining:
+        data = f.read(min(READ_SIZE, remaining))
+        if not data:
+            raise ValueError('Файл частин коротший за отримані дані; почніть завантаження заново')
+        hasher.update(data)
+        remaining -= len(data)
+    return hasher
+
+
+def append_chunk(upload_id, user, offset, stream, length):
+    """
+    Дописує length байтів зі stream (файлоподібний об'єкт запиту) зі зміщення offset.
+    Частина спершу вичитується повністю; лише запис у файл іде під SELECT ... FOR UPDATE,
+    тож частини одного завантаження приймаються по черзі. Неповна частина відкидається,
+    і клієнт повторює її з поточного offset.
+    """
+    conf = upload_settings()
+    upload = DumpUpload.objects.get(pk=upload_id, user=user)
+    if offset != upload.offset:
+        raise OffsetMismatch(upload.offset)
+    if length <= 0 or length > conf['MAX_CHUNK_SIZE']:
+        raise ValueError(f"Розмір частини має бути від 1 до {conf['MAX_CHUNK_SIZE']} байтів")
+    if offset + length > upload.size:
+        raise ValueError('Частина виходить за заявлений розмір файлу')
+
+    chunk = io.BytesIO()
+    received = 0
+    while received < length:
+        data = stream.read(min(READ_SIZE, length - received))
+        if not data:
+            break
+        chunk.write(data)
+        received += len(data)
+    if received < length:
+        raise ValueError('Частину отримано не повністю')
+
+    with transaction.atomic():
+        upload = DumpUpload.objects.select_for_update().get(pk=upload_id, user=user)
+        # Поки частина читалася, її могла прийняти інша спроба того самого клієнта
+        if offset != upload.offset:
+            raise OffsetMismatch(upload.offset)
+        with open(part_path(upload), 'r+b') as f:
+            hasher = _hasher_at(upload, f)
+            # Залишок перерваного запису після останнього підтвердженого offset відкидається
+            f.seek(offset)
+            f.truncate()
+            f.write(chunk.getbuffer())
+            hasher.update(chunk.getbuffer())
+
+        upload.offset = offset + length
+        if upload.is_complete:
+            upload.sha256 = hasher.hexdigest()
+        upload.save(update_fields=['offset', 'sha256', 'updated_at'])
+    if not upload.is_complete:
+        with _hashers_lock:
+            _hashers[upload.id] = (upload.offset, hasher)
+    return upload
+
+
+def check_restorable(upload):
+    """ValueError, якщо завершений дамп не відновити одним execute (COPY ... FROM stdin)."""
+    with open(part_path(upload), 'rb') as f:
+        for line in f:
+            if _COPY_STDIN_RE.match(line):
+                raise ValueError('Дамп містить COPY ... FROM stdin; вивантажте його через pg_dump --inserts')
+
+
+@contextmanager
+def claim(upload, upload_to):
+    """
+    Переносить завершене завантаження у сховище файлів (каталог upload_to) і дає
+    (ім'я файлу в сховищі, sha256) для FileField і поля хешу моделі. Блок with виконується
+    в одній транзакції з видаленням запису завантаження; якщо він завершився помилкою,
+    файл повертається назад і завантаження можна використати знову. Завантаження, яке
+    вже забрав інший запит, — DumpUpload.DoesNotExist.
+    """
+    name = default_storage.get_available_name(os.path.join(upload_to, upload.filename))
+    target = default_storage.path(name)
+    moved = False
+    try:
+        with transaction.atomic():
+            DumpUpload.objects.select_for_update().get(pk=upload.pk)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # Перейменування замість копіювання: файл уже на диску
+            os.replace(part_path(upload), target)
+            moved = True
+            yield name, upload.sha256
+            upload.delete()
+    except BaseException:
+        if moved:
+            os.replace(target, part_path(upload))
+        raise
+
+
+def discard(upload):
+    """Скасовує завантаження: видаляє файл частин і запис."""
+    with _hashers_lock:
+        _hashers.pop(upload.id, None)
+    try:
+        os.remove(part_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+def drop_expired():
+    """Видаляє завантаження, які не змінювалися EXPIRE_HOURS годин."""
+    cutoff = timezone.now() - timedelta(hours=upload_settings()['EXPIRE_HOURS'])
+    expired = list(DumpUpload.objects.filter(updated_at__lt=cutoff))
+    for upload in expired:
+        discard(upload)
+    return len(expired)
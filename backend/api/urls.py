@@ -9,10 +9,17 @@ from .views import (
     TaskViewSet,
     get_database_schema,
     sql_history,
+    common_queries,
+    query_stats,
     task_schema,
     task_submit,   # використовується тепер як «execute» (Preview SQL)
     execute_sql_query,
+    sandbox_checkpoints,
+    sandbox_checkpoint_detail,
+    dump_uploads,
+    dump_upload_detail,
 )
+from . import async_views
 
 # Створюємо роутер для ViewSet
 router = DefaultRouter()
@@ -47,6 +54,20 @@ urlpatterns = [
     # 2.d) Історія SQL-запитів користувача (sql_history)
     path('sql-history/', sql_history, name='sql-history'),
 
+    # 2.e) Найчастіші запити (за відбитком) до бази вчителя
+    path('sql-history/common/', common_queries, name='sql-history-common'),
+
+    # 2.f) Затримки запитів (p50/p95/p99) по задачах і базах — для вчителів та адміністраторів
+    path('query-stats/', query_stats, name='query-stats'),
+
+    # 2.g) Точки відновлення поточної пісочниці (?task= або ?database_id=) і відновлення/видалення точки
+    path('sandbox-checkpoints/', sandbox_checkpoints, name='sandbox-checkpoints'),
+    path('sandbox-checkpoints/<int:pk>/', sandbox_checkpoint_detail, name='sandbox-checkpoint-detail'),
+
+    # 2.h) Покрокове завантаження великих дампів: почати, дописати частину (PATCH), стан, скасувати
+    path('dump-uploads/', dump_uploads, name='dump-uploads'),
+    path('dump-uploads/<uuid:pk>/', dump_upload_detail, name='dump-upload-detail'),
+
     # ----------------------------------------
     # 3) Task-специфічні ендпоінти
     # ----------------------------------------
@@ -58,7 +79,15 @@ urlpatterns = [
     #      після підключення router.urls доступний POST /tasks/{pk}/submit/ автоматично.
 
     # ----------------------------------------
-    # 4) Підключення всіх ViewSet-роутів (router)
+    # 4) Асинхронні (ASGI) версії SQL-ендпоінтів — той самий контракт, що й у розділах 2–3
+    # ----------------------------------------
+    path('async/execute-sql/', async_views.execute_sql_query, name='async-execute-sql'),
+    path('async/tasks/<int:pk>/execute/', async_views.task_submit, name='async-task-execute'),
+    path('async/tasks/<int:pk>/schema/', async_views.task_schema, name='async-task-schema'),
+    path('async/database-schema/<str:database_id>/', async_views.get_database_schema, name='async-database-schema'),
+
+    # ----------------------------------------
+    # 5) Підключення всіх ViewSet-роутів (router)
     # ----------------------------------------
     #    − /courses/, /courses/{pk}/
     #    − /teacher-databases/, /teacher-databases/{pk}/
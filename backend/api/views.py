@@ -1,23 +1,36 @@
 from rest_framework import generics, permissions, viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action, api_view, permission_classes
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework_simplejwt.views import TokenObtainPairView
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Manager
+from django.db.models import Aggregate, Count, FloatField, Manager, Max, Min, Q, Sum
+import base64
+import binascii
 import os
 import psycopg2
+import psycopg2.errors
 import psycopg2.extras
 import subprocess
 import logging
-from django.conf import settings
-from django.core.cache import cache
+import time
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from .serializers import (RegisterSerializer, CustomTokenObtainPairSerializer, UserSerializer, CourseSerializer,
-    TeacherDatabaseSerializer, TaskSerializer)
-from .models import (Task, TemporaryDatabase, TeacherDatabase, SQLHistory, Course)
-import tempfile
+    TeacherDatabaseSerializer, TaskSerializer, SandboxCheckpointSerializer, DumpUploadSerializer,
+    CourseListSerializer, TaskListSerializer)
+from .models import (Task, TemporaryDatabase, TeacherDatabase, SQLHistory, Course, QueryFingerprint,
+    SandboxCheckpoint, DumpUpload)
+from .history import history_buffer
+from .result_cache import result_cache, is_cacheable_query, is_read_only_query, dump_sha256
+from .permissions import IsTeacher
+from .pagination import CreatedCursorPagination
+from . import (checkpoints, etalons, ingestion, metrics, replicas, sandbox_db, sandbox_identity, tracing,
+    uploads)
+from .sandbox_manager import MAX_RESULTS, Sandbox, sandbox_manager
 import uuid
+from datetime import timedelta
 
 # Для підказок типів (необов'язково, але зручно)
 Course.objects: Manager
@@ -92,12 +105,18 @@ class CourseViewSet(viewsets.ModelViewSet):
     """
     serializer_class = CourseSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedCursorPagination
+
+    def get_serializer_class(self):
+        # Список — без вкладеного профілю вчителя
+        return CourseListSerializer if self.action == 'list' else CourseSerializer
 
     def get_queryset(self):
         user = self.request.user
-        # Використовуємо select_related та prefetch_related для кращої продуктивності
-        queryset = Course.objects.select_related('teacher').prefetch_related('students').annotate(assignments_count=Count('tasks'))
-        
+        queryset = Course.objects.annotate(assignments_count=Count('tasks'))
+        if self.action != 'list':
+            queryset = queryset.select_related('teacher')
+
         if user.role == User.Role.TEACHER:
             return queryset.filter(teacher=user)
         elif user.role == User.Role.STUDENT:
@@ -122,7 +141,8 @@ class TeacherDatabaseViewSet(viewsets.ModelViewSet):
     queryset = TeacherDatabase.objects.all()
     serializer_class = TeacherDatabaseSerializer
     permission_classes = [permissions.IsAuthenticated]
-    parser_classes = [MultiPartParser]
+    # JSON — для створення з покрокового завантаження: { name, upload }
+    parser_classes = [MultiPartParser, JSONParser]
 
     def get_queryset(self):
         """
@@ -140,7 +160,15 @@ class TeacherDatabaseViewSet(viewsets.ModelViewSet):
         user = self.request.user
         if user.role != User.Role.TEACHER:
             raise PermissionDenied("Тільки вчителі можуть завантажувати дампи баз даних.")
-        serializer.save(teacher=user)
+        teacher_db = serializer.save(teacher=user)
+        # Дамп перевіряється і стає шаблоном у фоні, ще до першої пісочниці студента
+        ingestion.enqueue(teacher_db)
+
+    def perform_update(self, serializer):
+        replaced_dump = 'sql_dump' in serializer.validated_data or 'upload' in serializer.validated_data
+        teacher_db = serializer.save()
+        if replaced_dump:
+            ingestion.enqueue(teacher_db)
 
 
 class TaskViewSet(viewsets.ModelViewSet):
@@ -151,7 +179,35 @@ class TaskViewSet(viewsets.ModelViewSet):
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
     permission_classes = [permissions.IsAuthenticated]
-    parser_classes = [MultiPartParser, FormParser]
+    parser_classes = [MultiPartParser, FormParser, JSONParser]
+    pagination_class = CreatedCursorPagination
+
+    def get_serializer_class(self):
+        return TaskListSerializer if self.action == 'list' else TaskSerializer
+
+    def get_queryset(self):
+        """
+        Фільтри списку: ?course=<id>, ?due_before= / ?due_after= (ISO 8601) —
+        по індексах task_course_created_idx, task_course_due_idx і task_due_date_idx.
+        """
+        queryset = self.queryset
+        if self.action != 'list':
+            return queryset
+        params = self.request.query_params
+        course = params.get('course')
+        if course:
+            try:
+                queryset = queryset.filter(course_id=int(course))
+            except ValueError:
+                raise ValidationError({'course': 'Некоректний id курсу'})
+        for param, lookup in (('due_after', 'due_date__gte'), ('due_before', 'due_date__lt')):
+            value = params.get(param)
+            if value:
+                due = parse_datetime(value)
+                if due is None:
+                    raise ValidationError({param: 'Очікується дата й час у форматі ISO 8601'})
+                queryset = queryset.filter(**{lookup: due})
+        return queryset
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -159,15 +215,21 @@ class TaskViewSet(viewsets.ModelViewSet):
             raise PermissionDenied("Тільки вчителі можуть створювати задачі.")
         serializer.save()
 
+    def perform_update(self, serializer):
+        replaced_dump = any(field in serializer.validated_data for field in ('original_db', 'etalon_db', 'upload'))
+        task = serializer.save()
+        if replaced_dump and task.etalon_database:
+            # Збережена еталонна база більше не відповідає файлам задачі
+            etalons.invalidate(task)
+
     @action(detail=True, methods=['post'], url_path='save_etalon')
     def save_etalon(self, request, pk=None):
         """
-        Застосувати SQL-виконання вчителя до копії оригінальної БД,
-        зробити дамп результату та зберегти як еталонну БД.
+        Застосувати SQL-виконання вчителя до копії оригінальної БД і зберегти результат
+        як еталонну БД. Побудова виконується у фоні (api/etalons.py); стан —
+        GET /tasks/{pk}/etalon_status/.
         Очікує: { "sql": "...SQL-виконання вчителя..." }
         """
-        from django.core.files import File
-
         task = self.get_object()
         sql = request.data.get('sql')
         if not sql:
@@ -175,91 +237,61 @@ class TaskViewSet(viewsets.ModelViewSet):
         if not task.original_db:
             return Response({'error': 'До цієї задачі не прикріплено оригінальний файл БД.'}, status=400)
 
-        # 1) Створюємо тимчасову базу для еталону
-        db_config = settings.DATABASES['default']
-        temp_db_name = f"etalon_db_{uuid.uuid4().hex[:16]}"
+        etalons.enqueue(task, sql)
+        return Response({'status': 'Еталонну БД поставлено в чергу.', 'etalon_status': task.etalon_status},
+                        status=status.HTTP_202_ACCEPTED)
 
-        admin_conn = psycopg2.connect(
-            dbname=db_config['NAME'],
-            user=db_config['USER'],
-            password=db_config['PASSWORD'],
-            host=db_config['HOST'],
-            port=db_config['PORT']
-        )
-        admin_conn.autocommit = True
-        admin_cursor = admin_conn.cursor()
+    @action(detail=True, methods=['get'], url_path='etalon_status')
+    def etalon_status(self, request, pk=None):
+        """
+        Стан фонової побудови еталонної БД задачі.
+        """
+        task = self.get_object()
+        return Response({
+            'etalon_status': task.etalon_status,
+            'etalon_error': task.etalon_error,
+            'etalon_built_at': task.etalon_built_at,
+            'has_dump': bool(task.etalon_db),
+            'fingerprinted_tables': len(task.etalon_fingerprints),
+        })
 
-        try:
-            admin_cursor.execute(f"CREATE DATABASE {temp_db_name}")
-            temp_conn = psycopg2.connect(
-                dbname=temp_db_name,
-                user=db_config['USER'],
-                password=db_config['PASSWORD'],
-                host=db_config['HOST'],
-                port=db_config['PORT']
+    def _restore_etalon(self, task, conn_params):
+        """
+        Тимчасова база з дампу task.etalon_db — для задач без збереженої еталонної бази.
+        Після порівняння її видаляє submit.
+        """
+        etalon_db_name = f"etalon_{uuid.uuid4().hex[:16]}"
+        admin_conn = sandbox_db.connect()
+        admin_cur = admin_conn.cursor()
+        create_started = time.perf_counter()
+        with tracing.span('create_db'):
+            admin_cur.execute(f'DROP DATABASE IF EXISTS "{etalon_db_name}"')
+            admin_cur.execute(f'CREATE DATABASE "{etalon_db_name}"{sandbox_db.tablespace_clause(ephemeral=True)}')
+        admin_cur.close()
+        admin_conn.close()
+        with metrics.SANDBOX_RESTORE_SECONDS.time(source='etalon'), tracing.span('restore'):
+            subprocess.run(
+                ['psql', '-q', '-U', conn_params['user'], '-h', str(conn_params['host']),
+                 '-p', str(conn_params['port']), '-d', etalon_db_name, '-f', task.etalon_db.path],
+                env={**os.environ, 'PGPASSWORD': conn_params['password'] or ''},
+                stdout=subprocess.DEVNULL,
             )
-            temp_conn.autocommit = True
-            temp_cursor = temp_conn.cursor()
-
-            # Відновлюємо початковий дамп
-            with open(task.original_db.path, 'r') as f:
-                temp_cursor.execute(f.read())
-
-            # Застосовуємо SQL вчителя
-            temp_cursor.execute(sql)
-
-            # Робимо дамп результату в файл і зберігаємо в task.etalon_db
-            with tempfile.NamedTemporaryFile(suffix='.sql', delete=False) as tmpfile:
-                if os.name == 'nt':
-                    # Windows
-                    dump_cmd = (
-                        f'set PGPASSWORD={db_config["PASSWORD"]} && '
-                        f'pg_dump -U {db_config["USER"]} '
-                        f'-h {db_config["HOST"]} -p {db_config["PORT"]} '
-                        f'{temp_db_name} > "{tmpfile.name}"'
-                    )
-                else:
-                    # Linux/Mac
-                    dump_cmd = (
-                        f'PGPASSWORD={db_config["PASSWORD"]} '
-                        f'pg_dump -U {db_config["USER"]} '
-                        f'-h {db_config["HOST"]} -p {db_config["PORT"]} '
-                        f'{temp_db_name} > "{tmpfile.name}"'
-                    )
-
-                os.system(dump_cmd)
-                tmpfile.flush()
-                with open(tmpfile.name, 'rb') as dumpf:
-                    task.etalon_db.save(f"etalon_{task.id}.sql", File(dumpf), save=True)
-
-            temp_cursor.close()
-            temp_conn.close()
-
-        finally:
-            # Завжди намагаємося видалити тимчасову БД, навіть якщо було виключення
-            try:
-                admin_cursor.execute(f"DROP DATABASE IF EXISTS {temp_db_name}")
-            except Exception:
-                pass
-            admin_cursor.close()
-            admin_conn.close()
-
-        return Response({'status': 'Еталонну БД збережено.'})
+        metrics.SANDBOX_CREATE_SECONDS.observe(time.perf_counter() - create_started, source='etalon')
+        return etalon_db_name
 
     @action(detail=True, methods=['post'], url_path='submit')
     def submit(self, request, pk=None):
         """
         Порівняти стан студентської БД з еталонним дампом.
         """
-        import uuid, os
-        from django.conf import settings
-        from rest_framework.response import Response
-
         task = self.get_object()
-        if not task.original_db or not task.etalon_db:
+        # Збережена еталонна база (api/etalons.py) замість відновлення etalon_db при кожній здачі
+        cached_etalon = task.etalon_status == Task.EtalonStatus.READY and task.etalon_database
+        if not task.original_db or not (task.etalon_db or cached_etalon):
             return Response({'error': 'Задача налаштована не повністю.'}, status=400)
+        grading_started = time.perf_counter()
 
-        db_conf = settings.DATABASES['default']
+        db_conf = sandbox_db.server_config()
         conn_params = {
             'dbname': db_conf['NAME'],
             'user': db_conf['USER'],
@@ -268,59 +300,33 @@ class TaskViewSet(viewsets.ModelViewSet):
             'port': db_conf['PORT'],
         }
 
-        session_key = request.session.session_key
-        if not session_key:
-            request.session.save()
-            session_key = request.session.session_key
+        temp_db = sandbox_manager.lookup(Sandbox(request.user, sandbox_identity.sandbox_key(request), task=task))
 
-        db_prefix = f"task_{task.id}_{request.user.id}_{session_key[:8]}"
-        temp_db = TemporaryDatabase.objects.filter(
-            user=request.user,
-            session_key=session_key,
-            teacher_database=None,
-            database_name__startswith=db_prefix
-        ).first()
-
-        if not temp_db:
+        if temp_db:
+            student_db_name = temp_db.database_name
+        elif replicas.enabled():
+            # Студент нічого не змінював — його стан збігається зі спільною реплікою дампу
+            student_db_name = replicas.get_replica(task, 'original_db', 'original_db_sha256', source='task')
+        else:
             return Response({'error': 'Робоча база не знайдена!'}, status=400)
-        student_db_name = temp_db.database_name
-
-        etalon_db_name = f"etalon_{uuid.uuid4().hex[:16]}"
-        admin_conn = psycopg2.connect(**conn_params)
-        admin_conn.autocommit = True
-        admin_cur = admin_conn.cursor()
 
-        # --- Тільки ЕТАЛОННУ БД створюємо! ---
-        admin_cur.execute(f'DROP DATABASE IF EXISTS "{etalon_db_name}"')
-        admin_cur.execute(f'CREATE DATABASE "{etalon_db_name}"')
-        if os.name == 'nt':
-            psql_cmd = (
-                f'set PGPASSWORD={conn_params["password"]} && '
-                f'psql -U {conn_params["user"]} '
-                f'-h {conn_params["host"]} -p {conn_params["port"]} '
-                f'-d {etalon_db_name} -f "{task.etalon_db.path}"'
-            )
+        if cached_etalon:
+            etalon_db_name = task.etalon_database
         else:
-            psql_cmd = (
-                f'PGPASSWORD={conn_params["password"]} '
-                f'psql -U {conn_params["user"]} '
-                f'-h {conn_params["host"]} -p {conn_params["port"]} '
-                f'-d {etalon_db_name} -f "{task.etalon_db.path}"'
-            )
-        os.system(psql_cmd)
+            etalon_db_name = self._restore_etalon(task, conn_params)
 
         # --- Підключення і порівняння ---
-        student_conn_params = conn_params.copy()
-        student_conn_params['dbname'] = student_db_name
-        student_conn = psycopg2.connect(**student_conn_params)
-        student_cur = student_conn.cursor()
+        with tracing.span('connect'):
+            student_conn = sandbox_db.connect(student_db_name, alias=temp_db.server if temp_db else 'default',
+                                              autocommit=False)
+            student_cur = student_conn.cursor()
 
-        etalon_conn_params = conn_params.copy()
-        etalon_conn_params['dbname'] = etalon_db_name
-        etalon_conn = psycopg2.connect(**etalon_conn_params)
-        etalon_cur = etalon_conn.cursor()
+        with tracing.span('connect'):
+            etalon_conn = sandbox_db.connect(etalon_db_name, autocommit=False)
+            etalon_cur = etalon_conn.cursor()
 
         # --- Збираємо таблиці ---
+        compare_started = time.perf_counter()
         student_cur.execute(
             "SELECT table_name FROM information_schema.tables "
             "WHERE table_schema = 'public' ORDER BY table_name;"
@@ -370,6 +376,12 @@ class TaskViewSet(viewsets.ModelViewSet):
             column_types = [r[1] for r in col_info]
             compare_idx = [i for i, typ in enumerate(column_types) if 'timestamp' not in typ]
 
+            # Ті самі колонки (назви, типи, порядок) і відбиток, що в еталоні, — таблиця збігається,
+            # рядки не вичитуються (див. etalons.table_fingerprint)
+            if cached_etalon and etalons.matches_fingerprint(
+                    student_cur, table, [list(r) for r in col_info], task.etalon_fingerprints.get(table)):
+                continue
+
             columns_clause = ", ".join([f'"{col}"' for col in columns])
             order_clause = ", ".join([f'"{col}"' for col in columns])
 
@@ -409,16 +421,24 @@ class TaskViewSet(viewsets.ModelViewSet):
                         'diff_columns': diff_columns
                     })
 
+        tracing.record('compare', compare_started)
+
         # Закриваємо з'єднання
         student_cur.close()
         student_conn.close()
         etalon_cur.close()
         etalon_conn.close()
 
-        # Видаляємо тимчасову еталонну БД
-        admin_cur.execute(f'DROP DATABASE IF EXISTS "{etalon_db_name}"')
-        admin_cur.close()
-        admin_conn.close()
+        # Видаляємо тимчасову еталонну БД (збережену еталонну базу залишаємо)
+        if not cached_etalon:
+            admin_conn = sandbox_db.connect()
+            admin_cur = admin_conn.cursor()
+            with metrics.SANDBOX_DROP_SECONDS.time(source='etalon'), tracing.span('drop_db'):
+                admin_cur.execute(f'DROP DATABASE IF EXISTS "{etalon_db_name}"')
+            admin_cur.close()
+            admin_conn.close()
+
+        metrics.GRADING_DURATION_SECONDS.observe(time.perf_counter() - grading_started, task=task.id)
 
         return Response({'correct': correct, 'details': details})
 
@@ -451,172 +471,99 @@ def execute_sql_query(request):
         logger.warning(f"Invalid query attempt by user {request.user.username}: {error_msg}")
         return Response({'error': f'Недопустимий запит: {error_msg}'}, status=status.HTTP_400_BAD_REQUEST)
 
+    teacher_db = None
+    db_name = ''
+    started = None
     try:
-        # Завжди використовуємо тимчасову базу для user+session_key+teacher_db
-        session_key = request.session.session_key
-        if not session_key:
-            request.session.save()
-            session_key = request.session.session_key
-
-        # Якщо вказано database_id, використовуємо dump з TeacherDatabase
-        teacher_db = None
-        sql_dump_path = None
-        if database_id:
-            teacher_db = TeacherDatabase.objects.get(id=database_id)
-            sql_dump_path = teacher_db.sql_dump.path
-        else:
-            # Якщо раптом нема, можна використовувати порожній дамп
-            sql_dump_path = os.path.join(settings.BASE_DIR, 'sample_database.sql')
+        # Завжди використовуємо тимчасову базу для user+робочий простір+teacher_db
+        session_key = sandbox_identity.sandbox_key(request)
+
+        # database_id обов'язковий (перевірено вище): пісочниця створюється з dump TeacherDatabase
+        teacher_db = TeacherDatabase.objects.get(id=database_id)
 
         # Шукаємо вже існуючу тимчасову базу
-        temp_db = None
-        try:
-            temp_db = TemporaryDatabase.objects.get(
-                user=request.user,
-                teacher_database=teacher_db if teacher_db else None,
-                session_key=session_key
-            )
+        sandbox = Sandbox(request.user, session_key, teacher_db=teacher_db)
+        temp_db = sandbox_manager.lookup(sandbox)
+        if temp_db:
             # Оновлюємо last_used для очищення непотрібних пізніше
-            temp_db.save(update_fields=["last_used"])
-        except TemporaryDatabase.DoesNotExist:
-            temp_db = None
-
-        if not temp_db:
-            # Якщо нема — створюємо нову тимчасову БД
-            db_config = settings.DATABASES['default']
-            admin_conn = None
-            temp_conn = None
-            
-            try:
-                admin_conn = psycopg2.connect(
-                    dbname=db_config['NAME'],
-                    user=db_config['USER'],
-                    password=db_config['PASSWORD'],
-                    host=db_config['HOST'],
-                    port=db_config['PORT']
-                )
-                admin_conn.autocommit = True
-                admin_cursor = admin_conn.cursor()
-
-                db_name = f"temp_db_{uuid.uuid4().hex[:16]}"
-                
-                # Валідуємо назву бази даних (додаткова безпека)
-                if not db_name.replace('_', '').replace('-', '').isalnum():
-                    raise ValueError("Invalid database name generated")
-                
-                admin_cursor.execute(f"CREATE DATABASE {db_name}")
-                
-                temp_conn = psycopg2.connect(
-                    dbname=db_name,
-                    user=db_config['USER'],
-                    password=db_config['PASSWORD'],
-                    host=db_config['HOST'],
-                    port=db_config['PORT']
+            sandbox_identity.touch(temp_db)
+            metrics.SANDBOX_LOOKUPS.inc(endpoint='execute_sql', result='hit')
+        else:
+            metrics.SANDBOX_LOOKUPS.inc(endpoint='execute_sql', result='miss')
+
+        # Поки пісочниця не змінювалась, результат read-only запиту залежить лише від дампу
+        cache_key = None
+        if result_cache.enabled and (temp_db is None or not temp_db.is_dirty) and is_cacheable_query(query):
+            cache_started = time.perf_counter()
+            with tracing.span('cache'):
+                cache_key = result_cache.key(dump_sha256(teacher_db, 'sql_dump', 'dump_sha256'), query)
+                cached = result_cache.get(cache_key)
+            metrics.QUERY_RESULT_CACHE_LOOKUPS.inc(result='hit' if cached is not None else 'miss')
+            if cached is not None:
+                history_buffer.add(
+                    user=request.user,
+                    query=query,
+                    database=teacher_db,
+                    duration_ms=(time.perf_counter() - cache_started) * 1000,
+                    rows_returned=cached['row_count'],
+                    sandbox_name=temp_db.database_name if temp_db else ''
                 )
-                temp_conn.autocommit = True
-                temp_cursor = temp_conn.cursor()
+                return Response({**cached, 'cached': True})
 
-                # Встановлюємо таймаут для відновлення дампу
-                temp_cursor.execute("SET statement_timeout = 60000")  # 60 секунд
-                
-                with open(sql_dump_path, 'r', encoding='utf-8') as f:
-                    temp_cursor.execute(f.read())
+        # Поки користувач лише читає дані, запит іде до спільної read-only репліки дампу,
+        # інакше — до його пісочниці (створюється за потреби)
+        db_name = sandbox_manager.resolve(sandbox, read_only=is_read_only_query(query))
 
-                temp_cursor.close()
-                temp_conn.close()
-                temp_conn = None
+        # Виконуємо запит із обмеженням результатів для безпеки (таймаут 30 секунд)
+        started = time.perf_counter()
+        result = sandbox_manager.run_query(sandbox, query, limit=MAX_RESULTS)
+        temp_db, db_name = sandbox.temp_db, sandbox.db_name
+        duration_ms = (time.perf_counter() - started) * 1000
+        metrics.QUERY_DURATION_SECONDS.observe(duration_ms / 1000, endpoint='execute_sql', status='ok')
 
-                temp_db = TemporaryDatabase.objects.create(
-                    user=request.user,
-                    teacher_database=teacher_db if teacher_db else None,
-                    database_name=db_name,
-                    session_key=session_key
-                )
-                
-                logger.info(f"Created temporary database {db_name} for user {request.user.username}")
-                
-            except Exception as e:
-                # Очищення при помилці
-                if admin_conn:
-                    try:
-                        admin_cursor = admin_conn.cursor()
-                        admin_cursor.execute(f"DROP DATABASE IF EXISTS {db_name}")
-                        admin_cursor.close()
-                    except:
-                        pass
-                
-                logger.error(f"Failed to create temporary database for user {request.user.username}: {e}")
-                raise e
-            finally:
-                # Переконуємося, що з'єднання закриті
-                if temp_conn:
-                    temp_conn.close()
-                if admin_conn:
-                    admin_conn.close()
-
-        db_name = temp_db.database_name
-
-        # Тепер виконуємо сам запит у тимчасовій БД
-        db_config = settings.DATABASES['default']
-        conn = psycopg2.connect(
-            dbname=db_name,
-            user=db_config['USER'],
-            password=db_config['PASSWORD'],
-            host=db_config['HOST'],
-            port=db_config['PORT']
-        )
-        conn.autocommit = True
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        
-        # Встановлюємо таймаут запиту (30 секунд)
-        cursor.execute("SET statement_timeout = 30000")
-        
-        # Виконуємо запит із обмеженням результатів для безпеки
-        cursor.execute(query)
-        
-        columns = [desc[0] for desc in cursor.description] if cursor.description else []
-        
-        # Обмежуємо результати для запобігання проблем із пам'яттю
-        MAX_RESULTS = 1000
-        if cursor.description:
-            rows = cursor.fetchmany(MAX_RESULTS)
-            # Перевіряємо, чи є ще результати
-            has_more = cursor.fetchone() is not None
-        else:
-            rows = []
-            has_more = False
-            
-        results = [dict(row) for row in rows]
-        
         # Логуємо виконання запиту для моніторингу
-        logger.info(f"Query executed by {request.user.username}: {len(results)} rows returned")
+        logger.info(f"Query executed by {request.user.username}: {len(result.rows)} rows returned")
 
-        SQLHistory.objects.create(
+        history_buffer.add(
             user=request.user,
             query=query,
-            database=teacher_db if teacher_db else None
+            database=teacher_db,
+            duration_ms=duration_ms,
+            rows_returned=result.rowcount if result.columns else None,
+            rows_affected=result.rowcount if not result.columns and result.rowcount >= 0 else None,
+            sandbox_name=db_name
         )
 
-        cursor.close()
-        conn.close()
-
         response_data = {
-            'results': results,
-            'columns': columns,
-            'row_count': len(results)
+            'results': result.rows,
+            'columns': result.columns,
+            'row_count': len(result.rows)
         }
-        
-        if has_more:
+
+        if result.has_more:
             response_data['warning'] = f'Results limited to {MAX_RESULTS} rows. More data available.'
             response_data['truncated'] = True
 
+        if cache_key is not None and (temp_db is None or not temp_db.is_dirty):
+            result_cache.put(cache_key, response_data, len(result.rows))
+
         return Response(response_data)
 
     except psycopg2.extensions.QueryCanceledError:
         logger.warning(f"Query timeout for user {request.user.username}")
+        if started is not None:
+            duration_ms = (time.perf_counter() - started) * 1000
+            metrics.QUERY_DURATION_SECONDS.observe(duration_ms / 1000, endpoint='execute_sql', status='timeout')
+            history_buffer.add(user=request.user, query=query, database=teacher_db, duration_ms=duration_ms,
+                               status=SQLHistory.Status.TIMEOUT, sandbox_name=db_name)
         return Response({'error': 'Запит перевищив ліміт часу (30 секунд)'}, status=status.HTTP_408_REQUEST_TIMEOUT)
     except psycopg2.Error as e:
         logger.error(f"Database error for user {request.user.username}: {e}")
+        if started is not None:
+            duration_ms = (time.perf_counter() - started) * 1000
+            metrics.QUERY_DURATION_SECONDS.observe(duration_ms / 1000, endpoint='execute_sql', status='error')
+            history_buffer.add(user=request.user, query=query, database=teacher_db, duration_ms=duration_ms,
+                               status=SQLHistory.Status.ERROR, sandbox_name=db_name)
         return Response({'error': 'Помилка бази даних'}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         logger.error(f"Unexpected error for user {request.user.username}: {e}")
@@ -634,24 +581,7 @@ def delete_temp_db(request, pk):
     except TemporaryDatabase.DoesNotExist:
         return Response({'status': 'No temp DB to delete.'})
 
-    db_config = settings.DATABASES['default']
-    admin_conn = psycopg2.connect(
-        dbname=db_config['NAME'],
-        user=db_config['USER'],
-        password=db_config['PASSWORD'],
-        host=db_config['HOST'],
-        port=db_config['PORT']
-    )
-    admin_conn.autocommit = True
-    admin_cursor = admin_conn.cursor()
-    try:
-        admin_cursor.execute(f"DROP DATABASE IF EXISTS {temp_db.database_name}")
-    except Exception:
-        pass
-    admin_cursor.close()
-    admin_conn.close()
-
-    temp_db.delete()
+    sandbox_manager.release(temp_db)
     return Response({'status': 'Temp DB deleted.'})
 
 
@@ -664,12 +594,7 @@ def get_database_schema(request, database_id):
     """
     try:
         if database_id == 'temporary':
-            # Шукаємо тимчасову БД за session_key + optional teacher_db
-            session_key = request.session.session_key
-            if not session_key:
-                request.session.save()
-                session_key = request.session.session_key
-
+            # Шукаємо тимчасову БД за робочим простором + optional teacher_db
             teacher_db_id = request.GET.get('teacher_db')
             teacher_db = None
             if teacher_db_id:
@@ -678,15 +603,11 @@ def get_database_schema(request, database_id):
                 except TeacherDatabase.DoesNotExist:
                     return Response({'error': 'Teacher database не знайдено'}, status=status.HTTP_404_NOT_FOUND)
 
-            temp_db = TemporaryDatabase.objects.filter(
-                user=request.user,
-                session_key=session_key,
-                teacher_database=teacher_db if teacher_db else None
-            ).order_by('-id').first()
-
-            if not temp_db:
+            sandbox = Sandbox(request.user, sandbox_identity.sandbox_key(request), teacher_db=teacher_db)
+            sandbox_manager.lookup(sandbox)
+            # Без пісочниці схему дає спільна репліка дампу (якщо відома база викладача)
+            if not sandbox_manager.resolve(sandbox, read_only=teacher_db is not None, create=False):
                 return Response({'error': 'Тимчасову базу не знайдено'}, status=status.HTTP_404_NOT_FOUND)
-            db_name = temp_db.database_name
 
         else:
             # Їдемо за конкретним TeacherDatabase
@@ -696,120 +617,17 @@ def get_database_schema(request, database_id):
             if request.user.role != User.Role.ADMIN and teacher_db.teacher != request.user:
                 return Response({'error': 'Ви не маєте прав для перегляду цієї бази'}, status=status.HTTP_403_FORBIDDEN)
 
-            # Створюємо/знаходимо тимчасову БД
-            session_key = request.session.session_key
-            if not session_key:
-                request.session.save()
-                session_key = request.session.session_key
+            # Знаходимо тимчасову БД; поки користувач нічого не змінював, схему дає спільна
+            # репліка дампу, а без реплік створюється нова пісочниця
+            sandbox = Sandbox(request.user, sandbox_identity.sandbox_key(request), teacher_db=teacher_db)
+            temp_db = sandbox_manager.lookup(sandbox)
+            metrics.SANDBOX_LOOKUPS.inc(endpoint='database_schema', result='hit' if temp_db else 'miss')
+            sandbox_manager.resolve(sandbox, read_only=True)
 
-            try:
-                temp_db = TemporaryDatabase.objects.get(
-                    user=request.user,
-                    teacher_database=teacher_db,
-                    session_key=session_key
-                )
-                db_name = temp_db.database_name
-            except TemporaryDatabase.DoesNotExist:
-                # Створюємо нову тимчасову БД та відновлюємо дамп
-                db_config = settings.DATABASES['default']
-                admin_conn = psycopg2.connect(
-                    dbname=db_config['NAME'],
-                    user=db_config['USER'],
-                    password=db_config['PASSWORD'],
-                    host=db_config['HOST'],
-                    port=db_config['PORT']
-                )
-                admin_conn.autocommit = True
-                admin_cursor = admin_conn.cursor()
-
-                db_name = f"temp_db_{uuid.uuid4().hex[:16]}"
-                try:
-                    admin_cursor.execute(f"CREATE DATABASE {db_name}")
-                    temp_conn = psycopg2.connect(
-                        dbname=db_name,
-                        user=db_config['USER'],
-                        password=db_config['PASSWORD'],
-                        host=db_config['HOST'],
-                        port=db_config['PORT']
-                    )
-                    temp_conn.autocommit = True
-                    temp_cursor = temp_conn.cursor()
-
-                    with open(teacher_db.sql_dump.path, 'r') as f:
-                        temp_cursor.execute(f.read())
-
-                    temp_cursor.close()
-                    temp_conn.close()
-
-                    temp_db = TemporaryDatabase.objects.create(
-                        user=request.user,
-                        teacher_database=teacher_db,
-                        database_name=db_name,
-                        session_key=session_key
-                    )
-                except Exception as e:
-                    try:
-                        admin_cursor.execute(f"DROP DATABASE IF EXISTS {db_name}")
-                    except:
-                        pass
-                    admin_cursor.close()
-                    admin_conn.close()
-                    raise e
-
-                admin_cursor.close()
-                admin_conn.close()
-
-        # Тепер дістаємо схему тимчасової або постійної БД
-        db_config = settings.DATABASES['default']
-        conn = psycopg2.connect(
-            dbname=db_name,
-            user=db_config['USER'],
-            password=db_config['PASSWORD'],
-            host=db_config['HOST'],
-            port=db_config['PORT']
-        )
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        cursor.execute("""
-            SELECT table_name
-            FROM information_schema.tables
-            WHERE table_schema = 'public'
-            ORDER BY table_name;
-        """)
-        tables = [row['table_name'] for row in cursor.fetchall()]
-
-        schema = {}
-        for table in tables:
-            cursor.execute("""
-                SELECT
-                    column_name,
-                    data_type,
-                    CASE WHEN is_nullable = 'NO' THEN 1 ELSE 0 END as notnull,
-                    CASE WHEN column_name IN (
-                        SELECT kcu.column_name
-                        FROM information_schema.table_constraints tc
-                        JOIN information_schema.key_column_usage kcu
-                          ON tc.constraint_name = kcu.constraint_name
-                        WHERE tc.constraint_type = 'PRIMARY KEY'
-                          AND tc.table_name = %s
-                    ) THEN 1 ELSE 0 END as pk
-                FROM information_schema.columns
-                WHERE table_name = %s
-                ORDER BY ordinal_position;
-            """, (table, table))
-
-            columns = [
-                {
-                    'name': row['column_name'],
-                    'type': row['data_type'],
-                    'notnull': bool(row['notnull']),
-                    'pk': bool(row['pk'])
-                }
-                for row in cursor.fetchall()
-            ]
-            schema[table] = columns
-
-        cursor.close()
-        conn.close()
+        introspect_started = time.perf_counter()
+        tables, schema = sandbox_manager.introspect(sandbox, with_pk=True)
+        metrics.QUERY_DURATION_SECONDS.observe(time.perf_counter() - introspect_started,
+                                               endpoint='database_schema', status='ok')
 
         return Response({
             'tables': tables,
@@ -826,7 +644,7 @@ def get_database_schema(request, database_id):
 @permission_classes([permissions.IsAuthenticated])
 def delete_temp_database(request):
     """
-    Видалити тимчасову базу користувача для вибраної teacher_database та session_key.
+    Видалити тимчасову базу користувача для вибраної teacher_database у поточному робочому просторі.
     Тіло запиту: { database_id }
     """
     database_id = request.data.get('database_id')
@@ -834,36 +652,14 @@ def delete_temp_database(request):
         return Response({'error': 'Не вказано database_id'}, status=status.HTTP_400_BAD_REQUEST)
     try:
         teacher_db = TeacherDatabase.objects.get(id=database_id)
-        session_key = request.session.session_key
-        if not session_key:
-            request.session.save()
-            session_key = request.session.session_key
-
         temp_db = TemporaryDatabase.objects.get(
             user=request.user,
             teacher_database=teacher_db,
-            session_key=session_key
-        )
-
-        # Видаляємо саму БД у PostgreSQL
-        db_config = settings.DATABASES['default']
-        admin_conn = psycopg2.connect(
-            dbname=db_config['NAME'],
-            user=db_config['USER'],
-            password=db_config['PASSWORD'],
-            host=db_config['HOST'],
-            port=db_config['PORT']
+            session_key=sandbox_identity.sandbox_key(request)
         )
-        admin_conn.autocommit = True
-        admin_cursor = admin_conn.cursor()
-        try:
-            admin_cursor.execute(f"DROP DATABASE IF EXISTS {temp_db.database_name}")
-        except Exception:
-            pass
-        admin_cursor.close()
-        admin_conn.close()
 
-        temp_db.delete()
+        # Видаляємо саму БД (або схему) у PostgreSQL
+        sandbox_manager.release(temp_db)
         return Response({'status': 'Тимчасову базу видалено'})
 
     except TeacherDatabase.DoesNotExist:
@@ -878,161 +674,236 @@ def delete_temp_database(request):
 @permission_classes([permissions.IsAuthenticated])
 def sql_history(request):
     """
-    Повертає історію SQL-запитів користувача з пагінацією.
+    Повертає історію SQL-запитів користувача з курсорною (keyset) пагінацією.
+    Параметри:
+      - page_size: кількість записів (максимум 100)
+      - cursor: next_cursor з попередньої сторінки
+      - q: пошук за текстом запиту (trigram-індекси sql_history_query_trgm_idx і query_fp_sample_trgm_idx)
     """
-    # Отримуємо параметри пагінації
-    page = int(request.GET.get('page', 1))
-    page_size = min(int(request.GET.get('page_size', 25)), 100)  # Максимум 100 елементів на сторінку
-    offset = (page - 1) * page_size
-    
-    # Використовуємо select_related для кращої продуктивності
-    history_queryset = SQLHistory.objects.filter(user=request.user).select_related('database').order_by('-executed_at')
-    total_count = history_queryset.count()
-    history = history_queryset[offset:offset + page_size]
-    
+    try:
+        page_size = min(int(request.GET.get('page_size', 25)), 100)  # Максимум 100 елементів на сторінку
+    except ValueError:
+        return Response({'error': 'Некоректний page_size'}, status=status.HTTP_400_BAD_REQUEST)
+    page_size = max(page_size, 1)
+
+    # Дописуємо буферизовані записи цього процесу, щоб користувач бачив свій останній запит
+    history_buffer.flush()
+
+    # Порядок збігається з індексом sql_history_user_time_idx (user, -executed_at, -id)
+    history_queryset = SQLHistory.objects.filter(user=request.user).select_related(
+        'database', 'fingerprint'
+    ).order_by('-executed_at', '-id')
+
+    search = request.GET.get('q', '').strip()
+    if search:
+        # Текст повторних запусків зберігається лише у відбитку (sample_query), тож шукаємо двома
+        # підзапитами, кожен по своєму trigram-індексу, і об'єднуємо їх через UNION: OR між
+        # query та JOIN-полем відбитка планувальник не може звести до індексу
+        by_query = SQLHistory.objects.filter(user=request.user, query__icontains=search).order_by().values('id')
+        by_fingerprint = SQLHistory.objects.filter(
+            user=request.user, query='',
+            fingerprint__in=QueryFingerprint.objects.filter(
+                user=request.user, sample_query__icontains=search
+            ).values('id'),
+        ).order_by().values('id')
+        history_queryset = history_queryset.filter(id__in=by_query.union(by_fingerprint))
+
+    cursor = request.GET.get('cursor')
+    if cursor:
+        try:
+            executed_at, last_id = decode_history_cursor(cursor)
+        except ValueError:
+            return Response({'error': 'Некоректний cursor'}, status=status.HTTP_400_BAD_REQUEST)
+        # (executed_at, id) < (cursor.executed_at, cursor.id): діапазон по індексу + дофільтрування рівних
+        history_queryset = history_queryset.filter(executed_at__lte=executed_at).exclude(
+            executed_at=executed_at, id__gte=last_id
+        )
+
+    # Беремо на один запис більше, щоб дізнатися, чи є наступна сторінка (без count())
+    history = list(history_queryset[:page_size + 1])
+    has_more = len(history) > page_size
+    history = history[:page_size]
+
     data = [
         {
             'id': h.id,
-            'query': h.query[:200] + '...' if len(h.query) > 200 else h.query,  # Обрізаємо довгі запити
+            'query': h.full_query[:200] + '...' if len(h.full_query) > 200 else h.full_query,  # Обрізаємо довгі запити
+            'fingerprint': h.fingerprint.fingerprint if h.fingerprint else None,
             'executed_at': h.executed_at,
             'database_id': h.database.id if h.database else None,
             'database_name': h.database.name if h.database else None
         }
         for h in history
     ]
-    
+
     return Response({
         'history': data,
         'pagination': {
-            'page': page,
             'page_size': page_size,
-            'total_count': total_count,
-            'total_pages': (total_count + page_size - 1) // page_size
+            'has_more': has_more,
+            'next_cursor': encode_history_cursor(history[-1]) if has_more else None,
         }
     })
 
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
-def task_schema(request, pk):
+def common_queries(request):
     """
-    Повертає схему тимчасової бази задачі. Якщо нема — створює.
+    Найчастіші запити (за відбитком) до бази вчителя — для аналітики.
+    Параметри: database_id (обов'язково), limit (максимум 100).
+    Доступно власнику бази та адміністраторам.
     """
-    from .models import TemporaryDatabase
-
+    database_id = request.GET.get('database_id')
+    if not database_id:
+        return Response({'error': 'Не вказано database_id'}, status=status.HTTP_400_BAD_REQUEST)
     try:
-        task = Task.objects.get(pk=pk)
-    except Task.DoesNotExist:
-        return Response({'error': 'Task not found.'}, status=status.HTTP_404_NOT_FOUND)
+        teacher_db = TeacherDatabase.objects.get(id=database_id)
+    except (TeacherDatabase.DoesNotExist, ValueError):
+        return Response({'error': 'Базу даних не знайдено'}, status=status.HTTP_404_NOT_FOUND)
 
-    if not task.original_db:
-        return Response({'error': 'No database dump for this task.'}, status=status.HTTP_400_BAD_REQUEST)
+    if request.user.role != User.Role.ADMIN and teacher_db.teacher_id != request.user.id:
+        return Response({'error': 'Ви не маєте прав для перегляду цієї бази'}, status=status.HTTP_403_FORBIDDEN)
 
-    session_key = request.session.session_key
-    if not session_key:
-        request.session.save()
-        session_key = request.session.session_key
+    try:
+        limit = max(min(int(request.GET.get('limit', 20)), 100), 1)
+    except ValueError:
+        return Response({'error': 'Некоректний limit'}, status=status.HTTP_400_BAD_REQUEST)
+
+    rows = (
+        QueryFingerprint.objects.filter(database=teacher_db)
+        .values('fingerprint')
+        .annotate(
+            canonical_query=Min('canonical_query'),
+            executions=Sum('execution_count'),
+            users=Count('user', distinct=True),
+            total_duration_ms=Sum('total_duration_ms'),
+            max_duration_ms=Max('max_duration_ms'),
+            last_seen=Max('last_seen'),
+        )
+        .order_by('-executions')[:limit]
+    )
 
-    # Ім'я префіксу: task_{task.id}_{user.id}_{session_key[:8]}
-    db_prefix = f"task_{task.id}_{request.user.id}_{session_key[:8]}"
-    temp_db = TemporaryDatabase.objects.filter(
-        user=request.user,
-        session_key=session_key,
-        teacher_database=None,
-        database_name__startswith=db_prefix
-    ).first()
+    return Response({
+        'database_id': teacher_db.id,
+        'queries': [
+            {
+                'fingerprint': row['fingerprint'],
+                'query': row['canonical_query'],
+                'executions': row['executions'],
+                'users': row['users'],
+                'avg_duration_ms': row['total_duration_ms'] / row['executions'] if row['executions'] else None,
+                'max_duration_ms': row['max_duration_ms'],
+                'last_seen': row['last_seen'],
+            }
+            for row in rows
+        ]
+    })
 
-    db_config = settings.DATABASES['default']
-    if not temp_db:
-        # Створюємо нову тимчасову БД
-        temp_db_name = f"{db_prefix}_{uuid.uuid4().hex[:8]}"
-        admin_conn = psycopg2.connect(
-            dbname=db_config['NAME'],
-            user=db_config['USER'],
-            password=db_config['PASSWORD'],
-            host=db_config['HOST'],
-            port=db_config['PORT']
+
+class Percentile(Aggregate):
+    """
+    percentile_cont(p) WITHIN GROUP (ORDER BY expr) — неперервний перцентиль PostgreSQL.
+    """
+    function = 'percentile_cont'
+    name = 'Percentile'
+    template = '%(function)s(%(percentile)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = FloatField()
+
+    def __init__(self, expression, percentile, **extra):
+        super().__init__(expression, percentile=float(percentile), **extra)
+
+
+def _latency_stats(queryset, group_fields):
+    """Перцентилі тривалості та лічильники помилок, згруповані за group_fields."""
+    rows = (
+        queryset.values(*group_fields)
+        .annotate(
+            executions=Count('id'),
+            errors=Count('id', filter=Q(status=SQLHistory.Status.ERROR)),
+            timeouts=Count('id', filter=Q(status=SQLHistory.Status.TIMEOUT)),
+            p50_ms=Percentile('duration_ms', 0.5),
+            p95_ms=Percentile('duration_ms', 0.95),
+            p99_ms=Percentile('duration_ms', 0.99),
+            max_ms=Max('duration_ms'),
         )
-        admin_conn.autocommit = True
-        admin_cursor = admin_conn.cursor()
+        .order_by('-p95_ms')
+    )
+    return list(rows)
 
-        try:
-            admin_cursor.execute(f"CREATE DATABASE {temp_db_name}")
-            temp_conn = psycopg2.connect(
-                dbname=temp_db_name,
-                user=db_config['USER'],
-                password=db_config['PASSWORD'],
-                host=db_config['HOST'],
-                port=db_config['PORT']
-            )
-            temp_conn.autocommit = True
-            temp_cursor = temp_conn.cursor()
 
-            with open(task.original_db.path, 'r') as f:
-                temp_cursor.execute(f.read())
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated, IsTeacher])
+def query_stats(request):
+    """
+    Затримки запитів (p50/p95/p99) по задачах і базах за останні hours годин (за замовчуванням 24).
+    Вчитель бачить свої бази та задачі своїх курсів, адміністратор — усі.
+    """
+    try:
+        hours = max(min(float(request.GET.get('hours', 24)), 24 * 30), 0.1)
+    except ValueError:
+        return Response({'error': 'Некоректний hours'}, status=status.HTTP_400_BAD_REQUEST)
+    since = timezone.now() - timedelta(hours=hours)
+
+    history = SQLHistory.objects.filter(executed_at__gte=since, duration_ms__isnull=False)
+    task_history = history.filter(task__isnull=False)
+    database_history = history.filter(database__isnull=False)
+    if request.user.role != User.Role.ADMIN:
+        task_history = task_history.filter(task__course__teacher=request.user)
+        database_history = database_history.filter(database__teacher=request.user)
 
-            temp_cursor.close()
-            temp_conn.close()
+    return Response({
+        'since': since,
+        'tasks': _latency_stats(task_history, ['task_id', 'task__title']),
+        'databases': _latency_stats(database_history, ['database_id', 'database__name']),
+    })
 
-            temp_db = TemporaryDatabase.objects.create(
-                user=request.user,
-                teacher_database=None,
-                database_name=temp_db_name,
-                session_key=session_key
-            )
-        except Exception as e:
-            try:
-                admin_cursor.execute(f"DROP DATABASE IF EXISTS {temp_db_name}")
-            except Exception:
-                pass
-            admin_cursor.close()
-            admin_conn.close()
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        admin_cursor.close()
-        admin_conn.close()
+def encode_history_cursor(entry):
+    """Курсор сторінки історії: base64 від "executed_at|id" останнього запису."""
+    raw = f"{entry.executed_at.isoformat()}|{entry.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
 
-    db_name = temp_db.database_name
 
-    # Отримуємо схему (список таблиць + колонки)
+def decode_history_cursor(cursor):
+    """Розбирає курсор історії; ValueError, якщо він пошкоджений."""
     try:
-        conn = psycopg2.connect(
-            dbname=db_name,
-            user=db_config['USER'],
-            password=db_config['PASSWORD'],
-            host=db_config['HOST'],
-            port=db_config['PORT']
-        )
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        cursor.execute("""
-            SELECT table_name
-            FROM information_schema.tables
-            WHERE table_schema = 'public'
-            ORDER BY table_name;
-        """)
-        tables = [row['table_name'] for row in cursor.fetchall()]
-
-        schema = {}
-        for table in tables:
-            cursor.execute("""
-                SELECT column_name, data_type, is_nullable, column_default
-                FROM information_schema.columns
-                WHERE table_name = %s
-                ORDER BY ordinal_position;
-            """, (table,))
-            columns = cursor.fetchall()
-            schema[table] = [
-                {
-                    'name': col[0],
-                    'type': col[1],
-                    'notnull': col[2] == 'NO',
-                    'pk': False
-                }
-                for col in columns
-            ]
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        executed_at_raw, last_id = raw.rsplit('|', 1)
+        executed_at = parse_datetime(executed_at_raw)
+        last_id = int(last_id)
+    except (ValueError, UnicodeError, binascii.Error) as e:
+        raise ValueError(str(e))
+    if executed_at is None:
+        raise ValueError('Invalid cursor timestamp')
+    return executed_at, last_id
 
-        cursor.close()
-        conn.close()
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def task_schema(request, pk):
+    """
+    Повертає схему тимчасової бази задачі. Якщо нема — створює.
+    """
+    try:
+        task = Task.objects.get(pk=pk)
+    except Task.DoesNotExist:
+        return Response({'error': 'Task not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+    if not task.original_db:
+        return Response({'error': 'No database dump for this task.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    sandbox = Sandbox(request.user, sandbox_identity.sandbox_key(request), task=task)
+    temp_db = sandbox_manager.lookup(sandbox)
+    metrics.SANDBOX_LOOKUPS.inc(endpoint='task_schema', result='hit' if temp_db else 'miss')
+
+    try:
+        # Поки користувач нічого не змінював, схему дає спільна репліка дампу
+        sandbox_manager.resolve(sandbox, read_only=True)
+        introspect_started = time.perf_counter()
+        tables, schema = sandbox_manager.introspect(sandbox, with_pk=False)
+        metrics.QUERY_DURATION_SECONDS.observe(time.perf_counter() - introspect_started,
+                                               endpoint='task_schema', status='ok')
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -1045,8 +916,6 @@ def task_submit(request, pk):
     """
     Виконує SQL на тимчасовій базі задачі, повертає результат (результат SELECT або пустий список).
     """
-    from .models import TemporaryDatabase
-
     sql = request.data.get('sql')
     if not sql:
         return Response({'error': 'No SQL provided.'}, status=status.HTTP_400_BAD_REQUEST)
@@ -1059,99 +928,78 @@ def task_submit(request, pk):
     if not task.original_db:
         return Response({'error': 'No database dump for this task.'}, status=status.HTTP_400_BAD_REQUEST)
 
-    session_key = request.session.session_key
-    if not session_key:
-        request.session.save()
-        session_key = request.session.session_key
-
-    from django.conf import settings
-    db_prefix = f"task_{task.id}_{request.user.id}_{session_key[:8]}"
-    temp_db = TemporaryDatabase.objects.filter(
-        user=request.user,
-        session_key=session_key,
-        teacher_database=None,
-        database_name__startswith=db_prefix
-    ).first()
-
-    db_config = settings.DATABASES['default']
-    if not temp_db:
-        # Створюємо нову тимчасову БД для задачі
-        temp_db_name = f"{db_prefix}_{uuid.uuid4().hex[:8]}"
-        admin_conn = psycopg2.connect(
-            dbname=db_config['NAME'],
-            user=db_config['USER'],
-            password=db_config['PASSWORD'],
-            host=db_config['HOST'],
-            port=db_config['PORT']
-        )
-        admin_conn.autocommit = True
-        admin_cursor = admin_conn.cursor()
-        try:
-            admin_cursor.execute(f"CREATE DATABASE {temp_db_name}")
-            temp_conn = psycopg2.connect(
-                dbname=temp_db_name,
-                user=db_config['USER'],
-                password=db_config['PASSWORD'],
-                host=db_config['HOST'],
-                port=db_config['PORT']
-            )
-            temp_conn.autocommit = True
-            temp_cursor = temp_conn.cursor()
-            with open(task.original_db.path, 'r') as f:
-                temp_cursor.execute(f.read())
-            temp_cursor.close()
-            temp_conn.close()
-
-            temp_db = TemporaryDatabase.objects.create(
+    sandbox = Sandbox(request.user, sandbox_identity.sandbox_key(request), task=task)
+    temp_db = sandbox_manager.lookup(sandbox)
+    metrics.SANDBOX_LOOKUPS.inc(endpoint='task_execute', result='hit' if temp_db else 'miss')
+
+    cache_key = None
+    if result_cache.enabled and (temp_db is None or not temp_db.is_dirty) and is_cacheable_query(sql):
+        cache_started = time.perf_counter()
+        with tracing.span('cache'):
+            cache_key = result_cache.key(dump_sha256(task, 'original_db', 'original_db_sha256'), sql)
+            cached = result_cache.get(cache_key)
+        metrics.QUERY_RESULT_CACHE_LOOKUPS.inc(result='hit' if cached is not None else 'miss')
+        if cached is not None:
+            history_buffer.add(
                 user=request.user,
-                teacher_database=None,
-                database_name=temp_db_name,
-                session_key=session_key
+                query=sql,
+                task=task,
+                duration_ms=(time.perf_counter() - cache_started) * 1000,
+                rows_returned=len(cached['results']),
+                sandbox_name=temp_db.database_name if temp_db else ''
             )
-        except Exception as e:
-            try:
-                admin_cursor.execute(f"DROP DATABASE IF EXISTS {temp_db_name}")
-            except Exception:
-                pass
-            admin_cursor.close()
-            admin_conn.close()
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        admin_cursor.close()
-        admin_conn.close()
+            return Response({**cached, 'cached': True})
 
-    db_name = temp_db.database_name
+    # Поки користувач лише читає дані, запит іде до спільної read-only репліки дампу
+    try:
+        db_name = sandbox_manager.resolve(sandbox, read_only=is_read_only_query(sql))
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     # Виконуємо сам запит у тимчасовій БД
+    started = time.perf_counter()
     try:
-        conn = psycopg2.connect(
-            dbname=db_name,
-            user=db_config['USER'],
-            password=db_config['PASSWORD'],
-            host=db_config['HOST'],
-            port=db_config['PORT']
+        result = sandbox_manager.run_query(sandbox, sql)
+        temp_db, db_name = sandbox.temp_db, sandbox.db_name
+        duration_ms = (time.perf_counter() - started) * 1000
+        metrics.QUERY_DURATION_SECONDS.observe(duration_ms / 1000, endpoint='task_execute', status='ok')
+        history_buffer.add(
+            user=request.user,
+            query=sql,
+            task=task,
+            duration_ms=duration_ms,
+            rows_returned=result.rowcount if result.columns else None,
+            rows_affected=result.rowcount if not result.columns and result.rowcount >= 0 else None,
+            sandbox_name=db_name
         )
-        conn.autocommit = True
-        cursor = conn.cursor()
-        cursor.execute(sql)
-        try:
-            results = cursor.fetchall()
-            columns = [desc[0] for desc in cursor.description]
-            result_dicts = [dict(zip(columns, row)) for row in results]
-        except Exception:
-            result_dicts = []
-        cursor.close()
-        conn.close()
     except Exception as e:
+        duration_ms = (time.perf_counter() - started) * 1000
+        timed_out = isinstance(e, psycopg2.extensions.QueryCanceledError)
+        metrics.QUERY_DURATION_SECONDS.observe(duration_ms / 1000, endpoint='task_execute',
+                                               status='timeout' if timed_out else 'error')
+        history_buffer.add(
+            user=request.user,
+            query=sql,
+            task=task,
+            duration_ms=duration_ms,
+            status=SQLHistory.Status.TIMEOUT if timed_out else SQLHistory.Status.ERROR,
+            sandbox_name=db_name
+        )
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    return Response({'results': result_dicts})
+    response_data = {'results': result.rows}
+    if cache_key is not None and (temp_db is None or not temp_db.is_dirty):
+        result_cache.put(cache_key, response_data, len(result.rows))
+    return Response(response_data)
 
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def task_reset_db(request, pk):
     """
-    Видаляє тимчасову базу для задачі (Task) для поточного користувача і сесії.
+    Скидає тимчасову базу задачі (Task) для поточного користувача і сесії.
+    Запис видаляється одразу, а DROP DATABASE виконується у фоні: наступний запит
+    читає спільну репліку або отримує нову копію шаблону дампу, не чекаючи видалення.
     """
     from .models import TemporaryDatabase
 
@@ -1160,14 +1008,9 @@ def task_reset_db(request, pk):
     except Task.DoesNotExist:
         return Response({'error': 'Task not found.'}, status=status.HTTP_404_NOT_FOUND)
 
-    session_key = request.session.session_key
-    if not session_key:
-        request.session.save()
-        session_key = request.session.session_key
-
     temp_db = TemporaryDatabase.objects.filter(
         user=request.user,
-        session_key=session_key,
+        session_key=sandbox_identity.sandbox_key(request),
         teacher_database=None,
         database_name__startswith=f"task_{task.id}_"
     ).first()
@@ -1175,22 +1018,130 @@ def task_reset_db(request, pk):
     if not temp_db:
         return Response({'status': 'No temp DB to delete.'})
 
-    db_config = settings.DATABASES['default']
-    admin_conn = psycopg2.connect(
-        dbname=db_config['NAME'],
-        user=db_config['USER'],
-        password=db_config['PASSWORD'],
-        host=db_config['HOST'],
-        port=db_config['PORT']
-    )
-    admin_conn.autocommit = True
-    admin_cursor = admin_conn.cursor()
+    sandbox_manager.reset(temp_db)
+    return Response({'status': 'Temp DB deleted.'})
+
+
+def _session_sandbox(request, task_id=None, database_id=None):
+    """Пісочниця поточного користувача і робочого простору для задачі task_id або бази викладача database_id."""
+    return sandbox_identity.find_sandbox(request.user, sandbox_identity.sandbox_key(request),
+                                         teacher_db_id=int(database_id) if database_id else None,
+                                         task_id=int(task_id) if task_id else None)
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([permissions.IsAuthenticated])
+def sandbox_checkpoints(request):
+    """
+    Точки відновлення поточної пісочниці.
+    GET ?task=<id> або ?database_id=<id> — список; POST { task | database_id, name } — створити.
+    Копіювання виконується у фоні: нова точка має статус pending, доки не стане ready.
+    Відповідь на POST містить notice: простоюючі з'єднання з пісочницею ненадовго розриваються.
+    """
+    params = request.GET if request.method == 'GET' else request.data
+    task_id = params.get('task')
+    database_id = params.get('database_id')
+    if not task_id and not database_id:
+        return Response({'error': 'Не вказано task або database_id'}, status=status.HTTP_400_BAD_REQUEST)
     try:
-        admin_cursor.execute(f"DROP DATABASE IF EXISTS {temp_db.database_name}")
-    except Exception:
-        pass
-    admin_cursor.close()
-    admin_conn.close()
+        temp_db = _session_sandbox(request, task_id=task_id, database_id=database_id)
+    except ValueError:
+        return Response({'error': 'Некоректний task або database_id'}, status=status.HTTP_400_BAD_REQUEST)
 
-    temp_db.delete()
-    return Response({'status': 'Temp DB deleted.'})
+    if request.method == 'GET':
+        items = temp_db.checkpoints.all() if temp_db else SandboxCheckpoint.objects.none()
+        return Response(SandboxCheckpointSerializer(items, many=True).data)
+
+    if not temp_db:
+        # Пісочниця ще не створена (або користувач лише читав спільну репліку) — зберігати нічого
+        return Response({'error': 'Пісочниця ще не створена'}, status=status.HTTP_404_NOT_FOUND)
+    name = (request.data.get('name') or '').strip()
+    if not name or len(name) > 100:
+        return Response({'error': 'Некоректна назва точки відновлення'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        checkpoint = checkpoints.create_checkpoint(temp_db, name)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({**SandboxCheckpointSerializer(checkpoint).data, 'notice': checkpoints.CREATE_NOTICE},
+                    status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['POST', 'DELETE'])
+@permission_classes([permissions.IsAuthenticated])
+def sandbox_checkpoint_detail(request, pk):
+    """
+    POST — відновити пісочницю з точки відновлення pk; DELETE — видалити точку.
+    """
+    try:
+        checkpoint = SandboxCheckpoint.objects.select_related('temporary_database').get(
+            pk=pk, temporary_database__user=request.user
+        )
+    except SandboxCheckpoint.DoesNotExist:
+        return Response({'error': 'Точку відновлення не знайдено'}, status=status.HTTP_404_NOT_FOUND)
+
+    if request.method == 'DELETE':
+        if checkpoint.status == SandboxCheckpoint.Status.PENDING:
+            return Response({'error': 'Точка відновлення ще створюється'}, status=status.HTTP_409_CONFLICT)
+        checkpoints.delete_checkpoint(checkpoint)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    source = 'teacher_database' if checkpoint.temporary_database.teacher_database_id else 'task'
+    try:
+        checkpoints.restore_checkpoint(checkpoint, source=source)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return Response({'status': 'Пісочницю відновлено', 'checkpoint': SandboxCheckpointSerializer(checkpoint).data})
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated, IsTeacher])
+def dump_uploads(request):
+    """
+    Починає покрокове завантаження дампу (див. api/uploads.py).
+    Очікує: { "filename": "...", "size": <байтів> }
+    """
+    try:
+        size = int(request.data.get('size'))
+    except (TypeError, ValueError):
+        return Response({'error': 'Некоректний size'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        upload = uploads.create_upload(request.user, request.data.get('filename'), size)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(DumpUploadSerializer(upload).data, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET', 'PATCH', 'DELETE'])
+@permission_classes([permissions.IsAuthenticated, IsTeacher])
+def dump_upload_detail(request, pk):
+    """
+    GET — стан завантаження (offset, з якого продовжувати); DELETE — скасувати.
+    PATCH — наступна частина файлу: сире тіло запиту і заголовок Upload-Offset.
+    При розбіжності зміщення — 409 з поточним offset.
+    """
+    try:
+        upload = DumpUpload.objects.get(pk=pk, user=request.user)
+    except DumpUpload.DoesNotExist:
+        return Response({'error': 'Завантаження не знайдено'}, status=status.HTTP_404_NOT_FOUND)
+
+    if request.method == 'GET':
+        return Response(DumpUploadSerializer(upload).data)
+    if request.method == 'DELETE':
+        uploads.discard(upload)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return Response({'error': 'Некоректний Upload-Offset'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        # Тіло читається потоком прямо у файл, без парсерів DRF
+        upload = uploads.append_chunk(upload.pk, request.user, offset, request.stream, length)
+    except uploads.OffsetMismatch as e:
+        return Response({'error': str(e), 'offset': e.offset}, status=status.HTTP_409_CONFLICT)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(DumpUploadSerializer(upload).data)
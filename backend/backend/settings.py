@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import os
 from datetime import timedelta
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 
 # Завантаження змінних середовища з файлу .env
@@ -43,6 +44,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'corsheaders',
     'api.apps.ApiConfig',
@@ -50,6 +52,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.tracing.TracingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -90,6 +93,8 @@ CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:3000',  # адрес вашого фронта
 ]
+# Робочий простір пісочниць (api/sandbox_identity.py) передається заголовком X-Workspace-Id
+CORS_ALLOW_HEADERS = (*default_headers, 'x-workspace-id', 'upload-offset')
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -105,6 +110,125 @@ DATABASES = {
     }
 }
 
+# Кластер PostgreSQL для пісочниць студентів (api/sandbox_db.py). Незадані значення
+# беруться з DATABASES['default']; NAME — службова база для CREATE/DROP DATABASE.
+SANDBOX_DATABASES = {
+    'default': {
+        'NAME': os.getenv('SANDBOX_DB_NAME'),
+        'USER': os.getenv('SANDBOX_DB_USER'),
+        'PASSWORD': os.getenv('SANDBOX_DB_PASSWORD'),
+        'HOST': os.getenv('SANDBOX_DB_HOST'),
+        'PORT': os.getenv('SANDBOX_DB_PORT'),
+        'TABLESPACE': os.getenv('SANDBOX_DB_TABLESPACE', ''),
+        # Швидке зберігання тимчасових баз: табличний простір на tmpfs з бюджетом і UNLOGGED-таблиці
+        'FAST_TABLESPACE': os.getenv('SANDBOX_DB_FAST_TABLESPACE', ''),
+        'FAST_TABLESPACE_BYTES': int(os.getenv('SANDBOX_DB_FAST_TABLESPACE_BYTES', 0)),
+        'UNLOGGED_TABLES': os.getenv('SANDBOX_DB_UNLOGGED_TABLES', 'False').lower() == 'true',
+    }
+}
+
+# Додаткові сервери пісочниць з тими ж обліковими даними: SANDBOX_DB_SERVERS="node2=10.0.0.2:5432,node3=10.0.0.3:5432".
+# Нові пісочниці розподіляються між усіма серверами за навантаженням (api/placement.py).
+for _entry in filter(None, os.getenv('SANDBOX_DB_SERVERS', '').split(',')):
+    _alias, _, _address = _entry.strip().partition('=')
+    _host, _, _port = _address.partition(':')
+    SANDBOX_DATABASES[_alias] = {**SANDBOX_DATABASES['default'], 'HOST': _host, 'PORT': _port or '5432'}
+
+SANDBOX_PLACEMENT = {
+    'LOAD_TTL': int(os.getenv('SANDBOX_PLACEMENT_LOAD_TTL', 5)),
+    'PROBE_TIMEOUT': int(os.getenv('SANDBOX_PLACEMENT_PROBE_TIMEOUT', 2)),
+}
+
+# Пули з'єднань асинхронних SQL-ендпоінтів (api/async_db.py)
+ASYNC_SANDBOX_POOL = {
+    'MAX_POOLS': int(os.getenv('ASYNC_SANDBOX_MAX_POOLS', 200)),
+    'MAX_SIZE': int(os.getenv('ASYNC_SANDBOX_POOL_SIZE', 4)),
+}
+
+# Буферизований запис історії SQL-запитів (api/history.py)
+SQL_HISTORY_BUFFER = {
+    'MAX_SIZE': int(os.getenv('SQL_HISTORY_BATCH_SIZE', 100)),
+    'FLUSH_INTERVAL': float(os.getenv('SQL_HISTORY_FLUSH_INTERVAL', 2.0)),
+}
+
+# Запити, довші за цей поріг (мс), пишуться в logs/slow_queries.log
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 1000))
+
+# Токен для /metrics (Authorization: Bearer <token>). Без токена /metrics відкритий лише з DEBUG
+# або з мереж METRICS_ALLOWED_NETWORKS (через кому, наприклад "127.0.0.1/32,10.0.0.0/8")
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_ALLOWED_NETWORKS = [network.strip() for network in os.getenv('METRICS_ALLOWED_NETWORKS', '').split(',')
+                            if network.strip()]
+# Скільки секунд /metrics повторно використовує виміряний розмір пісочниць на диску
+METRICS_DISK_CACHE_SECONDS = int(os.getenv('METRICS_DISK_CACHE_SECONDS', 60))
+
+# Трасування фаз запиту (api/tracing.py): заголовок Server-Timing і вибіркові траси в logs/traces.jsonl
+TRACING = {
+    'ENABLED': os.getenv('TRACING_ENABLED', 'True').lower() == 'true',
+    'SAMPLE_RATE': float(os.getenv('TRACE_SAMPLE_RATE', 0.0)),
+    # Без Timing-Allow-Origin браузер не показує Server-Timing для запитів з іншого origin (фронтенд)
+    'TIMING_ALLOW_ORIGIN': ', '.join(CORS_ALLOWED_ORIGINS),
+}
+
+# Спільні read-only репліки дампів для сесій, що лише читають дані (api/replicas.py)
+SHARED_REPLICAS = {
+    'ENABLED': os.getenv('SHARED_REPLICAS_ENABLED', 'True').lower() == 'true',
+}
+
+# Бази-шаблони дампів: нові пісочниці копіюються через CREATE DATABASE ... TEMPLATE (api/sandbox_templates.py)
+SANDBOX_TEMPLATES = {
+    'ENABLED': os.getenv('SANDBOX_TEMPLATES_ENABLED', 'True').lower() == 'true',
+}
+
+# Кеш Django: пошук пісочниць за робочим простором (api/sandbox_identity.py). Для кількох
+# процесів (gunicorn/uvicorn workers) задайте спільний бекенд, наприклад
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache, CACHE_LOCATION=redis://127.0.0.1:6379/1
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Ідентичність пісочниць без Django-сесій: користувач + робочий простір (X-Workspace-Id або claim JWT)
+SANDBOX_IDENTITY = {
+    # Кеш пошуку пісочниць; без змінної — лише для спільного CACHE_BACKEND (не LocMem)
+    'CACHE_ENABLED': {'true': True, 'false': False}.get(os.getenv('SANDBOX_IDENTITY_CACHE_ENABLED', '').lower()),
+    'CACHE_TTL': int(os.getenv('SANDBOX_IDENTITY_CACHE_TTL', 300)),
+    'LAST_USED_INTERVAL': int(os.getenv('SANDBOX_LAST_USED_INTERVAL', 60)),
+}
+
+# Single-flight побудови пісочниць, шаблонів і реплік через advisory lock PostgreSQL (api/locks.py)
+SINGLE_FLIGHT = {
+    'WAIT_TIMEOUT': int(os.getenv('SINGLE_FLIGHT_WAIT_TIMEOUT', 120)),
+}
+
+# Точки відновлення пісочниць (api/checkpoints.py)
+SANDBOX_CHECKPOINTS = {
+    'MAX_PER_SANDBOX': int(os.getenv('SANDBOX_CHECKPOINTS_MAX_PER_SANDBOX', 5)),
+    'COPY_ATTEMPTS': int(os.getenv('SANDBOX_CHECKPOINTS_COPY_ATTEMPTS', 5)),
+    'RETRY_DELAY': float(os.getenv('SANDBOX_CHECKPOINTS_RETRY_DELAY', 1.0)),
+}
+
+# Пул потоків для фонових завдань, наприклад видалення баз після скидання (api/jobs.py)
+BACKGROUND_JOBS = {
+    'MAX_WORKERS': int(os.getenv('BACKGROUND_JOBS_MAX_WORKERS', 4)),
+}
+
+# Фонова перевірка завантажених дампів і побудова їхніх шаблонів (api/ingestion.py)
+DUMP_INGESTION = {
+    'ENABLED': os.getenv('DUMP_INGESTION_ENABLED', 'True').lower() == 'true',
+    'PREBUILD_ALL_SERVERS': os.getenv('DUMP_INGESTION_PREBUILD_ALL_SERVERS', 'False').lower() == 'true',
+    'STALE_MINUTES': int(os.getenv('DUMP_INGESTION_STALE_MINUTES', '30')),
+}
+
+# Кеш результатів read-only запитів до незмінених пісочниць (api/result_cache.py)
+QUERY_RESULT_CACHE = {
+    'ENABLED': os.getenv('QUERY_RESULT_CACHE_ENABLED', 'True').lower() == 'true',
+    'MAX_ENTRIES': int(os.getenv('QUERY_RESULT_CACHE_MAX_ENTRIES', 5000)),
+    'MAX_BYTES': int(os.getenv('QUERY_RESULT_CACHE_MAX_BYTES', 64 * 1024 ** 2)),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -183,7 +307,17 @@ X_FRAME_OPTIONS = 'DENY'
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 
-# Logging configuration
+# Покрокове завантаження великих дампів (api/uploads.py); частини не проходять через ліміти вище
+CHUNKED_UPLOADS = {
+    'MAX_SIZE': int(os.getenv('CHUNKED_UPLOAD_MAX_SIZE', 256 * 1024 ** 2)),
+    'MAX_CHUNK_SIZE': int(os.getenv('CHUNKED_UPLOAD_MAX_CHUNK_SIZE', 16 * 1024 ** 2)),
+    'EXPIRE_HOURS': int(os.getenv('CHUNKED_UPLOAD_EXPIRE_HOURS', 24)),
+}
+
+# Logging configuration; каталог журналів не зберігається в git і створюється під час запуску
+LOG_DIR = BASE_DIR / 'logs'
+os.makedirs(LOG_DIR, exist_ok=True)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -191,12 +325,22 @@ LOGGING = {
         'file': {
             'level': 'INFO',
             'class': 'logging.FileHandler',
-            'filename': 'logs/django.log',
+            'filename': LOG_DIR / 'django.log',
         },
         'console': {
             'level': 'INFO',
             'class': 'logging.StreamHandler',
         },
+        'slow_queries': {
+            'level': 'WARNING',
+            'class': 'logging.FileHandler',
+            'filename': LOG_DIR / 'slow_queries.log',
+        },
+        'traces': {
+            'level': 'INFO',
+            'class': 'logging.FileHandler',
+            'filename': LOG_DIR / 'traces.jsonl',
+        },
     },
     'loggers': {
         'api': {
@@ -204,5 +348,15 @@ LOGGING = {
             'level': 'INFO',
             'propagate': True,
         },
+        'api.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'api.traces': {
+            'handlers': ['traces'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
@@ -0,0 +1,41 @@
+import api from './auth';
+
+// Розмір однієї частини покрокового завантаження (не більше CHUNKED_UPLOAD_MAX_CHUNK_SIZE на сервері)
+const CHUNK_SIZE = 8 * 1024 * 1024;
+const MAX_RETRIES = 3;
+
+// Завантажує файл дампу частинами через /api/dump-uploads/ і повертає id завершеного завантаження.
+// Після обриву частина повторюється з offset, який повідомив сервер.
+export async function uploadDump(file, onProgress) {
+  const { data: upload } = await api.post('/api/dump-uploads/', {
+    filename: file.name,
+    size: file.size,
+  });
+
+  let offset = upload.offset;
+  let retries = 0;
+  while (offset < file.size) {
+    const chunk = file.slice(offset, offset + CHUNK_SIZE);
+    try {
+      const { data } = await api.patch(`/api/dump-uploads/${upload.id}/`, chunk, {
+        headers: {
+          'Content-Type': 'application/offset+octet-stream',
+          'Upload-Offset': String(offset),
+        },
+        timeout: 0,
+      });
+      offset = data.offset;
+      retries = 0;
+    } catch (err) {
+      if (retries >= MAX_RETRIES) throw err;
+      retries += 1;
+      // Сервер міг прийняти частину або відкинути її: продовжуємо з його offset
+      const { data } = err.response?.status === 409
+        ? { data: err.response.data }
+        : await api.get(`/api/dump-uploads/${upload.id}/`);
+      offset = data.offset;
+    }
+    if (onProgress) onProgress(offset / file.size);
+  }
+  return upload.id;
+}
@@ -15,6 +15,8 @@ export default function CourseDetailPage() {
   const [course, setCourse] = useState(null);
   const [assignments, setAssignments] = useState([]);
   const [tasks, setTasks] = useState([]);
+  // URL наступної сторінки задач (курсорна пагінація API); null — сторінок більше немає
+  const [nextTasksPage, setNextTasksPage] = useState(null);
   const [loading, setLoading] = useState(true);
   const { t } = useTranslation();
 
@@ -42,13 +44,28 @@ export default function CourseDetailPage() {
   const fetchTasks = useCallback(() => {
     if (id) {
       api.get(`/api/tasks/?course=${id}`)
-        .then(res => setTasks(res.data))
+        .then(res => {
+          setTasks(res.data.results);
+          setNextTasksPage(res.data.next);
+        })
         .catch(err => {
           console.error('Ошибка получения задач:', err);
         });
     }
   }, [id]);
 
+  // Дозавантаження наступної сторінки задач курсу
+  const loadMoreTasks = () => {
+    api.get(nextTasksPage)
+      .then(res => {
+        setTasks(prev => [...prev, ...res.data.results]);
+        setNextTasksPage(res.data.next);
+      })
+      .catch(err => {
+        console.error('Помилка отримання задач:', err);
+      });
+  };
+
   useEffect(() => {
     fetchCourse();
     fetchTasks();
@@ -87,6 +104,11 @@ export default function CourseDetailPage() {
 
       {/* Відображення вкладок */}
       {tab === 0 && <TaskList tasks={tasks} />}
+      {tab === 0 && nextTasksPage && (
+        <Box sx={{ display: 'flex', justifyContent: 'center', mt: 2 }}>
+          <Button variant="outlined" onClick={loadMoreTasks}>{t('common.loadMore')}</Button>
+        </Box>
+      )}
       {tab === 1 && <CourseMaterials courseId={id} />}
       {tab === 2 && (
         <Box sx={{ p: 3, textAlign: 'center' }}>
@@ -23,6 +23,8 @@ import { Add as AddIcon } from '@mui/icons-material';
 
 export default function CoursesPage() {
   const [courses, setCourses] = useState([]);
+  // URL наступної сторінки списку (курсорна пагінація API); null — сторінок більше немає
+  const [nextPage, setNextPage] = useState(null);
   const [openEditDialog, setOpenEditDialog] = useState(false);
   const [openDeleteDialog, setOpenDeleteDialog] = useState(false);
   const [openTaskDialog, setOpenTaskDialog] = useState(false);
@@ -41,13 +43,29 @@ export default function CoursesPage() {
 
   const fetchCourses = useCallback(() => {
     api.get('/api/courses/')
-      .then(res => setCourses(res.data))
+      .then(res => {
+        setCourses(res.data.results);
+        setNextPage(res.data.next);
+      })
       .catch(err => {
         console.error(err);
         showNotification(t('course.fetchError'), 'error');
       });
   }, []);
 
+  // Дозавантаження наступної сторінки курсів
+  const loadMoreCourses = () => {
+    api.get(nextPage)
+      .then(res => {
+        setCourses(prev => [...prev, ...res.data.results]);
+        setNextPage(res.data.next);
+      })
+      .catch(err => {
+        console.error(err);
+        showNotification(t('course.fetchError'), 'error');
+      });
+  };
+
   // Отримання списку курсів при монтуванні компонента
   useEffect(() => {
     fetchCourses();
@@ -182,6 +200,12 @@ export default function CoursesPage() {
         ))}
       </Grid>
 
+      {nextPage && (
+        <Box sx={{ display: 'flex', justifyContent: 'center', mt: 3 }}>
+          <Button variant="outlined" onClick={loadMoreCourses}>{t('common.loadMore')}</Button>
+        </Box>
+      )}
+
       {/* Діалог редагування курсу */}
       <Dialog open={openEditDialog} onClose={() => setOpenEditDialog(false)} maxWidth="sm" fullWidth>
         <DialogTitle>{t('course.editCourse')}</DialogTitle>
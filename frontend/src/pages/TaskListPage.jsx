@@ -1,19 +1,24 @@
 import React, { useEffect, useState } from 'react';
 import { Container, Typography, Paper, List, ListItem, ListItemText, CircularProgress, Button } from '@mui/material';
 import { useNavigate } from 'react-router-dom';
+import { useTranslation } from 'react-i18next';
 import api from '../api/auth';
 
 export default function TaskListPage() {
   const [tasks, setTasks] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
+  // URL наступної сторінки задач (курсорна пагінація API); null — сторінок більше немає
+  const [nextPage, setNextPage] = useState(null);
   const navigate = useNavigate();
+  const { t } = useTranslation();
 
   useEffect(() => {
     setLoading(true);
     api.get('/api/tasks/')
       .then(res => {
-        setTasks(res.data);
+        setTasks(res.data.results);
+        setNextPage(res.data.next);
         setLoading(false);
       })
       .catch(err => {
@@ -22,6 +27,17 @@ export default function TaskListPage() {
       });
   }, []);
 
+  const loadMore = () => {
+    api.get(nextPage)
+      .then(res => {
+        setTasks(prev => [...prev, ...res.data.results]);
+        setNextPage(res.data.next);
+      })
+      .catch(err => {
+        setError('Failed to load tasks');
+      });
+  };
+
   if (loading) {
     return (
       <Container maxWidth="md" sx={{ mt: 4, display: 'flex', justifyContent: 'center' }}>
@@ -64,6 +80,9 @@ export default function TaskListPage() {
             </ListItem>
           ))}
         </List>
+        {nextPage && (
+          <Button fullWidth onClick={loadMore}>{t('common.loadMore')}</Button>
+        )}
       </Paper>
       <Button sx={{ mt: 2 }} variant="outlined" onClick={() => navigate('/courses')}>Back to Courses</Button>
     </Container>
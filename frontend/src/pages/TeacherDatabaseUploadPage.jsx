@@ -7,19 +7,23 @@ import {
   TextField,
   Typography,
   Alert,
-  CircularProgress
+  CircularProgress,
+  MenuItem
 } from '@mui/material';
 import { useNavigate } from 'react-router-dom';
 import { useTranslation } from 'react-i18next';
 import api from '../api/auth';
+import { uploadDump } from '../api/uploads';
 
 export default function TeacherDatabaseUploadPage() {
   const { t } = useTranslation();
   const [name, setName] = useState('');
   const [file, setFile] = useState(null);
+  const [isolationMode, setIsolationMode] = useState('database');
   const [error, setError] = useState(null);
   const [success, setSuccess] = useState(false);
   const [isSubmitting, setIsSubmitting] = useState(false);
+  const [progress, setProgress] = useState(0);
   const navigate = useNavigate();
 
   // Обробка відправки форми завантаження бази даних
@@ -35,21 +39,20 @@ export default function TeacherDatabaseUploadPage() {
       return;
     }
 
-    const formData = new FormData();
-    formData.append('name', name);
-    formData.append('sql_dump', file);
-
     try {
-      await api.post('/api/teacher-databases/', formData, {
-        headers: {
-          'Content-Type': 'multipart/form-data'
-        }
+      // Файл передається частинами, тож великі дампи не впираються в ліміт одного запиту
+      setProgress(0);
+      const uploadId = await uploadDump(file, setProgress);
+      await api.post('/api/teacher-databases/', {
+        name,
+        upload: uploadId,
+        isolation_mode: isolationMode
       });
       setSuccess(true);
       setTimeout(() => navigate('/courses'), 1500);
     } catch (err) {
       console.error('Помилка завантаження:', err);
-      setError(err.response?.data?.detail || 'Завантаження не вдалося');
+      setError(err.response?.data?.detail || err.response?.data?.error || 'Завантаження не вдалося');
     } finally {
       setIsSubmitting(false);
     }
@@ -72,6 +75,18 @@ export default function TeacherDatabaseUploadPage() {
             sx={{ mb: 3 }}
           />
 
+          <TextField
+            select
+            fullWidth
+            label={t('task.isolationMode')}
+            value={isolationMode}
+            onChange={(e) => setIsolationMode(e.target.value)}
+            sx={{ mb: 3 }}
+          >
+            <MenuItem value="database">{t('task.isolationModeDatabase')}</MenuItem>
+            <MenuItem value="schema">{t('task.isolationModeSchema')}</MenuItem>
+          </TextField>
+
           <Button
             variant="outlined"
             component="label"
@@ -96,7 +111,7 @@ export default function TeacherDatabaseUploadPage() {
               disabled={isSubmitting}
               startIcon={isSubmitting && <CircularProgress size={20} />}
             >
-              {isSubmitting ? t('common.uploading') : t('task.upload')}
+              {isSubmitting ? `${t('common.uploading')} ${Math.round(progress * 100)}%` : t('task.upload')}
             </Button>
           </Box>
         </Box>